@@ -0,0 +1,287 @@
+"""Offline download/transcode/image/batch benchmark against a local mock media server
+
+Runs each scenario through the app's own engine (yt-dlp's generic extractor
+for media, the image fetcher for images) against benchmarks/mock_media.py,
+so results are reproducible without network access. For every scenario it
+reports wall-time p50/p95, throughput and peak RSS, and prints/saves JSON.
+
+Scenarios:
+    progressive  single-file MP4 downloads (small and large)
+    hls          HLS playlist + .ts segments
+    dash         DASH SegmentList manifest + .m4s segments
+    transcode    download + FFmpeg mp3 extraction (skipped without ffmpeg)
+    image        fetch + resize/convert to WebP/JPEG (skipped without Pillow)
+    batch        many progressive downloads through the JobManager
+
+Usage:
+    python benchmarks/media.py                      # all scenarios
+    python benchmarks/media.py -s progressive -s batch --repeat 10
+    python benchmarks/media.py --bandwidth 5000000 --latency 0.05 -o media.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_media import PROGRESSIVE_SIZES, SEGMENTED, MockMediaServer  # noqa: E402
+
+SCENARIOS = ["progressive", "hls", "dash", "transcode", "image", "batch"]
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss: kilobytes on Linux, bytes on macOS; process-lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Peak resident set size while the block runs (sampled every `interval` seconds)"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+        return False
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, total_bytes, wall, peak_rss, errors):
+    result = {
+        "runs": len(latencies),
+        "errors": errors[:5],
+        "error_count": len(errors),
+        "peak_rss_mib": round(peak_rss / (1024 * 1024), 1),
+    }
+    if latencies:
+        result.update({
+            "p50_s": round(_percentile(latencies, 50), 4),
+            "p95_s": round(_percentile(latencies, 95), 4),
+            "mean_s": round(statistics.mean(latencies), 4),
+            "bytes": total_bytes,
+            "throughput_mib_s": round(total_bytes / wall / (1024 * 1024), 2) if wall else None,
+        })
+    return result
+
+
+def measure(task, repeat):
+    """Run task() repeat times; task returns bytes handled"""
+    latencies, errors, total_bytes = [], [], 0
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            try:
+                total_bytes += task() or 0
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - t)
+        wall = time.perf_counter() - start
+    return summarize(latencies, total_bytes, wall, rss.peak, errors)
+
+
+def _file_size(result):
+    path = result.get("file_path")
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def _fresh_dir(workdir, name):
+    path = os.path.join(workdir, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def _segmented_opts(download_dir):
+    from downloader import engine
+    opts = engine.base_download_opts(download_dir)
+    # Synthetic segments are not decodable; skip ffmpeg fixups
+    opts.update({'fixup': 'never', 'quiet': True, 'no_warnings': True})
+    return opts
+
+
+def bench_progressive(server, workdir, repeat):
+    from downloader import engine
+    results = {}
+    for name in PROGRESSIVE_SIZES:
+        url = server.url(f"/progressive/{name}.mp4")
+        task = lambda: _file_size(engine.download_media(url, _fresh_dir(workdir, "progressive"), kind="bench"))
+        results[name] = measure(task, repeat)
+    return results
+
+
+def bench_segmented(server, workdir, repeat, protocol):
+    from downloader import engine
+    manifest = "index.m3u8" if protocol == "hls" else "manifest.mpd"
+    results = {}
+    for name in SEGMENTED:
+        url = server.url(f"/{protocol}/{name}/{manifest}")
+        task = lambda: _file_size(engine.run_download(url, _segmented_opts(_fresh_dir(workdir, protocol)), "bench"))
+        results[name] = measure(task, repeat)
+    return results
+
+
+def bench_transcode(server, workdir, repeat):
+    from downloader import engine
+    if shutil.which("ffmpeg") is None or not server.has("/progressive/clip.mp4"):
+        return {"skipped": "ffmpeg not found"}
+    url = server.url("/progressive/clip.mp4")
+    return {"mp3": measure(lambda: _file_size(engine.download_audio(url, _fresh_dir(workdir, "transcode"), "mp3")), repeat)}
+
+
+def bench_image(server, workdir, repeat):
+    from downloader import engine
+    if not server.has("/images/photo.jpg"):
+        return {"skipped": "Pillow not installed"}
+    from downloader.sessions import create_session
+    session = create_session()
+
+    def convert(path, size, image_format):
+        def task():
+            data = engine.fetch_image(server.url(path), session)
+            img = engine.open_image(data)
+            if size:
+                img = engine.resize_image(img, size)
+            engine.transcode_image(img, image_format)
+            return len(data)
+        return task
+
+    return {
+        "hd_jpg_to_webp": measure(convert("/images/hd.jpg", None, "WEBP"), repeat),
+        "photo_jpg_resize_720p": measure(convert("/images/photo.jpg", engine.IMAGE_SIZES["1280x720"], "JPEG"), repeat),
+        "photo_png_to_jpeg": measure(convert("/images/photo.png", None, "JPEG"), repeat),
+        "batch_save": measure(lambda: sum(
+            engine.download_image(server.url(f"/images/{name}.png"), _fresh_dir(workdir, "image"), session, "WebP")["size"]
+            for name in ("thumb", "hd")
+        ), repeat),
+    }
+
+
+def bench_batch(server, workdir, repeat, concurrency, batch_size):
+    from downloader.client import LocalClient, wait_for
+    from downloader.jobs import DONE, JobManager
+
+    url = server.url("/progressive/small.mp4")
+    manager = JobManager(workdir, workers=concurrency, interactive_reserve=0)
+    client = LocalClient(manager)
+    job_latencies = []
+
+    def task():
+        # Each job gets its own directory so identical titles do not collide
+        submitted = [
+            client.submit("media", url=url, download_dir=_fresh_dir(workdir, f"batch-{i}"), source="bench")
+            for i in range(batch_size)
+        ]
+        jobs = wait_for(client, [job["id"] for job in submitted], poll_interval=0.05)
+        failed = [job for job in jobs if job["status"] != DONE]
+        if failed:
+            raise RuntimeError(failed[0]["error"])
+        job_latencies.extend(job["finished_at"] - job["created_at"] for job in jobs)
+        return sum(_file_size(job["result"]) for job in jobs)
+
+    try:
+        result = measure(task, repeat)
+    finally:
+        manager.shutdown(wait=True)
+    result.update({"concurrency": concurrency, "batch_size": batch_size})
+    if job_latencies:
+        result["job_p50_s"] = round(_percentile(job_latencies, 50), 4)
+        result["job_p95_s"] = round(_percentile(job_latencies, 95), 4)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS, help="repeatable; default all")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--concurrency", type=int, default=4, help="batch workers")
+    parser.add_argument("--batch-size", type=int, default=8, help="downloads per batch run")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock server delay per response (s)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="mock server bytes/s per response (0 = unlimited)")
+    parser.add_argument("-o", "--output", help="write JSON here as well as stdout")
+    args = parser.parse_args(argv)
+    scenarios = args.scenario or SCENARIOS
+
+    try:
+        import yt_dlp
+    except ImportError:
+        yt_dlp = None
+
+    report = {
+        "python": sys.version.split()[0],
+        "yt_dlp": yt_dlp.version.__version__ if yt_dlp else None,
+        "ffmpeg": shutil.which("ffmpeg") is not None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: getattr(args, k) for k in ("repeat", "concurrency", "batch_size", "latency", "bandwidth")},
+        "scenarios": {},
+    }
+    workdir = tempfile.mkdtemp(prefix="downloader-bench-")
+    try:
+        # yt-dlp progress goes to stderr so stdout stays valid JSON
+        with MockMediaServer(latency=args.latency, bandwidth=args.bandwidth) as server, \
+                contextlib.redirect_stdout(sys.stderr):
+            for scenario in scenarios:
+                if yt_dlp is None and scenario != "image":
+                    report["scenarios"][scenario] = {"skipped": "yt-dlp not installed"}
+                    continue
+                print(f"Running {scenario}...", file=sys.stderr, flush=True)
+                if scenario == "progressive":
+                    result = bench_progressive(server, workdir, args.repeat)
+                elif scenario in ("hls", "dash"):
+                    result = bench_segmented(server, workdir, args.repeat, scenario)
+                elif scenario == "transcode":
+                    result = bench_transcode(server, workdir, args.repeat)
+                elif scenario == "image":
+                    result = bench_image(server, workdir, args.repeat)
+                else:
+                    result = bench_batch(server, workdir, args.repeat, args.concurrency, args.batch_size)
+                report["scenarios"][scenario] = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Local HTTP server with synthetic media for offline benchmarks
+
+Serves, from memory:
+
+* /progressive/<name>.mp4    single-file MP4 (real, via ffmpeg, when available)
+* /hls/<name>/index.m3u8     HLS media playlist + .ts segments
+* /dash/<name>/manifest.mpd  DASH SegmentList manifest + .m4s segments
+* /images/<name>.<ext>       JPEG/PNG images of several sizes (needs Pillow)
+
+Byte ranges are honoured so yt-dlp's chunked/resumed downloads behave as
+they do against a real CDN. ``latency`` and ``bandwidth`` simulate a slow
+origin.
+
+Usage:
+    python benchmarks/mock_media.py --port 8765     # serve until Ctrl+C
+"""
+import argparse
+import io
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_MIB = 1024 * 1024
+PROGRESSIVE_SIZES = {"small": 2 * _MIB, "large": 16 * _MIB}
+SEGMENTED = {"short": 8, "long": 32}     # segment count, 4s per segment
+SEGMENT_BYTES = 256 * 1024
+IMAGE_SIZES = {"thumb": (320, 180), "hd": (1920, 1080), "photo": (4000, 3000)}
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def _synthetic_mp4(size, seed):
+    """ftyp box + deterministic noise: enough for yt-dlp's generic extractor, not for ffmpeg"""
+    header = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2"
+    noise = size - len(header)
+    return header + random.Random(seed).getrandbits(noise * 8).to_bytes(noise, "little")
+
+
+def _ffmpeg_mp4(seconds):
+    """A real, decodable test clip so the FFmpeg transcode path can run"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clip.mp4")
+        subprocess.run([
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc=size=640x360:rate=25:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:v", "mpeg4", "-q:v", "5", "-c:a", "aac", "-shortest", path,
+        ], check=True)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def _ts_segment(index):
+    # MPEG-TS packets are 188 bytes starting with the 0x47 sync byte
+    packet = b"\x47" + bytes([index % 256]) * 187
+    return packet * (SEGMENT_BYTES // 188)
+
+
+def _hls_playlist(segments):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0",
+             "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for i in range(segments):
+        lines += ["#EXTINF:4.0,", f"seg-{i}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _dash_manifest(segments):
+    urls = "\n".join(f'          <SegmentURL media="seg-{i}.m4s"/>' for i in range(segments))
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S"
+     mediaPresentationDuration="PT{segments * 4}S" profiles="urn:mpeg:dash:profile:isoff-main:2011">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" contentType="video" segmentAlignment="true">
+      <Representation id="video" bandwidth="{SEGMENT_BYTES * 8 // 4}" width="640" height="360" codecs="avc1.4d401e">
+        <SegmentList timescale="1" duration="4">
+          <Initialization sourceURL="init.mp4"/>
+{urls}
+        </SegmentList>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+""".encode()
+
+
+def _image(size, fmt):
+    from PIL import Image
+    # Gradients compress like a photo far more than a flat colour does
+    img = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(size),
+        Image.radial_gradient("L").resize(size),
+        Image.linear_gradient("L").rotate(90).resize(size),
+    ))
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def build_catalog(real_media=None):
+    """path -> (bytes, content type); real_media defaults to 'ffmpeg is on PATH'"""
+    if real_media is None:
+        real_media = shutil.which("ffmpeg") is not None
+    catalog = {}
+    for seed, (name, size) in enumerate(PROGRESSIVE_SIZES.items()):
+        catalog[f"/progressive/{name}.mp4"] = (_synthetic_mp4(size, seed), "video/mp4")
+    if real_media:
+        catalog["/progressive/clip.mp4"] = (_ffmpeg_mp4(10), "video/mp4")
+    for name, segments in SEGMENTED.items():
+        catalog[f"/hls/{name}/index.m3u8"] = (_hls_playlist(segments), "application/vnd.apple.mpegurl")
+        for i in range(segments):
+            catalog[f"/hls/{name}/seg-{i}.ts"] = (_ts_segment(i), "video/mp2t")
+        catalog[f"/dash/{name}/manifest.mpd"] = (_dash_manifest(segments), "application/dash+xml")
+        catalog[f"/dash/{name}/init.mp4"] = (_synthetic_mp4(1024, 100), "video/mp4")
+        for i in range(segments):
+            catalog[f"/dash/{name}/seg-{i}.m4s"] = (_synthetic_mp4(SEGMENT_BYTES, 200 + i), "video/iso.segment")
+    try:
+        for name, size in IMAGE_SIZES.items():
+            catalog[f"/images/{name}.jpg"] = (_image(size, "JPEG"), "image/jpeg")
+            catalog[f"/images/{name}.png"] = (_image(size, "PNG"), "image/png")
+    except ImportError:
+        # No Pillow: image scenarios are skipped by the harness
+        pass
+    return catalog
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    catalog = {}
+    latency = 0.0
+    bandwidth = 0
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        entry = self.catalog.get(self.path.split("?", 1)[0])
+        if entry is None:
+            self.send_error(404)
+            return
+        body, content_type = entry
+        if self.latency:
+            time.sleep(self.latency)
+        start, end = 0, len(body) - 1
+        match = _RANGE_RE.fullmatch(self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), end) if match.group(2) else end
+            else:
+                start = max(0, len(body) - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if send_body:
+            self._write(memoryview(body)[start:end + 1])
+
+    def _write(self, view):
+        chunk = 64 * 1024
+        for offset in range(0, len(view), chunk):
+            piece = view[offset:offset + chunk]
+            self.wfile.write(piece)
+            if self.bandwidth:
+                time.sleep(len(piece) / self.bandwidth)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockMediaServer:
+    """Context manager running the catalog on 127.0.0.1 from a daemon thread"""
+
+    def __init__(self, port=0, latency=0.0, bandwidth=0, real_media=None):
+        handler = type("Handler", (_Handler,), {
+            "catalog": build_catalog(real_media),
+            "latency": latency,
+            "bandwidth": bandwidth,
+        })
+        self.catalog = handler.catalog
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def url(self, path):
+        return self.base_url + path
+
+    def has(self, path):
+        return path in self.catalog
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="mock-media", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/second per response (0 = unlimited)")
+    args = parser.parse_args(argv)
+    with MockMediaServer(args.port, args.latency, args.bandwidth) as server:
+        for path in sorted(server.catalog):
+            if not path.endswith((".ts", ".m4s")):
+                print(server.url(path))
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Startup-time benchmark for the Streamlit app
+
+Measures three things and prints them as JSON:
+
+* imports - fresh-interpreter import time of each heavy dependency
+* script  - cold first run and warm reruns of main.py in Streamlit bare mode
+* server  - seconds from `streamlit run` until /_stcore/health answers
+            (what the container healthcheck's start_period has to cover)
+
+Usage:
+    python benchmarks/startup.py                 # imports + script
+    python benchmarks/startup.py --server        # also time a real server boot
+    python benchmarks/startup.py -o startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["streamlit", "yt_dlp", "PIL.Image", "requests", "main_imports"]
+
+_IMPORT_SNIPPET = """
+import time, sys
+sys.path.insert(0, {root!r})
+t = time.perf_counter()
+{stmt}
+print(time.perf_counter() - t)
+"""
+
+_SCRIPT_SNIPPET = """
+import time, sys, runpy, os, json, warnings, logging
+warnings.filterwarnings("ignore")
+logging.disable(logging.CRITICAL)
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+timings = []
+for _ in range({runs}):
+    t = time.perf_counter()
+    try:
+        runpy.run_path("main.py", run_name="__main__")
+    except Exception as e:
+        # st.stop()/st.rerun() end a run by raising; anything else is a real failure
+        if type(e).__name__ not in ("StopException", "RerunException"):
+            raise
+    timings.append(time.perf_counter() - t)
+print(json.dumps(timings))
+"""
+
+
+def _python(code, env=None):
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    return result.stdout.strip().splitlines()[-1]
+
+
+def bench_imports(repeat):
+    """Median fresh-process import time per module"""
+    results = {}
+    for module in MODULES:
+        if module == "main_imports":
+            # Everything main.py pulls in before its first widget
+            stmt = "import streamlit, downloader.thumbnails, downloader.history, downloader.file_index, downloader.assets"
+        else:
+            stmt = f"import {module}"
+        samples = []
+        try:
+            for _ in range(repeat):
+                samples.append(float(_python(_IMPORT_SNIPPET.format(root=ROOT, stmt=stmt))))
+        except RuntimeError as e:
+            results[module] = {"error": str(e)}
+            continue
+        results[module] = {"median_s": statistics.median(samples), "min_s": min(samples)}
+    return results
+
+
+def bench_script(runs):
+    """First run (cold) vs. later runs (rerun cost) of main.py in bare mode"""
+    env = dict(os.environ, DOWNLOADER_DATA_DIR=os.environ.get("DOWNLOADER_DATA_DIR", os.path.join(ROOT, "data")))
+    try:
+        timings = json.loads(_python(_SCRIPT_SNIPPET.format(root=ROOT, runs=runs), env=env))
+    except RuntimeError as e:
+        return {"error": str(e)}
+    warm = timings[1:] or timings
+    return {"cold_s": timings[0], "rerun_median_s": statistics.median(warm), "runs": len(timings)}
+
+
+def bench_server(port, timeout):
+    """Wall time until the health endpoint answers 200"""
+    cmd = [sys.executable, "-m", "streamlit", "run", "main.py", f"--server.port={port}",
+           "--server.headless=true", "--browser.gatherUsageStats=false"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return {"healthy_after_s": time.perf_counter() - start}
+            except OSError:
+                pass
+            if proc.poll() is not None:
+                return {"error": f"streamlit exited with code {proc.returncode}"}
+            time.sleep(0.1)
+        return {"error": f"not healthy after {timeout}s"}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--runs", type=int, default=5, help="script executions (first one is the cold run)")
+    parser.add_argument("--server", action="store_true", help="also boot `streamlit run` and time the healthcheck")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--timeout", type=float, default=40.0, help="matches the compose start_period")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": sys.version.split()[0],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "imports": bench_imports(args.repeat),
+        "script": bench_script(args.runs),
+    }
+    if args.server:
+        report["server"] = bench_server(args.port, args.timeout)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Shared helpers behind the Advanced Downloader Streamlit app"""
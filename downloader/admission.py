@@ -0,0 +1,180 @@
+"""Admission control: start work only while memory, disk and the queue have room
+
+Every job has an estimated cost. Disk bytes come from the info dict's
+``filesize``/``filesize_approx``, or from ``duration`` times a typical
+bitrate, and are passed in as ``params['estimated_bytes']``. Memory is a
+per-job allowance that is larger when FFmpeg merges or converts. Before a
+worker starts a job, the controller checks:
+
+* process RSS plus the memory reserved by running jobs stays under the memory
+  budget (85% of the cgroup limit, or DOWNLOADER_MEMORY_LIMIT);
+* free disk, minus the bytes promised to running jobs, still leaves
+  DOWNLOADER_DISK_RESERVE free after this job.
+
+If a check fails, the job stays queued. Callers see ``"queued"`` with a
+``position``, and the job starts once running work frees the budget. A lone
+job is always allowed to try, so one oversized estimate cannot stall the
+queue forever. New submissions are rejected with ``Overloaded`` once
+DOWNLOADER_MAX_QUEUE jobs are waiting. ``saturated()`` feeds the API's
+``/ready`` endpoint, so nginx sends new work to another replica.
+"""
+import os
+import shutil
+import threading
+
+from downloader.metrics import REGISTRY
+
+MIB = 1024 * 1024
+# Used when the info dict has no size: bytes/second of a typical stream
+DEFAULT_BITRATES = {"video": 2_500_000 / 8, "audio": 160_000 / 8}
+DEFAULT_DISK = {"video": 300 * MIB, "media": 300 * MIB, "audio": 40 * MIB, "image": 20 * MIB, "sync": 0}
+JOB_MEMORY = 48 * MIB
+FFMPEG_MEMORY = 160 * MIB    # merges and conversions buffer in the FFmpeg child
+MEMORY_HEADROOM = 0.85
+
+ADMISSION_DEFERRED = REGISTRY.counter(
+    "downloader_admission_deferred_total", "Job starts deferred because a budget was exhausted", ["reason"])
+ADMISSION_REJECTED = REGISTRY.counter(
+    "downloader_admission_rejected_total", "Submissions rejected because the queue was full")
+INFLIGHT_BYTES = REGISTRY.gauge(
+    "downloader_inflight_estimated_bytes", "Estimated bytes still to be written by running jobs")
+
+
+class Overloaded(Exception):
+    """The queue is full; try again later"""
+
+
+def estimate_bytes(info, fmt=None, kind="video"):
+    """Expected download size from an info dict (and optionally the chosen format), or None"""
+    for source in (fmt, info):
+        if source:
+            size = source.get("filesize") or source.get("filesize_approx")
+            if size:
+                return int(size)
+    duration = (info or {}).get("duration")
+    if duration:
+        tbr = (fmt or {}).get("tbr") or (info or {}).get("tbr")
+        rate = tbr * 1000 / 8 if tbr else DEFAULT_BITRATES["audio" if kind == "audio" else "video"]
+        return int(duration * rate)
+    return None
+
+
+def job_cost(kind, params):
+    """(disk_bytes, memory_bytes) a job is expected to need"""
+    disk = params.get("estimated_bytes") or DEFAULT_DISK.get(kind, DEFAULT_DISK["media"])
+    if kind == "media" and params.get("as_audio") and not params.get("estimated_bytes"):
+        disk = DEFAULT_DISK["audio"]
+    converts = (
+        (kind == "audio" and params.get("audio_format", "mp3") in ("mp3", "m4a"))
+        or (kind == "media" and params.get("as_audio"))
+        or kind == "video"    # format strategies may merge video+audio
+    )
+    return int(disk), JOB_MEMORY + (FFMPEG_MEMORY if converts else 0)
+
+
+def _cgroup_memory_limit():
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class AdmissionController:
+    """Tracks what running jobs have reserved and decides whether the next one may start"""
+
+    def __init__(self, download_dir, memory_limit=None, disk_reserve=512 * MIB, max_queue=None):
+        self.download_dir = download_dir
+        self.memory_budget = int(memory_limit * MEMORY_HEADROOM) if memory_limit else None
+        self.disk_reserve = disk_reserve
+        self.max_queue = max_queue
+        self._reserved = {}          # job_id -> (disk, memory)
+        self._lock = threading.Lock()
+        self.last_reason = None
+
+    @classmethod
+    def from_env(cls, download_dir, limit_queue=True):
+        """Budgets from DOWNLOADER_MEMORY_LIMIT / DOWNLOADER_DISK_RESERVE / DOWNLOADER_MAX_QUEUE"""
+        from downloader.bandwidth import parse_rate
+        memory_limit = parse_rate(os.environ.get("DOWNLOADER_MEMORY_LIMIT")) or _cgroup_memory_limit()
+        disk_reserve = parse_rate(os.environ.get("DOWNLOADER_DISK_RESERVE") or "512M")
+        max_queue = int(os.environ.get("DOWNLOADER_MAX_QUEUE") or 200) if limit_queue else None
+        return cls(download_dir, memory_limit, disk_reserve or 0, max_queue or None)
+
+    def check_submit(self, queued):
+        """Raise Overloaded when `queued` jobs are already waiting"""
+        if self.max_queue and queued >= self.max_queue:
+            ADMISSION_REJECTED.inc()
+            raise Overloaded(f"Server busy: {queued} jobs already queued, try again shortly")
+
+    def _free_disk(self):
+        try:
+            return shutil.disk_usage(self.download_dir).free
+        except OSError:
+            return None
+
+    def _blocked_by(self, disk, memory):
+        """Name of the exhausted budget, or None; caller holds the lock"""
+        if self.memory_budget:
+            rss = rss_bytes()
+            reserved = sum(m for _, m in self._reserved.values())
+            if rss is not None and rss + reserved + memory > self.memory_budget:
+                return "memory"
+        free = self._free_disk()
+        if free is not None:
+            promised = sum(d for d, _ in self._reserved.values())
+            if free - promised - disk < self.disk_reserve:
+                return "disk"
+        return None
+
+    def try_start(self, job_id, kind, params):
+        """Reserve budget for a job; returns None on success or the reason it must wait"""
+        disk, memory = job_cost(kind, params)
+        with self._lock:
+            reason = self._blocked_by(disk, memory) if self._reserved else None
+            if reason is None:
+                self._reserved[job_id] = (disk, memory)
+                INFLIGHT_BYTES.set(sum(d for d, _ in self._reserved.values()))
+            self.last_reason = reason
+        if reason is not None:
+            ADMISSION_DEFERRED.inc(reason=reason)
+        return reason
+
+    def finish(self, job_id):
+        with self._lock:
+            self._reserved.pop(job_id, None)
+            INFLIGHT_BYTES.set(sum(d for d, _ in self._reserved.values()))
+
+    def saturated(self, queued=0):
+        """Reason this replica should not take new work right now, or None"""
+        if self.max_queue and queued >= self.max_queue:
+            return "queue"
+        with self._lock:
+            # Could a typical job start now?
+            reason = self._blocked_by(DEFAULT_DISK["media"], JOB_MEMORY) if self._reserved else None
+        return reason
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "running": len(self._reserved),
+                "inflight_bytes": sum(d for d, _ in self._reserved.values()),
+                "reserved_memory": sum(m for _, m in self._reserved.values()),
+                "memory_budget": self.memory_budget,
+                "rss": rss_bytes(),
+                "free_disk": self._free_disk(),
+                "deferred_by": self.last_reason,
+            }
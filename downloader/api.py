@@ -0,0 +1,305 @@
+"""Headless HTTP/JSON API over the job queue (Tornado, which ships with Streamlit)
+
+Endpoints:
+    GET  /health                  liveness
+    GET  /ready                   503 while memory, disk or the queue is saturated (for nginx)
+    GET  /upstreams               hosts whose circuit breaker is open or half-open (downloader.breaker)
+    POST /jobs                    {"kind": "video|audio|media|image|sync", "url": ..., options} -> 202 job
+                                  (503 + Retry-After when the queue is full)
+                                  ("priority": "interactive|bulk" and "client_id" feed the scheduler;
+                                  video/audio take "clip_start"/"clip_end" seconds for an excerpt;
+                                  "sync" queues a playlist's new videos, see downloader.sync)
+    GET  /jobs                    most recent jobs
+    GET  /jobs/<id>               job status, progress and result
+    GET  /jobs/<id>/file          the finished file
+    GET  /jobs/<id>/stream        the file while it downloads (progressive formats); the finished file after
+    GET  /files/<path>            signed ?expires=&sig= link (downloader.links); nginx sends the bytes
+
+Run standalone with ``python -m downloader.api --port 8600``; the Streamlit
+app also starts it in-process when DOWNLOADER_API_PORT is set.
+
+The job endpoints list every job and serve any finished file, so keep the
+API on a private network. When DOWNLOADER_API_TOKEN is set they also require
+``Authorization: Bearer <token>``; /health, /ready and the signed /files/
+links stay open.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import mimetypes
+import os
+import threading
+import time
+
+from downloader import breaker, links
+from downloader.jobs import DONE, FAILED, JOB_HANDLERS, Overloaded
+
+# Options a remote client may set per job kind; everything else (notably
+# download_dir) is decided by the server
+ALLOWED_PARAMS = {
+    "video": {"url", "audio_guaranteed", "format_strategies", "minimal", "history_type", "client_id", "priority",
+              "estimated_bytes", "clip_start", "clip_end", "clip_precise"},
+    "audio": {"url", "audio_format", "history_type", "client_id", "priority", "estimated_bytes",
+              "clip_start", "clip_end", "clip_precise"},
+    "media": {"url", "as_audio", "source", "history_type", "client_id", "priority", "estimated_bytes"},
+    "image": {"url", "image_format", "history_type", "client_id", "priority"},
+    "sync": {"url", "as_audio", "history_type", "client_id", "priority"},
+}
+
+_CHUNK_SIZE = 256 * 1024
+STREAM_START_TIMEOUT = 120  # seconds a stream request waits for a queued job's first bytes
+_STREAM_POLL = 0.25
+
+
+def make_app(manager):
+    import tornado.web
+
+    class BaseHandler(tornado.web.RequestHandler):
+        public = False  # reachable without DOWNLOADER_API_TOKEN
+
+        def prepare(self):
+            token = api_token()
+            if token and not self.public:
+                supplied = self.request.headers.get("Authorization", "")
+                if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+                    raise tornado.web.HTTPError(401, reason="missing or invalid API token")
+
+        def write_json(self, payload, status=200):
+            self.set_status(status)
+            self.set_header("Content-Type", "application/json")
+            self.finish(json.dumps(payload, default=str))
+
+        def write_error(self, status_code, **kwargs):
+            self.write_json({"error": self._reason}, status_code)
+
+        def job_or_404(self, job_id):
+            job = manager.get(job_id)
+            if job is None:
+                raise tornado.web.HTTPError(404, reason="unknown job")
+            return job
+
+    class HealthHandler(BaseHandler):
+        public = True
+
+        def get(self):
+            self.write_json({"status": "ok"})
+
+    class ReadyHandler(BaseHandler):
+        public = True
+
+        def get(self):
+            reason = manager.saturated()
+            if reason:
+                self.set_header("Retry-After", "5")
+                self.write_json({"status": "saturated", "reason": reason}, 503)
+            else:
+                self.write_json({"status": "ready"})
+
+    class UpstreamsHandler(BaseHandler):
+        def get(self):
+            self.write_json(breaker.snapshot())
+
+    class JobsHandler(BaseHandler):
+        def get(self):
+            try:
+                limit = int(self.get_query_argument("limit", "50"))
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                raise tornado.web.HTTPError(400, reason="limit must be a positive integer")
+            self.write_json({"jobs": [job.to_dict() for job in manager.list(limit)]})
+
+        def post(self):
+            try:
+                body = json.loads(self.request.body or b"{}")
+            except ValueError:
+                raise tornado.web.HTTPError(400, reason="body must be JSON")
+            kind = body.get("kind", "video")
+            if kind not in JOB_HANDLERS:
+                raise tornado.web.HTTPError(400, reason=f"kind must be one of {sorted(JOB_HANDLERS)}")
+            params = {k: v for k, v in body.items() if k in ALLOWED_PARAMS[kind]}
+            try:
+                job = manager.submit(kind, params)
+            except Overloaded as e:
+                self.set_header("Retry-After", "5")
+                raise tornado.web.HTTPError(503, reason=str(e))
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, reason=str(e))
+            self.set_header("Location", f"/jobs/{job.id}")
+            self.write_json(job.to_dict(), 202)
+
+    class JobHandler(BaseHandler):
+        def get(self, job_id):
+            self.write_json(self.job_or_404(job_id).to_dict())
+
+    class FileHandler(BaseHandler):
+        async def send_file(self, path, file_name):
+            """Hand the transfer to nginx when offload is on and the file is under the downloads root"""
+            rel_path = links.relative_path(path, manager.download_dir)
+            if links.accel_prefix() and rel_path is not None:
+                for name, value in links.accel_headers(rel_path, file_name).items():
+                    self.set_header(name, value)
+                self.finish()
+                return
+            self.set_header("Content-Type", "application/octet-stream")
+            self.set_header("Content-Length", str(os.path.getsize(path)))
+            self.set_header("Content-Disposition", links.content_disposition(file_name))
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.write(chunk)
+                    await self.flush()
+            self.finish()
+
+    class JobFileHandler(FileHandler):
+        async def get(self, job_id):
+            job = self.job_or_404(job_id)
+            if job.status != DONE or not (job.result or {}).get("file_path"):
+                raise tornado.web.HTTPError(409, reason=f"job is {job.status}")
+            path = job.result["file_path"]
+            if not os.path.isfile(path):
+                raise tornado.web.HTTPError(410, reason="file no longer exists")
+            await self.send_file(path, job.result.get("file_name") or os.path.basename(path))
+
+    class JobStreamHandler(FileHandler):
+        """Follows the growing .part file of a running download and ends with the download
+
+        The file descriptor stays open across yt-dlp's rename of the .part
+        file, so the bytes served are exactly what was written. A download
+        that fails part-way closes the connection without the final chunk,
+        so clients see a truncated response rather than a short file.
+        """
+
+        async def get(self, job_id):
+            job = self.job_or_404(job_id)
+            deadline = time.monotonic() + STREAM_START_TIMEOUT
+            while not job.finished and not job.progress.get("partial_file"):
+                if job.progress.get("downloaded_bytes"):
+                    break  # downloading, but not as one growing file: nothing to follow
+                if time.monotonic() > deadline:
+                    raise tornado.web.HTTPError(504, reason="download has not started")
+                await asyncio.sleep(_STREAM_POLL)
+                job = self.job_or_404(job_id)
+            if job.status == DONE and (job.result or {}).get("file_path") and os.path.isfile(job.result["file_path"]):
+                await self.send_file(job.result["file_path"], job.result.get("file_name")
+                                     or os.path.basename(job.result["file_path"]))
+                return
+            if job.finished or not job.progress.get("streamable"):
+                raise tornado.web.HTTPError(409, reason=f"job is {job.status}; fetch /jobs/{job_id}/file when done")
+            f = _open_first(job.progress["partial_file"], job.progress.get("file"))
+            if f is None:
+                raise tornado.web.HTTPError(409, reason="file is being postprocessed; fetch it when done")
+            file_name = os.path.basename(job.progress.get("file") or job.progress["partial_file"])
+            self.set_header("Content-Type", mimetypes.guess_type(file_name)[0] or "application/octet-stream")
+            self.set_header("Content-Disposition", links.content_disposition(file_name, "inline"))
+            with f:
+                complete = False
+                while True:
+                    chunk = f.read(_CHUNK_SIZE)
+                    if chunk:
+                        self.write(chunk)
+                        await self.flush()
+                        continue
+                    if complete:
+                        break
+                    job = manager.get(job_id)
+                    if job is None or job.status == FAILED:
+                        self.detach().close()
+                        return
+                    # Once the download itself finished, whatever is left to read is the rest of the file
+                    complete = job.finished or job.progress.get("phase") == "postprocessing"
+                    if not complete:
+                        await asyncio.sleep(_STREAM_POLL)
+            self.finish()
+
+    class SignedFileHandler(FileHandler):
+        public = True  # the signature is the authorization
+
+        async def get(self, rel_path):
+            file_name = self.get_query_argument("name", None)
+            if not links.verify(rel_path, self.get_query_argument("expires", None),
+                                self.get_query_argument("sig", None), file_name):
+                raise tornado.web.HTTPError(403, reason="link is invalid or has expired")
+            path = os.path.join(manager.download_dir, *rel_path.split("/"))
+            if links.relative_path(path, manager.download_dir) != rel_path or not os.path.isfile(path):
+                raise tornado.web.HTTPError(404, reason="file not found")
+            await self.send_file(path, file_name or os.path.basename(path))
+
+    return tornado.web.Application([
+        (r"/health", HealthHandler),
+        (r"/ready", ReadyHandler),
+        (r"/upstreams", UpstreamsHandler),
+        (r"/jobs", JobsHandler),
+        (r"/jobs/([0-9a-f]+)", JobHandler),
+        (r"/jobs/([0-9a-f]+)/file", JobFileHandler),
+        (r"/jobs/([0-9a-f]+)/stream", JobStreamHandler),
+        (r"/files/(.+)", SignedFileHandler),
+    ])
+
+
+def api_token():
+    """DOWNLOADER_API_TOKEN, or None when the API is left to network-level protection"""
+    return os.environ.get("DOWNLOADER_API_TOKEN", "").strip() or None
+
+
+def _open_first(*paths):
+    """The first of paths that can be opened for reading (the .part file may just have been renamed)"""
+    for path in paths:
+        if path:
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                continue
+    return None
+
+
+def serve_in_thread(manager, port, addr="0.0.0.0"):
+    """Bind now (so errors surface to the caller) and serve from a daemon thread"""
+    import tornado.httpserver
+    import tornado.netutil
+
+    sockets = tornado.netutil.bind_sockets(port, addr)
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = tornado.httpserver.HTTPServer(make_app(manager))
+        server.add_sockets(sockets)
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="downloader-api", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    from downloader.history import HistoryStore
+    from downloader.job_store import open_job_store
+    from downloader.jobs import JobManager
+
+    parser = argparse.ArgumentParser(description="Headless download API")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DOWNLOADER_API_PORT") or 8600))
+    parser.add_argument("--addr", default="0.0.0.0")
+    parser.add_argument("--download-dir", default=os.environ.get("DOWNLOADER_DOWNLOAD_DIR") or os.path.join(os.getcwd(), "downloads"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("DOWNLOADER_WORKERS") or 2))
+    parser.add_argument("--job-store", default=os.environ.get("DOWNLOADER_JOB_STORE", "memory"),
+                        help="memory, sqlite or sqlite:/path (shared by replicas)")
+    args = parser.parse_args(argv)
+
+    import tornado.httpserver
+    import tornado.ioloop
+    from downloader.sessions import create_session
+
+    manager = JobManager(args.download_dir, workers=args.workers, history=HistoryStore(),
+                         http_session=create_session(), store=open_job_store(args.job_store))
+    server = tornado.httpserver.HTTPServer(make_app(manager))
+    server.listen(args.port, args.addr)
+    print(f"Downloader API listening on http://{args.addr}:{args.port} (downloads -> {args.download_dir})")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
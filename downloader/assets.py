@@ -0,0 +1,170 @@
+"""Static CSS and HTML for the Streamlit page, built once per process"""
+
+# Mobile-responsive CSS
+MOBILE_CSS = """
+<style>
+    /* Mobile-first responsive design */
+    .stApp {
+        max-width: 100%;
+        padding: 0.5rem;
+    }
+    
+    /* Mobile-friendly button styling */
+    .stButton > button {
+        width: 100%;
+        border-radius: 20px;
+        border: none;
+        padding: 0.75rem 1rem;
+        font-size: 16px;
+        font-weight: 600;
+        transition: all 0.3s ease;
+    }
+    
+    /* Responsive columns for mobile */
+    @media (max-width: 768px) {
+        .row-widget.stHorizontal {
+            flex-direction: column;
+        }
+        
+        .stButton > button {
+            margin-bottom: 0.5rem;
+        }
+        
+        .stSelectbox, .stTextInput {
+            margin-bottom: 1rem;
+        }
+        
+        /* Make metrics stack vertically on mobile */
+        .metric-container {
+            display: flex;
+            flex-direction: column;
+        }
+    }
+    
+    /* Improve text input for mobile */
+    .stTextInput > div > div > input {
+        font-size: 16px;
+        padding: 12px;
+        border-radius: 10px;
+    }
+    
+    /* Better textarea for mobile */
+    .stTextArea textarea {
+        font-size: 16px;
+        padding: 12px;
+        border-radius: 10px;
+        min-height: 120px;
+    }
+    
+    /* Responsive images */
+    .stImage {
+        max-width: 100%;
+        height: auto;
+    }
+    
+    /* Mobile-friendly expanders */
+    .streamlit-expanderHeader {
+        font-size: 16px;
+        padding: 12px;
+    }
+    
+    /* Better spacing for mobile */
+    .element-container {
+        margin-bottom: 1rem;
+    }
+    
+    /* Responsive sidebar */
+    .css-1d391kg {
+        padding: 1rem 0.5rem;
+    }
+    
+    /* Download button styling */
+    .download-button {
+        background: linear-gradient(45deg, #FF6B6B, #4ECDC4);
+        color: white;
+        border: none;
+        padding: 15px 25px;
+        border-radius: 25px;
+        font-size: 16px;
+        font-weight: bold;
+        cursor: pointer;
+        width: 100%;
+        margin: 10px 0;
+        transition: all 0.3s ease;
+    }
+    
+    .download-button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 5px 15px rgba(0,0,0,0.2);
+    }
+</style>
+"""
+
+# App title banner
+APP_TITLE_HTML = """
+<div style='text-align: center; padding: 1rem 0;'>
+    <h1 style='color: #FF4B4B; font-size: clamp(1.5rem, 5vw, 2.5rem); margin-bottom: 0.5rem;'>🎬 Advanced Downloader</h1>
+</div>
+"""
+
+# Mobile-friendly sidebar notice
+SIDEBAR_TIP_HTML = """
+<div style='background: #f0f2f6; padding: 10px; border-radius: 8px; margin-bottom: 1rem;'>
+    <p style='margin: 0; font-size: 12px; color: #666;'>
+        📱 <strong>Mobile Tip:</strong> Swipe from left edge to access settings
+    </p>
+</div>
+"""
+
+# Sidebar troubleshooting guide (markdown, not HTML)
+TROUBLESHOOTING_MD = """
+    **🔇 No Audio in Downloaded Video?**
+    
+    ✅ **Solution:**
+    - Choose options marked "w/ Audio"
+    - Avoid "Best Quality" unless you need max resolution
+    
+    **📋 HTTP Error 403: Forbidden**
+    
+    🔄 **Quick Fixes:**
+    - Wait 5-10 minutes before trying again
+    - Try a different video first
+    - Copy URL directly from YouTube
+    
+    📋 **Why this happens:**
+    - YouTube blocks automated downloads
+    - Too many requests from your IP
+    - Video has regional restrictions
+    
+    💡 **Mobile Tips:**
+    - Use Wi-Fi for better downloads
+    - Download one video at a time
+    - Paste URLs carefully (long-press)
+    - Files save to Downloads automatically
+    """
+
+# Mobile users guide
+MOBILE_GUIDE_HTML = """
+<div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 1rem; border-radius: 10px; margin: 1rem 0;'>
+    <h4 style='color: white; margin: 0 0 0.5rem 0;'>📱 Mobile Users Guide</h4>
+    <div style='color: #f0f0f0; font-size: 14px;'>
+        <p style='margin: 0.3rem 0;'>✅ <strong>Paste URLs:</strong> Long-press in URL field to paste YouTube links</p>
+        <p style='margin: 0.3rem 0;'>✅ <strong>Download files:</strong> Tap download button to save to your device</p>
+        <p style='margin: 0.3rem 0;'>✅ <strong>Audio guaranteed:</strong> Choose "w/ Audio" options for video with sound</p>
+        <p style='margin: 0.3rem 0;'>✅ <strong>File location:</strong> Files save to your Downloads folder automatically</p>
+    </div>
+</div>
+"""
+
+# Mobile-responsive footer
+FOOTER_HTML = """
+    <div style='text-align: center; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 15px; margin: 20px 0;'>
+        <h4 style='color: white; margin-bottom: 10px;'>🎬 Advanced Downloader v3.1</h4>
+        <p style='color: #f0f0f0; margin: 5px 0;'>Made with ❤️ by <a href="https://github.com/Mohitkumar2007" style='color: #FFD700;'>Mohit Kumar A</a></p>
+        <p style='font-size: clamp(10px, 2.5vw, 12px); color: #e0e0e0; margin: 10px 0;'>📱 Mobile Optimized • 🔊 Audio Guaranteed • 📁 Downloads Folder • ✨ Smart Quality Selection</p>
+        <div style='margin-top: 15px; padding: 10px; background: rgba(255,255,255,0.1); border-radius: 10px;'>
+            <p style='color: #FFD700; font-size: clamp(10px, 2.5vw, 12px); margin: 0;'>🚀 <strong>Pro Tip for Mobile Users:</strong></p>
+            <p style='color: #f0f0f0; font-size: clamp(8px, 2vw, 10px); margin: 5px 0 0 0;'>Tap and hold download links to save directly to your device!</p>
+        </div>
+    </div>
+    """
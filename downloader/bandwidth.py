@@ -0,0 +1,209 @@
+"""Global bandwidth budget shared by every running download
+
+Set DOWNLOADER_BANDWIDTH_LIMIT (bytes/second, with K/M/G suffixes, e.g. "20M")
+to cap what this process pulls from the network. Each running job leases an
+allocation with its own token bucket. The budget is split by weighted
+water-filling: interactive jobs weigh more than bulk ones, and jobs that
+cannot use their share give the rest to the others. Shares are recomputed
+whenever a job starts or finishes and about once a second while jobs run.
+
+Downloads report their bytes through ``consume``: yt-dlp via a progress
+hook and image fetches per streamed chunk. The calling thread sleeps when
+it is ahead of its allocation. yt-dlp's own ``ratelimit`` is not used
+because it averages over the whole download, so lowering it mid-download
+would stall the job.
+"""
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from downloader.metrics import REGISTRY
+from downloader.scheduler import BULK, INTERACTIVE
+
+PRIORITY_WEIGHTS = {INTERACTIVE: 4.0, BULK: 1.0}
+MIN_RATE = 16 * 1024          # nobody is starved below this
+BURST_SECONDS = 0.5           # bucket depth
+MAX_SLEEP = 0.25              # re-read the rate at least this often while throttled
+# Small, fixed read size so throttling is smooth instead of 4 MiB bursts
+THROTTLED_YDL_OPTS = {'buffersize': 64 * 1024, 'noresizebuffer': True}
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_LIMIT_RE = re.compile(r"^\s*([\d.]+)\s*([KMG]?)(?:i?B)?(?:/s)?\s*$", re.IGNORECASE)
+
+_active = threading.local()
+
+BUDGET = REGISTRY.gauge(
+    "downloader_bandwidth_budget_bytes_per_second", "Configured global download budget (0 = unlimited)")
+ALLOCATED = REGISTRY.gauge(
+    "downloader_bandwidth_allocated_bytes_per_second", "Bandwidth currently allocated to running jobs", ["priority"])
+
+
+def parse_rate(value):
+    """"20M" -> 20971520 bytes/s; empty or 0 means unlimited (None)"""
+    if value in (None, ""):
+        return None
+    match = _LIMIT_RE.match(str(value))
+    if not match:
+        raise ValueError(f"Cannot parse bandwidth limit {value!r} (examples: 500K, 20M, 1G)")
+    rate = int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+    return rate or None
+
+
+class Allocation:
+    """One job's share: a token bucket whose rate the governor adjusts live"""
+
+    def __init__(self, governor, priority):
+        self.governor = governor
+        self.priority = priority
+        self.weight = PRIORITY_WEIGHTS.get(priority, 1.0)
+        self.rate = None
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._window_start = self._last
+        self._window_bytes = 0
+        self._throttled = True  # new jobs are assumed to want their full share
+        self._seen = {}
+        # Segmented downloads report from several threads; never held while sleeping
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self):
+        return bool(self.governor.limit)
+
+    def consume(self, nbytes):
+        """Account for nbytes just received; sleeps while over the allocation"""
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self._window_bytes += nbytes
+            if self.rate is None:
+                return
+            self._tokens -= nbytes
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                rate = max(self.rate or MIN_RATE, 1)
+                self._tokens = min(rate * BURST_SECONDS, self._tokens + (now - self._last) * rate)
+                self._last = now
+                if self._tokens >= 0:
+                    break
+                self._throttled = True
+                delay = min(-self._tokens / rate, MAX_SLEEP)
+            time.sleep(delay)
+            # A throttled job may be owed a bigger share by now
+            self.governor.maybe_rebalance()
+        self.governor.maybe_rebalance()
+
+    def progress_hook(self, d):
+        """yt-dlp progress hook: feed byte deltas per file into consume()"""
+        if d.get("status") != "downloading":
+            return
+        key = d.get("filename") or d.get("tmpfilename")
+        downloaded = d.get("downloaded_bytes") or 0
+        with self._lock:
+            # Reports from parallel segments can arrive out of order; count each byte once
+            seen = self._seen.get(key, 0)
+            self._seen[key] = max(seen, downloaded)
+        self.consume(downloaded - seen)
+
+    def _demand(self, now):
+        """Rate this job could use: unbounded if it hit its limit, else what it used plus headroom"""
+        with self._lock:
+            elapsed = now - self._window_start
+            observed = self._window_bytes / elapsed if elapsed > 0 else 0
+            demand = float("inf") if self._throttled or elapsed < 0.5 else max(MIN_RATE, observed * 1.25)
+            self._window_start, self._window_bytes, self._throttled = now, 0, False
+        return demand
+
+
+class BandwidthGovernor:
+    """Splits a global bytes/second budget across the allocations currently leased"""
+
+    def __init__(self, limit=None, rebalance_interval=1.0):
+        self.limit = limit
+        self.rebalance_interval = rebalance_interval
+        self._allocations = []
+        self._lock = threading.Lock()
+        self._last_rebalance = 0.0
+        BUDGET.set(limit or 0)
+
+    @classmethod
+    def from_env(cls):
+        return cls(parse_rate(os.environ.get("DOWNLOADER_BANDWIDTH_LIMIT")))
+
+    @contextmanager
+    def lease(self, priority=INTERACTIVE):
+        """Allocation for one job, active on this thread for the duration"""
+        allocation = Allocation(self, priority)
+        with self._lock:
+            self._allocations.append(allocation)
+            self._rebalance()
+        previous = current()
+        activate(allocation)
+        try:
+            yield allocation
+        finally:
+            activate(previous)
+            with self._lock:
+                self._allocations.remove(allocation)
+                self._rebalance()
+
+    def maybe_rebalance(self):
+        if time.monotonic() - self._last_rebalance < self.rebalance_interval:
+            return
+        with self._lock:
+            self._rebalance()
+
+    def _rebalance(self):
+        now = time.monotonic()
+        self._last_rebalance = now
+        allocations = list(self._allocations)
+        if not self.limit:
+            for allocation in allocations:
+                allocation.rate = None
+            return
+        # Weighted water-filling: satisfy small demands first, share the rest by weight
+        demands = {id(a): a._demand(now) for a in allocations}
+        pending, remaining = allocations, float(self.limit)
+        while pending:
+            total_weight = sum(a.weight for a in pending)
+            satisfied = [a for a in pending if demands[id(a)] <= remaining * a.weight / total_weight]
+            if not satisfied:
+                for a in pending:
+                    a.rate = max(MIN_RATE, remaining * a.weight / total_weight)
+                break
+            for a in satisfied:
+                a.rate = max(MIN_RATE, demands[id(a)])
+                remaining -= demands[id(a)]
+            pending = [a for a in pending if a not in satisfied]
+        for priority in PRIORITY_WEIGHTS:
+            ALLOCATED.set(sum(a.rate or 0 for a in allocations if a.priority == priority), priority=priority)
+
+    def snapshot(self):
+        """[(priority, bytes/s)] for running jobs, for status displays"""
+        with self._lock:
+            return [(a.priority, a.rate) for a in self._allocations]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_governor():
+    """Process-wide governor configured from DOWNLOADER_BANDWIDTH_LIMIT"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = BandwidthGovernor.from_env()
+        return _default
+
+
+def activate(allocation):
+    _active.allocation = allocation
+
+
+def current():
+    """The allocation leased on this thread, or None"""
+    return getattr(_active, "allocation", None)
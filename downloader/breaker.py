@@ -0,0 +1,226 @@
+"""Circuit breakers per upstream host, so an upstream outage fails fast
+
+Each pool of upstream calls ("extract" for yt-dlp metadata, "download" for
+media and image transfers) keeps one breaker per host (see
+``concurrency.host_key``):
+
+* closed: calls go through and their outcomes are recorded. When at least
+  ``min_requests`` calls in the last ``window`` seconds finished and
+  ``failure_ratio`` of them failed because of the upstream, the breaker opens;
+* open: calls fail at once with ``CircuitOpen`` and no request is sent. After
+  ``cooldown`` seconds the breaker turns half-open;
+* half-open: one probe call goes through. Success closes the breaker; failure
+  opens it again with twice the cooldown (up to ``max_cooldown``).
+
+Only failures that say the upstream itself is in trouble count: 403 blocks,
+429, 5xx and timeouts. A private or removed video is the upstream answering
+normally. Interactive callers get ``CircuitOpen`` straight away. The job
+queue leaves bulk jobs for an open host queued until it turns half-open.
+
+DOWNLOADER_CIRCUIT_BREAKER=0 turns breakers off; DOWNLOADER_BREAKER_COOLDOWN
+sets the first cooldown in seconds (default 30).
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+from downloader.concurrency import host_key
+from downloader.errors import CIRCUIT_OPEN, FORBIDDEN, NETWORK, RATE_LIMITED, SERVER, classify
+from downloader.metrics import REGISTRY
+from downloader.pipeline import DOWNLOAD, EXTRACT  # noqa: F401  (the pools)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_UPSTREAM_FAILURES = (FORBIDDEN, RATE_LIMITED, SERVER, NETWORK)
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "downloader_circuit_state", "Circuit breaker state per pool and upstream host (0 closed, 1 half-open, 2 open)",
+    ["pool", "host"])
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "downloader_circuit_transitions_total", "Circuit breaker state changes", ["pool", "state"])
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "downloader_circuit_rejected_total", "Calls failed fast by an open circuit breaker", ["pool"])
+
+
+def breakers_enabled():
+    return os.environ.get("DOWNLOADER_CIRCUIT_BREAKER", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    error_class = CIRCUIT_OPEN
+
+    def __init__(self, pool, host, retry_after):
+        super().__init__(f"{host} is failing; {pool} requests are paused for {retry_after:.0f}s")
+        self.pool = pool
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state for one upstream host"""
+
+    def __init__(self, window=60.0, min_requests=5, failure_ratio=0.5, cooldown=30.0, max_cooldown=300.0,
+                 on_change=None):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.on_change = on_change        # on_change(breaker), called under the lock
+        self.state = CLOSED
+        self.cooldown = cooldown
+        self.opened_at = None
+        self._outcomes = deque()          # (finished_at, failed)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self, now=None):
+        """Seconds until an open breaker lets a probe through (0 unless open)"""
+        if self.state != OPEN:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def blocked(self):
+        """True while calls would be refused; does not use up the half-open probe"""
+        with self._lock:
+            return self.state == OPEN and self.retry_after() > 0 or self.state == HALF_OPEN and self._probing
+
+    def allow(self):
+        """May a call go through now? In half-open state only one probe at a time does"""
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, failed):
+        """Outcome of a call that allow() let through"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                    self._open(now)
+                else:
+                    self.cooldown = self.base_cooldown
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                return
+            if self.state != CLOSED:
+                return  # a call started before the breaker opened
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, f in self._outcomes if f)
+            if len(self._outcomes) >= self.min_requests and failures >= self.failure_ratio * len(self._outcomes):
+                self._open(now)
+
+    def _open(self, now):
+        self.opened_at = now
+        self._outcomes.clear()
+        self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_change is not None:
+                self.on_change(self)
+
+
+class BreakerBoard:
+    """One CircuitBreaker per upstream host for a pool of calls"""
+
+    def __init__(self, pool, cooldown=None, max_hosts=256):
+        self.pool = pool
+        self.cooldown = cooldown or float(os.environ.get("DOWNLOADER_BREAKER_COOLDOWN") or 30)
+        self.max_hosts = max_hosts
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(cooldown=self.cooldown, on_change=functools.partial(self._changed, host))
+                self._breakers[host] = breaker
+                if len(self._breakers) > self.max_hosts:
+                    # Forget the oldest closed breaker (one-off image hosts in big batches)
+                    for old, candidate in list(self._breakers.items()):
+                        if candidate.state == CLOSED and old != host:
+                            del self._breakers[old]
+                            break
+            return breaker
+
+    def _changed(self, host, breaker):
+        CIRCUIT_TRANSITIONS.inc(pool=self.pool, state=breaker.state)
+        CIRCUIT_STATE.set(_STATE_VALUES[breaker.state], pool=self.pool, host=host)
+
+    def guard(self, url):
+        """Context manager around one upstream call; raises CircuitOpen instead of making it"""
+        return _Guard(self, host_key(url))
+
+    def blocked(self, url):
+        return breakers_enabled() and self.breaker(host_key(url)).blocked()
+
+    def retry_after(self, url):
+        """Seconds until url's host lets a probe through (0 unless open)"""
+        return self.breaker(host_key(url)).retry_after()
+
+    def snapshot(self):
+        """{host: {state, retry_after}} for hosts whose breaker is not closed"""
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {host: {"state": breaker.state, "retry_after": round(breaker.retry_after(), 1)}
+                for host, breaker in breakers if breaker.state != CLOSED}
+
+
+class _Guard:
+    def __init__(self, board, host):
+        self.board = board
+        self.host = host
+        self.breaker = None
+
+    def __enter__(self):
+        if not breakers_enabled():
+            return self
+        self.breaker = self.board.breaker(self.host)
+        if not self.breaker.allow():
+            CIRCUIT_REJECTED.inc(pool=self.board.pool)
+            raise CircuitOpen(self.board.pool, self.host, self.breaker.retry_after())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.breaker is not None:
+            self.breaker.record(exc is not None and classify(exc) in _UPSTREAM_FAILURES)
+        return False
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+
+
+def board(pool):
+    """The process-wide BreakerBoard for a pool (EXTRACT or DOWNLOAD)"""
+    with _boards_lock:
+        if pool not in _boards:
+            _boards[pool] = BreakerBoard(pool)
+        return _boards[pool]
+
+
+def snapshot():
+    """{pool: {host: {state, retry_after}}} for every breaker that is open or half-open"""
+    with _boards_lock:
+        boards = list(_boards.values())
+    snapshots = {b.pool: b.snapshot() for b in boards}
+    return {pool: hosts for pool, hosts in snapshots.items() if hosts}
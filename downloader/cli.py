@@ -0,0 +1,286 @@
+"""Command-line entry points (``python -m downloader ...``)
+
+    python -m downloader batch urls.txt --concurrency 4 --format audio -o results.jsonl
+    python -m downloader sync playlists.txt --format audio --every 168
+
+Runs the same engine and job queue as the Streamlit batch/playlist pages,
+without a browser session. Progress goes to stderr, one JSON line per URL
+goes to --output (stdout by default). Exit code is 0 when every URL
+succeeded, 1 when any failed and 2 for usage errors.
+
+``sync`` downloads only the videos added to each playlist or channel since
+its last sync (see downloader.sync). Run it from cron, or keep it running
+with --every HOURS.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from downloader import engine
+from downloader.admission import AdmissionController
+from downloader.client import LocalClient, wait_for
+from downloader.jobs import DONE, FINISHED_STATES, JobManager
+from downloader.pipeline import CONVERT, DOWNLOAD, EXTRACT, stage_workers_from_env
+
+EXIT_OK, EXIT_FAILED, EXIT_USAGE = 0, 1, 2
+
+
+def read_urls(path):
+    """Non-empty, non-comment lines of a file ("-" reads stdin)"""
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        lines = [line.strip() for line in handle]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def expand_playlists(urls, log):
+    """Replace each playlist URL with its video URLs (flat extraction)"""
+    expanded = []
+    for url in urls:
+        try:
+            playlist_info, video_urls = engine.enumerate_playlist(url)
+        except Exception as e:
+            log(f"Could not load playlist {url}: {e}")
+            expanded.append(url)
+            continue
+        log(f"Playlist {playlist_info.get('title', url)}: {len(video_urls)} videos")
+        expanded.extend(video_urls)
+    return expanded
+
+
+def result_record(job):
+    """One JSON-lines record for a finished job"""
+    result = job.get("result") or {}
+    started = job.get("started_at") or job.get("created_at")
+    return {
+        "url": job["params"].get("url"),
+        "status": job["status"],
+        "title": result.get("title"),
+        "file_name": result.get("file_name"),
+        "file_path": result.get("file_path"),
+        "error": job.get("error"),
+        "error_class": job.get("error_class"),
+        "seconds": round(job["finished_at"] - started, 3) if job.get("finished_at") and started else None,
+    }
+
+
+class BatchProgress:
+    """Writes finished jobs as JSON lines and a one-line summary to stderr"""
+
+    def __init__(self, total, output, stream=sys.stderr):
+        self.total = total
+        self.output = output
+        self.stream = stream
+        self.written = set()
+        self.started = time.monotonic()
+        self._last_line = None
+
+    def update(self, jobs):
+        for job in jobs:
+            if job["status"] in FINISHED_STATES and job["id"] not in self.written:
+                self.written.add(job["id"])
+                self.output.write(json.dumps(result_record(job)) + "\n")
+                self.output.flush()
+        ok = sum(1 for job in jobs if job["status"] == DONE)
+        failed = sum(1 for job in jobs if job["status"] in FINISHED_STATES) - ok
+        running = sum(1 for job in jobs if job["status"] == "running")
+        line = f"[{ok + failed}/{self.total}] ok {ok} • failed {failed} • running {running}"
+        if line != self._last_line:
+            self._last_line = line
+            print(f"{line} ({time.monotonic() - self.started:.0f}s)", file=self.stream, flush=True)
+
+
+def run_batch(args):
+    log = lambda message: print(message, file=sys.stderr, flush=True)
+    try:
+        urls = read_urls(args.urls)
+    except OSError as e:
+        log(f"Cannot read {args.urls}: {e}")
+        return EXIT_USAGE
+    if args.playlists:
+        urls = expand_playlists(urls, log)
+    if not urls:
+        log("No URLs to download")
+        return EXIT_USAGE
+
+    http_session = None
+    if args.format == "image":
+        from downloader.sessions import create_session
+        http_session = create_session()
+    manager = job_manager(args, http_session)
+    client = LocalClient(manager)
+    history_type = {"video": "Video", "audio": "Audio Only", "image": "Image"}[args.format]
+    if args.format == "image":
+        params_list = [{"url": url, "image_format": args.image_format} for url in urls]
+        kind = "image"
+    else:
+        params_list = [
+            {"url": url, "as_audio": args.format == "audio", "source": "playlist" if args.playlists else "batch"}
+            for url in urls
+        ]
+        kind = "media"
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        log(f"Downloading {len(urls)} URLs as {args.format} with {args.concurrency} workers -> {args.download_dir}")
+        submitted = [
+            client.submit(kind, history_type=history_type, client_id="cli", priority="bulk", **params)
+            for params in params_list
+        ]
+        progress = BatchProgress(len(submitted), output)
+        jobs = wait_for(client, [job["id"] for job in submitted], progress.update, poll_interval=args.poll_interval)
+    except KeyboardInterrupt:
+        log("Interrupted")
+        return 130
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        manager.shutdown()
+
+    failed = [job for job in jobs if job is None or job["status"] != DONE]
+    log(f"Finished {len(jobs) - len(failed)}/{len(jobs)} in {time.monotonic() - progress.started:.1f}s")
+    log_pools(manager, log)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def job_manager(args, http_session=None):
+    """JobManager for a command-line run, sized by --concurrency / --extract-workers / --convert-workers"""
+    history = None
+    if not args.no_history:
+        from downloader.history import HistoryStore
+        history = HistoryStore()
+    # Everything here is bulk, so no worker is held back for interactive jobs. The whole
+    # file is queued up front; memory and disk budgets still pace when jobs start
+    stage_workers = stage_workers_from_env(args.concurrency)
+    stage_workers[EXTRACT] = args.extract_workers or stage_workers[EXTRACT]
+    stage_workers[CONVERT] = args.convert_workers or stage_workers[CONVERT]
+    return JobManager(args.download_dir, workers=args.concurrency, history=history, http_session=http_session,
+                      interactive_reserve=0, stage_workers=stage_workers,
+                      admission=AdmissionController.from_env(args.download_dir, limit_queue=False))
+
+
+def log_pools(manager, log):
+    # How busy each pool was, to size --extract-workers / --concurrency / --convert-workers
+    stages = manager.pipeline.snapshot()
+    log("Stage utilization: " + " • ".join(
+        f"{name} {stages[name]['utilization']:.0%} of {stages[name]['workers']}"
+        for name in (EXTRACT, DOWNLOAD, CONVERT) if name in stages))
+    limits = manager.limits[DOWNLOAD].snapshot()
+    if limits:
+        log("Final per-host download limits: " + ", ".join(f"{host} {state['limit']}" for host, state in limits.items()))
+
+
+def run_sync(args):
+    log = lambda message: print(message, file=sys.stderr, flush=True)
+    try:
+        urls = read_urls(args.playlists)
+    except OSError as e:
+        log(f"Cannot read {args.playlists}: {e}")
+        return EXIT_USAGE
+    if not urls:
+        log("No playlists to sync")
+        return EXIT_USAGE
+    while True:
+        try:
+            code = sync_once(args, urls, log)
+            if not args.every:
+                return code
+            log(f"Next sync in {args.every:g} hours")
+            time.sleep(args.every * 3600)
+        except KeyboardInterrupt:
+            log("Interrupted")
+            return 130
+
+
+def sync_once(args, urls, log):
+    """Sync every playlist in urls once; exit code as for batch"""
+    manager = job_manager(args)
+    client = LocalClient(manager)
+    history_type = {"video": "Video", "audio": "Audio Only"}[args.format]
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        syncs = [
+            client.submit("sync", url=url, as_audio=args.format == "audio", history_type=history_type,
+                          client_id="cli", priority="bulk")
+            for url in urls
+        ]
+        syncs = wait_for(client, [job["id"] for job in syncs], poll_interval=args.poll_interval)
+        job_ids, sync_failed = [], 0
+        for url, job in zip(urls, syncs):
+            if job is None or job["status"] != DONE:
+                sync_failed += 1
+                log(f"Could not sync {url}: {job['error'] if job else 'job lost'}")
+                continue
+            summary = job["result"]
+            log(f"{summary['title']}: {summary['new']} to download of {summary['checked']} checked"
+                + (" (stopped at the last sync)" if summary["stopped_early"] else ""))
+            job_ids.extend(summary["job_ids"])
+        progress = BatchProgress(len(job_ids), output)
+        jobs = wait_for(client, job_ids, progress.update, poll_interval=args.poll_interval)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        manager.shutdown()
+
+    failed = [job for job in jobs if job is None or job["status"] != DONE]
+    log(f"Synced {len(urls) - sync_failed}/{len(urls)} playlists; downloaded {len(jobs) - len(failed)}/{len(jobs)} "
+        f"new videos in {time.monotonic() - progress.started:.1f}s")
+    if jobs:
+        log_pools(manager, log)
+    return EXIT_FAILED if failed or sync_failed else EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m downloader", description="Advanced Downloader command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Download every URL in a file")
+    batch.add_argument("urls", help="File with one URL per line ('-' for stdin, '#' starts a comment)")
+    add_queue_options(batch)
+    batch.add_argument("--format", choices=["video", "audio", "image"], default="video",
+                       help="video (yt-dlp default), audio (mp3) or image")
+    batch.add_argument("--image-format", choices=["Keep Original", "JPEG", "PNG", "WebP"], default="Keep Original",
+                       help="Conversion for --format image")
+    batch.add_argument("--playlists", action="store_true", help="Treat each line as a playlist and download its videos")
+    batch.set_defaults(handler=run_batch)
+
+    sync = commands.add_parser("sync", help="Download the videos added to playlists or channels since the last sync")
+    sync.add_argument("playlists", help="File with one playlist or channel URL per line ('-' for stdin)")
+    add_queue_options(sync)
+    sync.add_argument("--format", choices=["video", "audio"], default="video",
+                      help="video (yt-dlp default) or audio (mp3); each format is synced separately")
+    sync.add_argument("--every", type=float, metavar="HOURS", help="Keep running and sync again every HOURS")
+    sync.set_defaults(handler=run_sync)
+    return parser
+
+
+def add_queue_options(parser):
+    parser.add_argument("--concurrency", "-j", type=int, default=int(os.environ.get("DOWNLOADER_WORKERS") or 2),
+                        help="Downloads per host to start with; adapts up to DOWNLOADER_MAX_CONCURRENCY "
+                             "unless DOWNLOADER_ADAPTIVE_CONCURRENCY=0 (default: %(default)s)")
+    parser.add_argument("--extract-workers", type=int, help="Metadata extractions to run ahead of the downloads "
+                                                            "(default: DOWNLOADER_EXTRACT_WORKERS or 2)")
+    parser.add_argument("--convert-workers", type=int, help="FFmpeg conversions to run at once "
+                                                            "(default: DOWNLOADER_CONVERT_WORKERS or half the CPUs)")
+    parser.add_argument("--download-dir", default=os.environ.get("DOWNLOADER_DOWNLOAD_DIR") or os.path.join(os.getcwd(), "downloads"))
+    parser.add_argument("--output", "-o", help="Append JSON-lines results here instead of stdout")
+    parser.add_argument("--no-history", action="store_true", help="Do not record downloads in the shared history")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help=argparse.SUPPRESS)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "concurrency", 1) < 1:
+        parser.error("--concurrency must be at least 1")
+    for option in ("extract_workers", "convert_workers"):
+        if (getattr(args, option, None) or 1) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1")
+    if getattr(args, "every", None) is not None and args.every <= 0:
+        parser.error("--every must be a positive number of hours")
+    return args.handler(args)
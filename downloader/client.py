@@ -0,0 +1,73 @@
+"""Job API clients: in-process for the bundled UI, HTTP for a separate API server
+
+Both return the same job dicts (see Job.to_dict) so the Streamlit app does
+not care which one it talks to.
+"""
+import os
+import time
+
+from downloader.jobs import FINISHED_STATES
+
+
+class LocalClient:
+    """Talks to a JobManager in this process"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def submit(self, kind, profiler=None, **params):
+        return self.manager.submit(kind, params, profiler=profiler).to_dict()
+
+    def status(self, job_id):
+        job = self.manager.get(job_id)
+        return job.to_dict() if job else None
+
+
+class HttpClient:
+    """Talks to ``python -m downloader.api`` (shared downloads volume assumed for file paths)"""
+
+    def __init__(self, base_url, session=None, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        if session is None:
+            from downloader.sessions import create_session
+            session = create_session()
+        self.session = session
+        # Per request, not on the session: the session may be shared with upstream downloads
+        token = os.environ.get("DOWNLOADER_API_TOKEN", "").strip()
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    def submit(self, kind, profiler=None, **params):
+        # Server picks the download directory
+        params.pop("download_dir", None)
+        response = self.session.post(f"{self.base_url}/jobs", json={"kind": kind, **params}, headers=self.headers,
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def status(self, job_id):
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", headers=self.headers, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+
+def wait_for(client, job_ids, on_update=None, poll_interval=0.5):
+    """Poll until every job has finished; on_update(jobs) gets the latest dicts each round"""
+    pending = list(job_ids)
+    latest = {}
+    while pending:
+        for job_id in list(pending):
+            job = client.status(job_id)
+            if job is None:
+                pending.remove(job_id)
+                continue
+            latest[job_id] = job
+            if job["status"] in FINISHED_STATES:
+                pending.remove(job_id)
+        if on_update:
+            on_update([latest[j] for j in job_ids if j in latest])
+        if pending:
+            time.sleep(poll_interval)
+    return [latest.get(j) for j in job_ids]
@@ -0,0 +1,214 @@
+"""Adaptive per-host concurrency limits (AIMD) for bulk work
+
+A fixed worker count is either too timid for a fast CDN or enough to get a
+slow upstream answering 429. Each upstream host gets its own limit instead.
+The limit starts at the configured worker count and is adjusted once per
+window, which is about ``limit`` completions:
+
+* additive increase: +1 when the window's aggregate throughput beat the
+  previous window's and per-item latency stayed near its best, but only if
+  the limit was actually reached during the window;
+* additive decrease: -1 when latency rose past ``tolerance`` times its best
+  while throughput did not improve, i.e. the host is queueing requests;
+* multiplicative decrease: the limit is halved immediately on a 429, a 5xx
+  or a timeout. Failures of requests started before the last cut do not cut
+  again, so one burst of errors halves the limit once, not N times.
+
+Throughput is measured in whatever units the caller reports: bytes for
+downloads, items for extraction. DOWNLOADER_MAX_CONCURRENCY caps every host
+(default 8). DOWNLOADER_ADAPTIVE_CONCURRENCY=0 pins limits to the configured
+worker counts.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from downloader.errors import NETWORK, RATE_LIMITED, SERVER, classify
+from downloader.metrics import REGISTRY
+
+CONCURRENCY_LIMIT = REGISTRY.gauge(
+    "downloader_concurrency_limit", "Current adaptive concurrency limit per pool and upstream host", ["pool", "host"])
+CONCURRENCY_INFLIGHT = REGISTRY.gauge(
+    "downloader_concurrency_inflight", "Requests in flight per pool and upstream host", ["pool", "host"])
+CONCURRENCY_ADJUSTMENTS = REGISTRY.counter(
+    "downloader_concurrency_adjustments_total", "Adaptive concurrency limit changes", ["pool", "direction", "reason"])
+
+_HOST_ALIASES = {"youtu.be": "youtube.com", "music.youtube.com": "youtube.com"}
+
+
+def adaptive_enabled():
+    return os.environ.get("DOWNLOADER_ADAPTIVE_CONCURRENCY", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def max_concurrency():
+    return max(1, int(os.environ.get("DOWNLOADER_MAX_CONCURRENCY") or 8))
+
+
+def host_key(url):
+    """"https://www.youtube.com/watch?v=..." -> "youtube.com"; hosts that share one upstream share a key"""
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return _HOST_ALIASES.get(host, host) or "unknown"
+
+
+def is_overload(error):
+    """True for failures that mean "slow down": 429, 5xx responses and timeouts"""
+    return classify(error) in (RATE_LIMITED, SERVER, NETWORK)
+
+
+class _Ticket:
+    """One admitted request; set units (bytes, items) before the slot closes"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.units = 1
+
+
+class AIMDLimiter:
+    """Concurrency limit for one host, adjusted from completions and failures"""
+
+    def __init__(self, initial, minimum=1, maximum=8, backoff=0.5, tolerance=1.5, min_window=1.0, on_change=None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.min_window = min_window
+        self.on_change = on_change        # on_change(limiter, direction, reason), called under the lock
+        self.inflight = 0
+        self.last_change = None           # (direction, reason) of the most recent adjustment
+        self._cond = threading.Condition()
+        self._last_cut = 0.0
+        self._best_latency = None
+        self._previous_throughput = None
+        self._reset_window(time.monotonic())
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._window_units = 0
+        self._window_items = 0
+        self._window_latency = 0.0
+        self._window_saturated = False
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= self.limit:
+                self._window_saturated = True
+                self._cond.wait()
+            self.inflight += 1
+            if self.inflight >= self.limit:
+                self._window_saturated = True
+        return _Ticket()
+
+    def release(self, ticket, error=None):
+        now = time.monotonic()
+        with self._cond:
+            self.inflight -= 1
+            if error is not None:
+                if is_overload(error) and ticket.started >= self._last_cut:
+                    self._set_limit(int(self.limit * self.backoff), "down", "overload")
+                    self._last_cut = now
+                    # Throughput at the old limit is no yardstick; probe upwards again from here
+                    self._previous_throughput = None
+                    self._reset_window(now)
+            else:
+                self._window_units += ticket.units
+                self._window_items += 1
+                self._window_latency += (now - ticket.started) / max(ticket.units, 1)
+                if self._window_items >= self.limit and now - self._window_start >= self.min_window:
+                    self._adjust(now)
+            self._cond.notify_all()
+
+    def _adjust(self, now):
+        throughput = self._window_units / (now - self._window_start)
+        latency = self._window_latency / self._window_items
+        # Best latency decays slowly so a permanently slower host becomes the new normal
+        self._best_latency = latency if self._best_latency is None else min(latency, self._best_latency * 1.02)
+        improved = self._previous_throughput is None or throughput > self._previous_throughput * 1.05
+        if latency > self._best_latency * self.tolerance and not improved:
+            self._set_limit(self.limit - 1, "down", "latency")
+        elif improved and self._window_saturated:
+            self._set_limit(self.limit + 1, "up", "throughput")
+        self._previous_throughput = throughput
+        self._reset_window(now)
+
+    def _set_limit(self, limit, direction, reason):
+        limit = min(max(limit, self.minimum), self.maximum)
+        if limit != self.limit:
+            self.limit = limit
+            self.last_change = (direction, reason)
+            if self.on_change is not None:
+                self.on_change(self, direction, reason)
+
+
+class HostLimits:
+    """One AIMDLimiter per upstream host for a pool of work (e.g. "download")"""
+
+    def __init__(self, pool, initial, maximum=None, max_hosts=256):
+        self.pool = pool
+        self.initial = max(1, initial)
+        self.maximum = max(self.initial, maximum or self.initial)
+        self.max_hosts = max_hosts
+        self._limiters = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, pool, initial):
+        """Adaptive up to DOWNLOADER_MAX_CONCURRENCY, or fixed at initial when disabled"""
+        return cls(pool, initial, max(initial, max_concurrency()) if adaptive_enabled() else initial)
+
+    def limiter(self, host):
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = AIMDLimiter(self.initial, maximum=self.maximum,
+                                      on_change=functools.partial(self._changed, host))
+                CONCURRENCY_LIMIT.set(limiter.limit, pool=self.pool, host=host)
+                self._limiters[host] = limiter
+                self._prune()
+            self._limiters.move_to_end(host)
+            return limiter
+
+    def _changed(self, host, limiter, direction, reason):
+        CONCURRENCY_ADJUSTMENTS.inc(pool=self.pool, direction=direction, reason=reason)
+        CONCURRENCY_LIMIT.set(limiter.limit, pool=self.pool, host=host)
+
+    def _prune(self):
+        # Forget idle hosts beyond max_hosts (one-off image hosts in big batches)
+        for host in list(self._limiters)[:max(0, len(self._limiters) - self.max_hosts)]:
+            if self._limiters[host].inflight == 0:
+                del self._limiters[host]
+
+    def slot(self, url):
+        """Context manager holding one of the host's slots; yields a ticket to report units on"""
+        return _Slot(self, host_key(url))
+
+    def snapshot(self):
+        """{host: {limit, inflight}}"""
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {host: {"limit": limiter.limit, "inflight": limiter.inflight} for host, limiter in limiters}
+
+
+class _Slot:
+    def __init__(self, limits, host):
+        self.limits = limits
+        self.host = host
+        self.limiter = None
+        self.ticket = None
+
+    def __enter__(self):
+        self.limiter = self.limits.limiter(self.host)
+        self.ticket = self.limiter.acquire()
+        CONCURRENCY_INFLIGHT.inc(pool=self.limits.pool, host=self.host)
+        return self.ticket
+
+    def __exit__(self, exc_type, exc, tb):
+        CONCURRENCY_INFLIGHT.dec(pool=self.limits.pool, host=self.host)
+        self.limiter.release(self.ticket, exc)
+        return False
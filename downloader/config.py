@@ -0,0 +1,17 @@
+"""Environment-driven settings shared by the app and its helpers"""
+import os
+
+
+def default_data_dir():
+    """Directory for app state that must outlive a session (override with DOWNLOADER_DATA_DIR)"""
+    path = os.environ.get("DOWNLOADER_DATA_DIR") or os.path.join(os.getcwd(), "data")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def env_flag(name, default=False):
+    """Read a boolean environment variable ("1", "true", "yes", "on")"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,730 @@
+"""Streamlit-free download core shared by the UI, the HTTP API and the CLI
+
+Everything here reports through return values, exceptions and optional
+callbacks (``notify(level, message)``, yt-dlp ``progress`` hooks) instead of
+Streamlit widgets, so it can run on worker threads and in headless processes.
+"""
+import io
+import os
+import random
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+from downloader import bandwidth, breaker, errors, segmented, storage
+from downloader.metrics import POSTPROCESS_SECONDS, classify_error, track_download
+from downloader.naming import clean_filename, format_file_size
+from downloader.profiling import timed
+
+
+def _ignore(level, message):
+    pass
+
+
+# --- Metadata ---
+
+def extraction_error_message(error):
+    """User-facing message for a failed extraction, by error class"""
+    error_class = classify_error(error)
+    if error_class in (errors.FORBIDDEN, errors.RATE_LIMITED):
+        return "❌ **403 Forbidden Error**: YouTube's anti-bot system is blocking requests.\n\n" \
+               "🛡️ **Advanced Protection Detected** - This happens when:\n" \
+               "• Multiple attempts trigger rate limiting\n" \
+               "• YouTube detects automated patterns\n" \
+               "• Regional restrictions are in place\n\n" \
+               "🚀 **Try these solutions:**\n" \
+               "1. **Wait 10-15 minutes** for cooldown\n" \
+               "2. **Try audio-only** downloads first\n" \
+               "3. **Use different videos** to reset detection\n" \
+               "4. **Clear browser data** and refresh\n" \
+               "5. **Try during off-peak hours** (late night/early morning)\n\n" \
+               "💡 **Pro tip**: Multiple failed attempts increase detection. Space out your downloads!"
+    if error_class == errors.UNAVAILABLE:
+        return "❌ **Video Unavailable**: This video is private, deleted, or restricted in your region."
+    if error_class == errors.GEO_RESTRICTED:
+        return "❌ **Not Available in Your Region**: This video is geo-restricted."
+    if error_class == errors.AGE_RESTRICTED:
+        return "❌ **Age Restricted**: This video requires age verification and cannot be downloaded."
+    if error_class == errors.UNSUPPORTED:
+        return "❌ **Unsupported URL**: This link is not a video page that can be downloaded."
+    if error_class == errors.CIRCUIT_OPEN:
+        return f"⏸️ **Upstream Unavailable**: {error}. Requests resume automatically once it recovers."
+    return f"❌ **Error**: {error}"
+
+
+def extract_info(url, max_retries=3, notify=_ignore, before_first_attempt=None, budget=None):
+    """Return (info, None) or (None, user-facing error message)
+
+    Retries are paid from budget (default: max_retries of them). Blocks and
+    unexplained failures move on to the next alternative player client;
+    timeouts, 429 and 5xx retry the same one after a backoff. Permanent
+    errors such as private or removed videos are returned at once.
+    """
+    import yt_dlp
+    
+    budget = budget if budget is not None else errors.RetryBudget(max_retries)
+    if before_first_attempt:
+        # Caller-specific pacing (per-session rate limiting in the UI)
+        before_first_attempt()
+    
+    # Advanced user agent rotation with realistic versions
+    user_agents = [
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:118.0) Gecko/20100101 Firefox/118.0',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
+    ]
+    
+    # Configure yt-dlp with maximum anti-detection measures
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+        'ignoreerrors': False,
+        
+        # Core anti-detection
+        'user_agent': random.choice(user_agents),
+        'referer': 'https://www.youtube.com/',
+        
+        # Advanced HTTP headers simulation
+        'http_headers': {
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9,es;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Cache-Control': 'max-age=0',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'same-origin',
+            'Sec-Fetch-User': '?1',
+            'Sec-Ch-Ua': '"Chromium";v="118", "Google Chrome";v="118", "Not=A?Brand";v="99"',
+            'Sec-Ch-Ua-Mobile': '?0',
+            'Sec-Ch-Ua-Platform': '"Windows"',
+        },
+        
+        # Cookie handling
+        'cookiefile': None,  # Don't save cookies to file
+        
+        # Network behavior simulation
+        'sleep_interval': random.uniform(1.0, 3.0),
+        'max_sleep_interval': 5,
+        'socket_timeout': 30,
+        
+        # Advanced extraction methods with signature bypass
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['android', 'web', 'ios', 'mweb'],
+                'player_skip': ['configs', 'webpage'],
+                'skip': ['hls', 'dash'],
+                'innertube_host': 'studio.youtube.com',
+                'innertube_key': None,
+            }
+        },
+        
+        # Proxy simulation (without actual proxy)
+        'proxy': None,
+        'geo_bypass': True,
+        'geo_verification_proxy': None,
+        
+        # Retry configuration
+        'retries': 3,
+        'fragment_retries': 3,
+    }
+    
+    # Alternative extraction strategies, tried in order when the primary one is blocked
+    fallback_strategies = [
+        # Strategy 1: Android client with TV API
+        {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['android_creator', 'android_vr']}}},
+        
+        # Strategy 2: iOS client with music context
+        {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['ios_music', 'ios_creator']}}, 
+         'http_headers': {**ydl_opts['http_headers'], 'X-YouTube-Client-Name': '26', 'X-YouTube-Client-Version': '17.31.35'}},
+        
+        # Strategy 3: TV client (often bypasses restrictions)
+        {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['tv_embedded']}},
+         'http_headers': {'User-Agent': 'com.google.ios.youtube/17.31.4 (iPhone14,3; U; CPU iOS 15_6 like Mac OS X)', 'X-YouTube-Client-Name': '85'}},
+         
+        # Strategy 4: Web embedded client
+        {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['web_embedded']}},
+         'http_headers': {**ydl_opts['http_headers'], 'Origin': 'https://www.youtube.com', 'X-YouTube-Client-Name': '56'}},
+         
+        # Strategy 5: Minimal approach with no signature verification
+        {'quiet': True, 'no_warnings': True, 'extractor_args': {'youtube': {'player_client': ['android'], 'player_skip': ['js']}}, 
+         'user_agent': 'com.google.android.youtube/17.36.4 (Linux; U; Android 12; SM-G973F Build/SP1A.210812.016) gzip'}
+    ]
+    strategies = [("primary", ydl_opts)] + [(f"fallback_{i + 1}", opts) for i, opts in enumerate(fallback_strategies)]
+    
+    index = 0
+    while True:
+        name, opts = strategies[index]
+        try:
+            with breaker.board(breaker.EXTRACT).guard(url), yt_dlp.YoutubeDL(opts) as ydl, \
+                    timed("yt-dlp.extract_info", strategy=name):
+                info = ydl.extract_info(url, download=False)
+            if index:
+                notify("success", f"✅ Success with alternative method {index}!")
+            return info, None
+        except Exception as e:
+            error = e
+        
+        delay = budget.next_delay(error)
+        if delay is None:
+            return None, extraction_error_message(error)
+        error_class = classify_error(error)
+        if error_class in (errors.FORBIDDEN, errors.FORMAT, errors.OTHER) and index < len(strategies) - 1:
+            # A different player client may not be blocked
+            index += 1
+            notify("info", f"🔄 Trying alternative extraction method {index}/{len(strategies) - 1}...")
+        else:
+            notify("warning", f"⚠️ Attempt failed ({error_class.replace('_', ' ')}). Retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+
+
+PREVIEW_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    # One player client and no player JavaScript: enough for title, channel, duration, views and thumbnails
+    'extractor_args': {'youtube': {'player_client': ['web'], 'player_skip': ['js']}},
+}
+
+
+def preview_info(url, budget=None):
+    """Lightweight metadata tier for the info panel: (info, None) or (None, user-facing error message)
+
+    One request path, no signature decoding and no format selection
+    (process=False), so formats may be missing or incomplete. Downloads
+    resolve formats themselves. Retries come from budget (default: one).
+    """
+    import yt_dlp
+
+    def attempt():
+        with breaker.board(breaker.EXTRACT).guard(url), yt_dlp.YoutubeDL(PREVIEW_OPTS) as ydl, \
+                timed("yt-dlp.preview"):
+            return ydl.extract_info(url, download=False, process=False)
+
+    try:
+        info = retrying(attempt, budget if budget is not None else errors.RetryBudget(1))
+    except Exception as e:
+        return None, extraction_error_message(e)
+    if not info.get('thumbnail') and info.get('thumbnails'):
+        # Set by format processing, which the preview skips
+        info['thumbnail'] = info['thumbnails'][-1].get('url')
+    return info, None
+
+
+# --- Format selection ---
+
+def select_video_formats(info, video_format):
+    """(height, label, format, has_audio, ext) tuples, best quality first"""
+    video_formats = []
+    for f in info.get('formats', []):
+        if f.get('vcodec') != 'none':  # Has video
+            height = f.get('height', 0)
+            fps = f.get('fps', 0)
+            filesize = f.get('filesize', 0)
+            has_audio = f.get('acodec') != 'none'
+            ext = f.get('ext', '')
+            
+            # Accept the format if it matches user preference OR is a common video format
+            format_acceptable = (
+                ext == video_format or  # Exact match
+                ext in ['mp4', 'webm', 'mkv'] or  # Common video formats
+                (video_format == 'mp4' and ext in ['m4v', 'mov']) or  # MP4-compatible
+                (video_format == 'webm' and ext in ['webm', 'mkv'])  # WebM-compatible
+            )
+            
+            if format_acceptable and height and height >= 144:  # Minimum quality filter
+                quality_info = f"{height}p"
+                if fps:
+                    quality_info += f" ({fps}fps)"
+                if filesize:
+                    quality_info += f" - {format_file_size(filesize)}"
+                quality_info += f" - {ext.upper()}"
+                quality_info += " - " + ("With Audio" if has_audio else "Video Only")
+                video_formats.append((height, quality_info, f, has_audio, ext))
+    
+    # Sort by quality (height) and prefer formats with audio
+    video_formats.sort(key=lambda x: (x[0], x[3]), reverse=True)
+    return video_formats
+
+
+def select_audio_formats(info, audio_format):
+    """(abr, format, ext, filesize) tuples for audio-only streams, highest bitrate first"""
+    audio_formats = []
+    for f in info.get('formats', []):
+        if f.get('acodec') != 'none' and f.get('vcodec') == 'none':  # Audio only
+            ext = f.get('ext', '')
+            abr = f.get('abr', 0)
+            filesize = f.get('filesize', 0)
+            
+            if ext == audio_format or (not audio_formats and ext in ['m4a', 'webm', 'mp3']):
+                audio_formats.append((abr or 0, f, ext, filesize))
+    
+    audio_formats.sort(key=lambda x: x[0], reverse=True)
+    return audio_formats
+
+
+def video_format_strategies(audio_guaranteed):
+    """Format selectors to try in order until one works (None = yt-dlp default)"""
+    if audio_guaranteed:
+        return [
+            'best[acodec!=none]',  # Best with audio
+            'best',                # Any best format
+            None                   # yt-dlp default
+        ]
+    return [
+        'best',                # Best quality
+        None                   # yt-dlp default
+    ]
+
+
+# --- yt-dlp options ---
+
+VIDEO_REQUEST_OPTS = {
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'referer': 'https://www.youtube.com/',
+    'headers': {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-us,en;q=0.5',
+        'Accept-Encoding': 'gzip, deflate',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+    }
+}
+
+
+def base_download_opts(download_dir):
+    return {
+        'outtmpl': os.path.join(download_dir, '%(title)s.%(ext)s'),
+        'noplaylist': True,
+    }
+
+
+# --- Clips ---
+
+# Added to the file name so a clip never overwrites the full download or another clip
+CLIP_SUFFIX = ' [%(section_start)d-%(section_end)ds]'
+
+
+def parse_timestamp(text):
+    """"90", "1:30" or "1:02:03" -> seconds; empty -> None; ValueError otherwise"""
+    text = (text or '').strip()
+    if not text:
+        return None
+    parts = text.split(':')
+    if len(parts) > 3 or not all(p.replace('.', '', 1).isdigit() for p in parts):
+        raise ValueError(f"Not a time: {text!r} (use seconds, m:ss or h:mm:ss)")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+def clip_opts(start, end, precise=False):
+    """yt-dlp options that download only [start, end] seconds (end None = to the end)
+
+    yt-dlp hands sections to FFmpeg, which seeks with HTTP ranges on progressive
+    files and fetches only the overlapping fragments of HLS/DASH formats. Cuts
+    land on the nearest keyframes unless precise=True, which re-encodes at the
+    cut points (slower, CPU-heavy).
+    """
+    from yt_dlp.utils import download_range_func
+
+    return {
+        'download_ranges': download_range_func(None, [(start or 0, end if end is not None else float('inf'))]),
+        'force_keyframes_at_cuts': bool(precise),
+    }
+
+
+def full_size_estimate(info):
+    """Bytes the complete download would have taken, from the chosen formats' sizes"""
+    formats = info.get('requested_formats') or [info]
+    sizes = [f.get('filesize') or f.get('filesize_approx') for f in formats]
+    if all(sizes):
+        return int(sum(sizes))
+    return info.get('filesize') or info.get('filesize_approx')
+
+
+def audio_postprocessors(audio_format):
+    """FFmpeg conversion for mp3/m4a; other formats are kept as downloaded"""
+    if audio_format in ("mp3", "m4a"):
+        return [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': audio_format,
+            'preferredquality': '192',
+        }]
+    return []
+
+
+# --- Downloads ---
+
+def find_downloaded_file(download_dir, title, video_id=None):
+    """Best-effort lookup for when yt-dlp does not report the path
+
+    Flat directories are searched by title prefix. In a sharded root the file
+    can only be in its video's shard, named "... [id].ext".
+    """
+    layout = storage.layout_for(download_dir)
+    if layout is not None:
+        if not video_id:
+            return None
+        directory = os.path.join(layout.root, storage.shard_for(video_id, layout.depth))
+        marker = f"[{video_id}]"
+    else:
+        prefix = clean_filename(title or '')[:20]
+        if not prefix:
+            return None  # an empty prefix would match any file, including the index databases
+        directory = download_dir
+    try:
+        with os.scandir(directory) as it:
+            candidates = sorted(
+                entry.name for entry in it
+                if entry.is_file() and not entry.name.startswith('.')
+                and not entry.name.endswith(('.part', '.ytdl'))
+                and (marker in entry.name if layout is not None else entry.name.startswith(prefix))
+            )
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, candidates[-1]) if candidates else None
+
+
+def downloaded_path(info, download_dir):
+    """Final path of a finished download (after postprocessing)"""
+    for requested in info.get('requested_downloads') or []:
+        path = requested.get('filepath')
+        if path and os.path.exists(path):
+            return path
+    path = info.get('filepath') or info.get('_filename')
+    if path and os.path.exists(path):
+        return path
+    return find_downloaded_file(download_dir, info.get('title'), info.get('id'))
+
+
+DIRECT_MEDIA_EXTENSIONS = ('.mp4', '.m4v', '.webm', '.mkv', '.mov', '.m4a', '.mp3', '.ogg', '.opus', '.flac', '.wav')
+# Below this a second connection costs more than it saves
+SEGMENTED_MIN_BYTES = 4 * segmented.MIN_SEGMENT_BYTES
+
+_direct_session = None
+_direct_session_lock = threading.Lock()
+
+
+def _get_direct_session():
+    global _direct_session
+    with _direct_session_lock:
+        if _direct_session is None:
+            from downloader.sessions import create_session
+            _direct_session = create_session()
+        return _direct_session
+
+
+def is_direct_media_url(url):
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and parsed.path.lower().endswith(DIRECT_MEDIA_EXTENSIONS)
+
+
+def _stored_name(layout, file_path, title, key):
+    """Name users see for a finished file; registers it when the layout is sharded"""
+    if layout is None or not file_path:
+        return os.path.basename(file_path) if file_path else None
+    # Users see "Title.mp4"; the "[id]" suffix only exists on disk
+    display_name = clean_filename(title or 'download') + os.path.splitext(file_path)[1]
+    return layout.register(file_path, key, display_name)
+
+
+def download_direct(url, download_dir, opts, kind, layout=None):
+    """Fetch a large direct media file over parallel ranges; None when yt-dlp should handle it
+
+    Mirrors what the generic extractor would do (title and id from the file
+    name, no postprocessing) but with several connections.
+    """
+    session = _get_direct_session()
+    length, accepts_ranges = segmented.probe(session, url)
+    if not accepts_ranges or not length or length < SEGMENTED_MIN_BYTES:
+        return None
+    stem, ext = os.path.splitext(os.path.basename(unquote(urlparse(url).path)))
+    title = clean_filename(stem) or 'download'
+    if layout is not None:
+        file_path = layout.path_for(stem, f"{title} [{clean_filename(stem)}]{ext}")
+    else:
+        file_path = os.path.join(download_dir, title + ext)
+    with track_download(kind) as tracker, timed("segmented.download", section=kind):
+        hooks = tracker.hooked(opts)['progress_hooks']
+        segmented.download_file(session, url, file_path, progress_hooks=hooks, probed=(length, accepts_ranges))
+    return {
+        'title': stem,
+        'video_id': stem,
+        'file_path': file_path,
+        'file_name': _stored_name(layout, file_path, stem, stem),
+        'format': opts.get('format'),
+    }
+
+
+def run_download(url, ydl_opts, kind, progress=None, clip=None, info=None):
+    """Download once with yt-dlp; returns a result dict with file_path/file_name/title
+
+    clip=(start, end, precise) downloads only that time range (see clip_opts).
+    info is an extract_media() result to download instead of extracting again.
+    """
+    import yt_dlp
+    
+    download_dir = os.path.dirname(ydl_opts['outtmpl'])
+    os.makedirs(download_dir, exist_ok=True)
+    opts = dict(ydl_opts)
+    if clip:
+        opts.update(clip_opts(*clip))
+        stem, ext = os.path.splitext(opts['outtmpl'])
+        opts['outtmpl'] = stem + CLIP_SUFFIX + ext
+    if progress:
+        opts['progress_hooks'] = list(opts.get('progress_hooks', [])) + [progress]
+    # Stay inside this thread's share of the global bandwidth budget
+    allocation = bandwidth.current()
+    if allocation is not None and allocation.limited:
+        opts.update(bandwidth.THROTTLED_YDL_OPTS)
+        opts['progress_hooks'] = list(opts.get('progress_hooks', [])) + [allocation.progress_hook]
+    layout = storage.layout_for(download_dir)
+    if layout is not None:
+        opts['outtmpl'] = layout.outtmpl(CLIP_SUFFIX if clip else '')
+    
+    # An open breaker for this host fails here, before any request is sent
+    with breaker.board(breaker.DOWNLOAD).guard(url):
+        # Large direct files skip yt-dlp's single connection when nothing needs postprocessing
+        if info is None and is_direct_media_url(url) and not opts.get('postprocessors') and not clip \
+                and segmented.SEGMENTS > 1:
+            result = download_direct(url, download_dir, opts, kind, layout)
+            if result is not None:
+                return result
+    
+        # One extract_info(download=True) instead of extract_info + download([url])
+        with track_download(kind) as tracker, yt_dlp.YoutubeDL(tracker.hooked(opts)) as ydl, \
+                timed("yt-dlp.download", section=kind, format=opts.get('format')):
+            if layout is not None:
+                ydl.add_post_processor(layout.shard_postprocessor(), when='pre_process')
+            if info is not None:
+                # Formats are chosen and downloaded here; the extractor already ran
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+    
+    file_path = downloaded_path(info, download_dir)
+    title = info.get('title') or 'Unknown'
+    result = {
+        'title': title,
+        'video_id': info.get('id'),
+        'file_path': file_path,
+        'format': opts.get('format'),
+    }
+    if clip:
+        start, end = clip[0] or 0, clip[1] if clip[1] is not None else info.get('duration')
+        label = f"{format_timestamp(start)}-{format_timestamp(end)}" if end else f"{format_timestamp(start)}-end"
+        title = f"{title} ({label.replace(':', '.')})"
+        result['clip'] = {'start': start, 'end': end}
+        full = full_size_estimate(info)
+        if file_path and full:
+            result['full_size_estimate'] = full
+            result['bytes_saved'] = max(0, full - os.path.getsize(file_path))
+    result['file_name'] = _stored_name(layout, file_path, title, info.get('id') or url)
+    return result
+
+
+def retrying(attempt, budget):
+    """attempt() until it succeeds, or until budget (errors.RetryBudget) or the error's policy says stop"""
+    while True:
+        try:
+            return attempt()
+        except Exception as e:
+            delay = budget.next_delay(e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+def download_video(url, download_dir, format_strategies, progress=None, minimal=False, clip=None, budget=None):
+    """Try each format selector in turn; format errors move on to the next one, transient ones retry it
+
+    Both are paid from budget (a fresh errors.RetryBudget by default).
+    """
+    if not format_strategies:
+        raise Exception("All download strategies failed")
+    budget = budget if budget is not None else errors.RetryBudget()
+    i = 0
+    while True:
+        ydl_opts = base_download_opts(download_dir)
+        if not minimal:
+            ydl_opts.update(VIDEO_REQUEST_OPTS)
+        # Only add format if specified (None means use yt-dlp default)
+        if format_strategies[i]:
+            ydl_opts['format'] = format_strategies[i]
+        try:
+            return run_download(url, ydl_opts, 'video', progress, clip)
+        except Exception as e:
+            is_format_error = classify_error(e) == errors.FORMAT
+            out_of_formats = is_format_error and i == len(format_strategies) - 1
+            delay = None if out_of_formats else budget.next_delay(e)
+            if delay is None:
+                raise
+            if is_format_error:
+                i += 1
+            time.sleep(delay)
+
+
+def download_audio(url, download_dir, audio_format, progress=None, clip=None, budget=None):
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        **base_download_opts(download_dir),
+    }
+    postprocessors = audio_postprocessors(audio_format)
+    if postprocessors:
+        ydl_opts['postprocessors'] = postprocessors
+    return retrying(lambda: run_download(url, ydl_opts, 'audio', progress, clip),
+                    budget if budget is not None else errors.RetryBudget())
+
+
+def download_media(url, download_dir, as_audio=False, progress=None, kind='batch', info=None, convert=True):
+    """Batch/playlist item: yt-dlp's default video, or best audio converted to mp3
+
+    The staged pipeline passes the extract_media() result as info, and
+    convert=False to leave the mp3 conversion to convert_media(). One attempt;
+    callers retry through retrying().
+    """
+    ydl_opts = base_download_opts(download_dir)
+    if as_audio:
+        ydl_opts['format'] = 'bestaudio/best'
+        if convert:
+            ydl_opts['postprocessors'] = audio_postprocessors('mp3')
+    return run_download(url, ydl_opts, kind, progress, info=info)
+
+
+def extract_media(url):
+    """The extractor's result for a batch/playlist item, with formats not yet chosen; None for direct files"""
+    import yt_dlp
+    
+    if is_direct_media_url(url):
+        return None
+    with breaker.board(breaker.EXTRACT).guard(url), \
+            yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'noplaylist': True}) as ydl, \
+            timed("yt-dlp.extract", section='pipeline'):
+        # process=False stops before format selection; download_media() picks up from here
+        return ydl.extract_info(url, download=False, process=False)
+
+
+def convert_media(result, download_dir, audio_format='mp3'):
+    """FFmpeg audio conversion of a download made with convert=False; returns the updated result"""
+    import yt_dlp
+    
+    postprocessors = audio_postprocessors(audio_format)
+    path = result.get('file_path')
+    if not postprocessors or not path:
+        return result
+    started = time.perf_counter()
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'postprocessors': postprocessors}) as ydl, \
+            timed("ffmpeg.convert", section='pipeline', format=audio_format):
+        info = ydl.run_all_pps('post_process', {'filepath': path, 'ext': os.path.splitext(path)[1].lstrip('.')})
+    POSTPROCESS_SECONDS.observe(time.perf_counter() - started, postprocessor='FFmpegExtractAudio')
+    new_path = info['filepath']
+    if new_path == path:
+        return result
+    layout = storage.layout_for(download_dir)
+    if layout is not None and result.get('file_name'):
+        # The index row still points at the pre-conversion file, which yt-dlp has deleted
+        layout.remove(result['file_name'])
+    return dict(result, file_path=new_path,
+                file_name=_stored_name(layout, new_path, result.get('title'), result.get('video_id') or path))
+
+
+def enumerate_playlist(playlist_url, ydl=None):
+    """(playlist info, [watch URLs]) for a playlist using flat extraction"""
+    if ydl is None:
+        import yt_dlp
+        with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as own:
+            playlist_info = own.extract_info(playlist_url, download=False)
+    else:
+        playlist_info = ydl.extract_info(playlist_url, download=False)
+    entries = playlist_info.get('entries', []) or []
+    urls = [f"https://www.youtube.com/watch?v={entry['id']}" for entry in entries if entry and entry.get('id')]
+    return playlist_info, urls
+
+
+# --- Images ---
+
+IMAGE_SIZES = {
+    "1920x1080": (1920, 1080),
+    "1280x720": (1280, 720),
+    "800x600": (800, 600),
+}
+
+
+def fetch_image(url, session, timeout=30):
+    """GET image bytes, over parallel ranges when large; raises ValueError on a non-200 response"""
+    # Chunks are paced by this thread's bandwidth allocation, if limited
+    allocation = bandwidth.current()
+    hooks = [allocation.progress_hook] if allocation is not None and allocation.limited else []
+    with timed("image.fetch"):
+        return segmented.download_bytes(session, url, timeout=timeout, progress_hooks=hooks)
+
+
+def open_image(image_data):
+    from PIL import Image
+    return Image.open(io.BytesIO(image_data))
+
+
+def resize_image(img, size):
+    from PIL import Image
+    with timed("image.transcode"):
+        return img.resize(size, Image.Resampling.LANCZOS)
+
+
+def transcode_image(img, image_format):
+    """Encode a PIL image as JPEG/PNG/WebP bytes (JPEG drops alpha)"""
+    # Convert to RGB if saving as JPEG
+    if image_format == "JPEG" and img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+    img_buffer = io.BytesIO()
+    with timed("image.transcode"):
+        img.save(img_buffer, format=image_format)
+    return img_buffer.getvalue()
+
+
+def image_file_name(url, fallback="downloaded_image"):
+    return os.path.basename(urlparse(url).path) or fallback
+
+
+def download_image(url, download_dir, session, image_format=None, file_name=None):
+    """Fetch an image, optionally convert it, and save it into download_dir"""
+    with breaker.board(breaker.DOWNLOAD).guard(url):
+        image_data = fetch_image(url, session)
+    img = open_image(image_data)
+    file_name = file_name or image_file_name(url, "image.jpg")
+    if image_format and image_format not in ("Original", "Keep Original"):
+        image_data = transcode_image(img, image_format)
+        file_name = os.path.splitext(file_name)[0] + f".{image_format.lower()}"
+    file_name = clean_filename(file_name)
+    os.makedirs(download_dir, exist_ok=True)
+    layout = storage.layout_for(download_dir)
+    if layout is not None:
+        # Identical bytes land on the same path, so repeat fetches do not duplicate files
+        key = storage.content_key(image_data)
+        stem, ext = os.path.splitext(file_name)
+        file_path = layout.path_for(key, f"{stem}-{key[:8]}{ext}")
+    else:
+        file_path = os.path.join(download_dir, file_name)
+    with open(file_path, 'wb') as f:
+        f.write(image_data)
+    if layout is not None:
+        file_name = layout.register(file_path, key, file_name)
+    return {
+        'title': file_name,
+        'file_path': file_path,
+        'file_name': file_name,
+        'size': len(image_data),
+    }
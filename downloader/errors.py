@@ -0,0 +1,198 @@
+"""Error taxonomy and retry budget shared by extraction and downloads
+
+``classify`` maps a failure to one small, stable class. It goes by exception
+type first: yt-dlp's ``DownloadError`` is unwrapped to the exception that
+caused it, HTTP errors (from yt-dlp, requests or urllib) by status code, and
+``GeoRestrictedError``, ``UnsupportedError``, ``PostProcessingError`` and
+transport errors by type. Only the wording of "expected" ``ExtractorError``s
+(private, removed, age-gated) is read, because yt-dlp does not type those.
+Plain strings fall back to the same keyword rules, for errors that only
+survive as a message such as a finished job's ``error``.
+
+Each class has a ``RetryPolicy``. Permanent failures such as unavailable,
+age-restricted, geo-blocked or unsupported URLs fail on the first attempt.
+Transient ones are retried with exponential backoff, but every retry of a
+job, whether extraction fallback, format fallback or download retry, is paid
+from one ``RetryBudget`` (DOWNLOADER_RETRY_BUDGET, default 3). One bad URL
+therefore costs at most 1 + budget upstream calls.
+"""
+import os
+import random
+import re
+import socket
+import sys
+from collections import namedtuple
+
+from downloader.metrics import REGISTRY
+
+FORBIDDEN = "forbidden"
+RATE_LIMITED = "rate_limited"
+SERVER = "server"
+NETWORK = "network"
+FORMAT = "format"
+UNAVAILABLE = "unavailable"
+AGE_RESTRICTED = "age_restricted"
+GEO_RESTRICTED = "geo_restricted"
+UNSUPPORTED = "unsupported"
+POSTPROCESS = "postprocess"
+OTHER = "other"
+CIRCUIT_OPEN = "circuit_open"
+
+# retries: how many times this class may be retried at most (0 = fail at once); base_delay in seconds
+RetryPolicy = namedtuple("RetryPolicy", ["retries", "base_delay"])
+
+RETRY_POLICIES = {
+    RATE_LIMITED: RetryPolicy(2, 5.0),
+    SERVER: RetryPolicy(3, 2.0),
+    NETWORK: RetryPolicy(3, 1.0),
+    FORBIDDEN: RetryPolicy(2, 3.0),      # anti-bot blocks: another player client sometimes gets through
+    FORMAT: RetryPolicy(3, 0.0),         # the next format strategy, straight away
+    OTHER: RetryPolicy(1, 1.0),
+    UNAVAILABLE: RetryPolicy(0, 0.0),
+    AGE_RESTRICTED: RetryPolicy(0, 0.0),
+    GEO_RESTRICTED: RetryPolicy(0, 0.0),
+    UNSUPPORTED: RetryPolicy(0, 0.0),
+    POSTPROCESS: RetryPolicy(0, 0.0),    # e.g. FFmpeg missing; downloading again will not help
+    CIRCUIT_OPEN: RetryPolicy(0, 0.0),   # the upstream is down; see downloader.breaker
+}
+MAX_DELAY = 30.0
+
+_SERVER_ERROR_RE = re.compile(r"\bhttp(?: error)? 5\d\d\b")
+
+RETRIES = REGISTRY.counter(
+    "downloader_retries_total", "Retry decisions by error class", ["error_class", "decision"])
+
+
+class JobFailed(Exception):
+    """A finished job's failure, re-raised by callers waiting on it; keeps the job's error_class"""
+
+    def __init__(self, message, error_class=None):
+        super().__init__(message)
+        self.error_class = error_class
+
+
+def _chain(error):
+    """error and the exceptions behind it: DownloadError.exc_info, ExtractorError.cause, __cause__"""
+    seen = []
+    while error is not None and len(seen) < 8 and all(error is not e for e in seen):
+        seen.append(error)
+        exc_info = getattr(error, "exc_info", None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = wrapped or getattr(error, "cause", None) or error.__cause__
+        if not isinstance(error, BaseException):
+            error = None
+    return seen
+
+
+def http_status(error):
+    """HTTP status behind an exception (yt-dlp, requests or urllib), or None"""
+    for candidate in _chain(error):
+        for status in (getattr(candidate, "status", None), getattr(candidate, "code", None),
+                       getattr(getattr(candidate, "response", None), "status_code", None)):
+            if isinstance(status, int) and 100 <= status < 600:
+                return status
+    return None
+
+
+def _status_class(status):
+    if status == 429:
+        return RATE_LIMITED
+    if status in (401, 403):
+        return FORBIDDEN
+    if status in (404, 410):
+        return UNAVAILABLE
+    if status >= 500:
+        return SERVER
+    return None
+
+
+def _message_class(message):
+    """Keyword rules for errors that only exist as text"""
+    message = message.lower()
+    if "429" in message or "too many requests" in message:
+        return RATE_LIMITED
+    if "not a bot" in message or "403" in message or "forbidden" in message:
+        return FORBIDDEN
+    if _SERVER_ERROR_RE.search(message):
+        return SERVER
+    if "age" in message and ("restrict" in message or "verif" in message or "sign in to confirm your age" in message):
+        return AGE_RESTRICTED
+    if "your country" in message or "geo restrict" in message or "geo-restrict" in message:
+        return GEO_RESTRICTED
+    if "unsupported url" in message:
+        return UNSUPPORTED
+    if "private" in message or "unavailable" in message or "removed" in message or "404" in message:
+        return UNAVAILABLE
+    if "format" in message:
+        return FORMAT
+    if "ffmpeg" in message or "ffprobe" in message or "postprocessing" in message:
+        return POSTPROCESS
+    if "timed out" in message or "timeout" in message or "connection" in message:
+        return NETWORK
+    return OTHER
+
+
+def _type_class(error):
+    """Class from exception types alone, or None"""
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if "yt_dlp" in sys.modules:
+        if "GeoRestrictedError" in names:
+            return GEO_RESTRICTED
+        if "UnsupportedError" in names:
+            return UNSUPPORTED
+        if "PostProcessingError" in names:
+            return POSTPROCESS
+        if names & {"TransportError", "ContentTooShortError"}:
+            return NETWORK
+    if isinstance(error, (socket.timeout, TimeoutError, ConnectionError)):
+        return NETWORK
+    if names & {"Timeout", "ConnectionError", "ChunkedEncodingError"}:  # requests
+        return NETWORK
+    return None
+
+
+def classify(error):
+    """Error class for an exception or message (see the module docstring)"""
+    if isinstance(error, BaseException):
+        explicit = getattr(error, "error_class", None)
+        if explicit:
+            return explicit
+        status = http_status(error)
+        if status is not None and _status_class(status):
+            return _status_class(status)
+        for candidate in _chain(error):
+            error_class = _type_class(candidate)
+            if error_class:
+                return error_class
+    return _message_class(str(error))
+
+
+def retryable(error_class):
+    return RETRY_POLICIES.get(error_class, RETRY_POLICIES[OTHER]).retries > 0
+
+
+class RetryBudget:
+    """Retries one job may still spend, across extraction, format fallbacks and downloads"""
+
+    def __init__(self, retries=None):
+        self.remaining = retries if retries is not None else int(os.environ.get("DOWNLOADER_RETRY_BUDGET") or 3)
+        self._per_class = {}
+
+    def next_delay(self, error):
+        """Seconds to wait before retrying after error, or None to give up now"""
+        error_class = classify(error)
+        policy = RETRY_POLICIES.get(error_class, RETRY_POLICIES[OTHER])
+        used = self._per_class.get(error_class, 0)
+        if policy.retries <= 0:
+            RETRIES.inc(error_class=error_class, decision="not_retryable")
+            return None
+        if used >= policy.retries or self.remaining <= 0:
+            RETRIES.inc(error_class=error_class, decision="exhausted")
+            return None
+        self._per_class[error_class] = used + 1
+        self.remaining -= 1
+        RETRIES.inc(error_class=error_class, decision="retried")
+        if not policy.base_delay:
+            return 0.0
+        # Exponential backoff with jitter so parallel jobs do not retry in lockstep
+        return min(MAX_DELAY, policy.base_delay * 2 ** used * random.uniform(0.75, 1.25))
@@ -0,0 +1,97 @@
+"""Incremental os.scandir index of a downloads directory"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+FileEntry = namedtuple("FileEntry", ["name", "size", "mtime"])
+
+
+class DirectoryIndex:
+    """Cached listing that only re-stats what changed since the last refresh
+
+    The directory's own mtime changes whenever an entry is added, removed or
+    renamed, so an unchanged mtime means the cached listing is still valid.
+    When it did change, only names not seen before are stat'ed. Files that
+    grow in place (e.g. ``.part`` downloads) do not touch the directory
+    mtime, so every ``full_rescan_interval`` seconds all entries are re-stat'ed.
+    """
+
+    def __init__(self, path, full_rescan_interval=300):
+        self.path = path
+        self.full_rescan_interval = full_rescan_interval
+        self._entries = {}
+        self._sorted = None
+        self._total_bytes = 0
+        self._dir_mtime = None
+        self._last_full_scan = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Bring the index up to date; returns True if anything was re-scanned"""
+        with self._lock:
+            try:
+                dir_mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._entries, self._sorted, self._dir_mtime = {}, None, None
+                self._total_bytes = 0
+                return True
+
+            now = time.monotonic()
+            full = force or now - self._last_full_scan >= self.full_rescan_interval
+            if not full and dir_mtime == self._dir_mtime:
+                return False
+
+            entries = {}
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    cached = self._entries.get(entry.name)
+                    if cached is not None and not full:
+                        entries[entry.name] = cached
+                        continue
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries[entry.name] = FileEntry(entry.name, st.st_size, st.st_mtime)
+
+            self._entries = entries
+            self._sorted = None
+            self._total_bytes = sum(e.size for e in entries.values())
+            self._dir_mtime = dir_mtime
+            if full:
+                self._last_full_scan = now
+            return True
+
+    def _newest_first(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._entries.values(), key=lambda e: e.mtime, reverse=True)
+        return self._sorted
+
+    def query(self, search=None, page=0, per_page=25):
+        """Return (entries, total_matches) for one page, newest first"""
+        self.refresh()
+        with self._lock:
+            entries = self._newest_first()
+            if search:
+                needle = search.casefold()
+                entries = [e for e in entries if needle in e.name.casefold()]
+            start = page * per_page
+            return entries[start:start + per_page], len(entries)
+
+    def totals(self):
+        """(file_count, total_bytes) from the cached listing"""
+        self.refresh()
+        with self._lock:
+            return len(self._entries), self._total_bytes
+
+    def remove(self, name):
+        """Delete a file and drop it from the index without rescanning the rest"""
+        os.remove(os.path.join(self.path, name))
+        with self._lock:
+            removed = self._entries.pop(name, None)
+            if removed is not None:
+                self._total_bytes -= removed.size
+            self._sorted = None
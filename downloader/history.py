@@ -0,0 +1,90 @@
+"""SQLite-backed download history shared by every session"""
+import os
+import sqlite3
+import threading
+import time
+
+from downloader.config import default_data_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    download_time TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    session_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_created ON history (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_history_type ON history (type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_history_title ON history (title COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_history_session ON history (session_id);
+"""
+
+_COLUMNS = ("id", "type", "title", "file_name", "download_time", "session_id")
+
+
+class HistoryStore:
+    """Append-only history table with indexed paging and aggregate queries"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(default_data_dir(), "history.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def add(self, item_type, title, file_name, download_time, session_id=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO history (type, title, file_name, download_time, created_at, session_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (item_type, title or "", file_name or "", download_time, time.time(), session_id),
+            )
+            self._conn.commit()
+
+    def _where(self, item_type=None, search=None):
+        clauses, params = [], []
+        if item_type:
+            clauses.append("type = ?")
+            params.append(item_type)
+        if search:
+            clauses.append("(title LIKE ? ESCAPE '\\' OR file_name LIKE ? ESCAPE '\\')")
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend([pattern, pattern])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def page(self, page=0, per_page=20, item_type=None, search=None):
+        """Newest-first slice of history as a list of dicts"""
+        where, params = self._where(item_type, search)
+        sql = (f"SELECT {', '.join(_COLUMNS)} FROM history{where} "
+               "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._conn.execute(sql, params + [per_page, page * per_page]).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def count(self, item_type=None, search=None):
+        where, params = self._where(item_type, search)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+
+    def type_counts(self):
+        """{type: count} ordered by count, most common first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT type, COUNT(*) AS n FROM history GROUP BY type ORDER BY n DESC"
+            ).fetchall()
+        return dict(rows)
+
+    def types(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT type FROM history ORDER BY type")]
+
+    def clear(self, session_id):
+        """Delete one session's entries; the table is shared by every user"""
+        with self._lock:
+            self._conn.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+            self._conn.commit()
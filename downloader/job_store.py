@@ -0,0 +1,378 @@
+"""Where job state lives: in memory (one process) or SQLite (shared by replicas)
+
+Replicas that point DOWNLOADER_JOB_STORE at the same SQLite file on a shared
+volume form one queue. Any replica can accept a job and report its status.
+Workers on every replica compete for queued jobs through ``claim``, which
+takes a time-limited lease. The lease is renewed while the job runs, so a job
+whose worker died becomes claimable again once its lease runs out.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from downloader.config import default_data_dir
+from downloader.scheduler import ANONYMOUS, INTERACTIVE, FairShareScheduler, job_priority
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED_STATES = (DONE, FAILED)
+
+
+class Job:
+    """One unit of work; to_dict() is the wire format for the API"""
+
+    def __init__(self, kind, params, job_id=None, created_at=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.created_at = created_at or time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.error_class = None
+        self.progress = {}
+        self.owner = None
+        self.attempts = 0
+        self.priority = job_priority(kind, params)
+        self.client_id = params.get("client_id") or ANONYMOUS
+        self.not_before = None  # a released job is skipped by claims until this time
+        self.position = None  # place in the queue while queued, filled in on lookup
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": {k: v for k, v in self.params.items() if k != "download_dir"},
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "error_class": self.error_class,
+            "owner": self.owner,
+            "priority": self.priority,
+            "position": self.position if self.status == QUEUED else None,
+        }
+
+
+class MemoryJobStore:
+    """Single-process store; jobs are shared objects so updates need no writes"""
+
+    def __init__(self, max_finished=500):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._last_started = {}
+        self._cond = threading.Condition()
+
+    def add(self, job):
+        with self._cond:
+            self._jobs[job.id] = job
+            self._prune()
+            self._cond.notify()
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list(self, limit=50):
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return list(reversed(jobs))[:limit]
+
+    def count(self, status):
+        with self._cond:
+            return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def claim(self, owner, lease_seconds, timeout=1.0, scheduler=None, allow_bulk=True):
+        """Next job per the scheduler, marked running for owner; waits up to timeout"""
+        scheduler = scheduler or FairShareScheduler()
+        with self._cond:
+            job = self._pick(scheduler, allow_bulk)
+            if job is None:
+                self._cond.wait(timeout)
+                job = self._pick(scheduler, allow_bulk)
+            if job is None:
+                return None
+            job.status = RUNNING
+            job.owner = owner
+            job.started_at = time.time()
+            job.attempts += 1
+            self._last_started[job.client_id] = job.started_at
+            return job
+
+    def _pick(self, scheduler, allow_bulk):
+        heads, running = {}, {}
+        now = time.time()
+        for job in self._jobs.values():
+            if job.status == RUNNING:
+                running[job.client_id] = running.get(job.client_id, 0) + 1
+            elif job.status == QUEUED and not (job.not_before and job.not_before > now):
+                # Insertion order is FIFO, so the first job seen is the head
+                heads.setdefault((job.priority, job.client_id), job)
+        job_id = scheduler.pick(
+            [(job.id, job.priority, job.client_id, job.created_at) for job in heads.values()],
+            running, self._last_started, allow_bulk,
+        )
+        return self._jobs.get(job_id) if job_id else None
+
+    def release(self, job, delay=0):
+        """Put a claimed job back at the head of its queue without counting an attempt
+
+        For delay seconds claims pass over it, so the client's next job and
+        other clients' jobs run meanwhile.
+        """
+        with self._cond:
+            if job.status == RUNNING:
+                job.status = QUEUED
+                job.owner = None
+                job.started_at = None
+                job.attempts -= 1
+                job.not_before = time.time() + delay if delay else None
+
+    def position(self, job):
+        """1-based place of a queued job: interactive work, then older jobs of its class, go first"""
+        with self._cond:
+            ahead = sum(
+                1 for other in self._jobs.values()
+                if other.status == QUEUED and other.id != job.id
+                and (other.priority == INTERACTIVE and job.priority != INTERACTIVE
+                     or other.priority == job.priority and other.created_at < job.created_at)
+            )
+        return ahead + 1
+
+    def save_progress(self, job):
+        pass
+
+    def renew(self, owner, job_ids, lease_seconds):
+        pass
+
+    def finish(self, job):
+        return True
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    error_class TEXT,
+    progress TEXT,
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    priority TEXT NOT NULL DEFAULT 'interactive',
+    client_id TEXT NOT NULL DEFAULT 'anonymous'
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at DESC);
+"""
+
+_COLUMNS = ("id", "kind", "params", "status", "created_at", "started_at", "finished_at",
+            "result", "error", "error_class", "progress", "owner", "attempts")
+
+
+def _row_to_job(row):
+    record = dict(zip(_COLUMNS, row))
+    job = Job(record["kind"], json.loads(record["params"]), record["id"], record["created_at"])
+    job.status = record["status"]
+    job.started_at = record["started_at"]
+    job.finished_at = record["finished_at"]
+    job.result = json.loads(record["result"]) if record["result"] else None
+    job.error = record["error"]
+    job.error_class = record["error_class"]
+    job.progress = json.loads(record["progress"]) if record["progress"] else {}
+    job.owner = record["owner"]
+    job.attempts = record["attempts"]
+    return job
+
+
+class SqliteJobStore:
+    """Job table on a volume every replica mounts; claims are BEGIN IMMEDIATE transactions"""
+
+    def __init__(self, db_path=None, max_finished=5000, max_attempts=3):
+        self.db_path = db_path or os.path.join(default_data_dir(), "jobs.sqlite3")
+        self.max_finished = max_finished
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Columns added after the table first shipped
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, ddl in (("priority", "TEXT NOT NULL DEFAULT 'interactive'"),
+                          ("client_id", "TEXT NOT NULL DEFAULT 'anonymous'"),
+                          ("not_before", "REAL")):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {ddl}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, client_id, created_at)")
+
+    def add(self, job):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, priority, client_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, json.dumps(job.params), job.status, job.created_at, job.priority, job.client_id),
+            )
+            # Keep only the newest finished jobs
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?) "
+                "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (DONE, FAILED, self.max_finished),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list(self, limit=50):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def count(self, status):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim(self, owner, lease_seconds, timeout=None, scheduler=None, allow_bulk=True):
+        """Take the next job per the scheduler; None if there is nothing to do"""
+        scheduler = scheduler or FairShareScheduler()
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases: the worker died. Retry, or give up after max_attempts
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, error_class = ?, finished_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, "worker lost while running the job", "other", now, RUNNING, now, self.max_attempts),
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND lease_until < ?",
+                    (QUEUED, RUNNING, now),
+                )
+                # Oldest queued job per (class, client); SQLite returns the row holding MIN().
+                # Released jobs still in their delay are passed over
+                heads = self._conn.execute(
+                    "SELECT id, priority, client_id, MIN(created_at) FROM jobs "
+                    "WHERE status = ? AND (not_before IS NULL OR not_before <= ?) GROUP BY priority, client_id",
+                    (QUEUED, now),
+                ).fetchall()
+                running = dict(self._conn.execute(
+                    "SELECT client_id, COUNT(*) FROM jobs WHERE status = ? GROUP BY client_id", (RUNNING,)
+                ).fetchall())
+                last_started = dict(self._conn.execute(
+                    "SELECT client_id, MAX(started_at) FROM jobs WHERE started_at > ? GROUP BY client_id",
+                    (now - 3600,),
+                ).fetchall())
+                job_id = scheduler.pick(heads, running, last_started, allow_bulk)
+                if job_id is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, started_at = ?, "
+                    "attempts = attempts + 1, progress = NULL WHERE id = ?",
+                    (RUNNING, owner, now + lease_seconds, now, job_id),
+                )
+                claimed = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return _row_to_job(claimed)
+
+    def release(self, job, delay=0):
+        """Put a claimed job back in the queue without counting an attempt; claims skip it for delay seconds"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, started_at = NULL, "
+                "attempts = attempts - 1, not_before = ? WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED, time.time() + delay if delay else None, job.id, job.owner, RUNNING),
+            )
+
+    def position(self, job):
+        """1-based place of a queued job: interactive work, then older jobs of its class, go first"""
+        with self._lock:
+            ahead = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND id != ? AND "
+                "((priority = ? AND ? != ?) OR (priority = ? AND created_at < ?))",
+                (QUEUED, job.id, INTERACTIVE, job.priority, INTERACTIVE, job.priority, job.created_at),
+            ).fetchone()[0]
+        return ahead + 1
+
+    def save_progress(self, job):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ? WHERE id = ? AND owner = ?",
+                (json.dumps(job.progress), job.id, job.owner),
+            )
+
+    def renew(self, owner, job_ids, lease_seconds):
+        if not job_ids:
+            return
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ? AND id IN ({placeholders})",
+                (time.time() + lease_seconds, owner, RUNNING, *job_ids),
+            )
+
+    def finish(self, job):
+        """Write the outcome; False if another worker has since taken the job over"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, error_class = ?, "
+                "progress = ?, lease_until = NULL WHERE id = ? AND owner = ? AND status = ?",
+                (job.status, job.finished_at, json.dumps(job.result) if job.result is not None else None,
+                 job.error, job.error_class, json.dumps(job.progress), job.id, job.owner, RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def wake(self):
+        pass
+
+
+def open_job_store(spec=None):
+    """Store from a DOWNLOADER_JOB_STORE-style spec: "memory", "sqlite" or "sqlite:/path/jobs.sqlite3" """
+    spec = (spec if spec is not None else os.environ.get("DOWNLOADER_JOB_STORE", "")).strip()
+    if not spec or spec == "memory":
+        return MemoryJobStore()
+    if spec == "sqlite":
+        return SqliteJobStore()
+    if spec.startswith("sqlite:"):
+        return SqliteJobStore(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown job store: {spec!r} (expected memory, sqlite or sqlite:/path)")
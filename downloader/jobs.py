@@ -0,0 +1,470 @@
+"""Download job queue used by the HTTP API, the CLI and the Streamlit UI
+
+Job state lives in a pluggable store (see downloader.job_store): in memory
+for a single process, or a shared SQLite file so several replicas serve one
+queue. Batch and playlist items ("media" jobs) and bulk images do not occupy
+a worker from start to finish; workers hand them to a staged pipeline (see
+downloader.pipeline) whose per-host concurrency adapts to the upstream (see
+downloader.concurrency), and go back to claiming. Bulk jobs for a host whose
+circuit breaker is open (see downloader.breaker) wait in the queue instead of
+failing.
+"""
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from downloader import bandwidth, breaker, engine, storage, sync
+from downloader.errors import RetryBudget
+from downloader.admission import AdmissionController, Overloaded  # noqa: F401
+from downloader.job_store import DONE, FAILED, FINISHED_STATES, QUEUED, RUNNING, Job, MemoryJobStore  # noqa: F401
+from downloader.concurrency import HostLimits
+from downloader.metrics import QUEUE_DEPTH, classify_error
+from downloader.pipeline import CONVERT, DOWNLOAD, EXTRACT, Pipeline, Stage, stage_workers_from_env
+from downloader.profiling import activate
+from downloader.scheduler import BULK, FairShareScheduler
+
+# Seconds a job that did not fit the memory/disk budget is passed over before being tried again
+ADMISSION_BACKOFF = 5.0
+
+# History "type" column for each job kind, matching what the UI always wrote
+HISTORY_TYPES = {
+    "video": "Video",
+    "audio": "Audio",
+    "media": "Video",
+    "image": "Image",
+}
+
+
+def _progress_hook(job, store=None, interval=1.0, streamable=False):
+    """yt-dlp progress hook that keeps job.progress current
+
+    With streamable=True (no postprocessing will rewrite the file) the growing
+    file is recorded too, for GET /jobs/<id>/stream. Downloads whose streams
+    are merged afterwards (yt-dlp's requested_formats) are never streamable,
+    nor are parallel range downloads, which fill the file out of order.
+    """
+    last_saved = [0.0]
+
+    def hook(d):
+        if d.get("status") == "downloading":
+            job.progress = {
+                "downloaded_bytes": d.get("downloaded_bytes") or 0,
+                "total_bytes": d.get("total_bytes") or d.get("total_bytes_estimate") or 0,
+                "speed": d.get("speed"),
+                "eta": d.get("eta"),
+            }
+            info = d.get("info_dict")
+            if streamable and info and not info.get("requested_formats") and d.get("tmpfilename"):
+                job.progress.update(streamable=True, partial_file=d["tmpfilename"], file=d.get("filename"))
+        elif d.get("status") == "finished":
+            job.progress = dict(job.progress, phase="postprocessing")
+        # Shared stores get at most one progress write per interval
+        now = time.monotonic()
+        if store is not None and (now - last_saved[0] >= interval or d.get("status") == "finished"):
+            last_saved[0] = now
+            store.save_progress(job)
+    return hook
+
+
+def _clip(p):
+    """(start, end, precise) from clip_start/clip_end/clip_precise params, or None for the whole file"""
+    if p.get("clip_start") is None and p.get("clip_end") is None:
+        return None
+    start = float(p.get("clip_start") or 0)
+    end = float(p["clip_end"]) if p.get("clip_end") is not None else None
+    if end is not None and end <= start:
+        raise ValueError("Clip end must be after its start")
+    return start, end, bool(p.get("clip_precise"))
+
+
+def _run_video(job, manager):
+    p = job.params
+    strategies = p.get("format_strategies") or engine.video_format_strategies(p.get("audio_guaranteed", True))
+    clip = _clip(p)
+    return engine.download_video(p["url"], p["download_dir"], strategies,
+                                 _progress_hook(job, manager.store, streamable=clip is None),
+                                 minimal=p.get("minimal", False), clip=clip, budget=RetryBudget())
+
+
+def _run_audio(job, manager):
+    p = job.params
+    audio_format, clip = p.get("audio_format", "mp3"), _clip(p)
+    # mp3/m4a are converted by FFmpeg after the download, so only other formats can stream
+    streamable = clip is None and not engine.audio_postprocessors(audio_format)
+    return engine.download_audio(p["url"], p["download_dir"], audio_format,
+                                 _progress_hook(job, manager.store, streamable=streamable),
+                                 clip=clip, budget=RetryBudget())
+
+
+def _run_media(job, manager):
+    p = job.params
+    return engine.retrying(
+        lambda: engine.download_media(p["url"], p["download_dir"], p.get("as_audio", False),
+                                      _progress_hook(job, manager.store, streamable=not p.get("as_audio")),
+                                      kind=p.get("source", "batch")),
+        RetryBudget())
+
+
+def _run_image(job, manager):
+    p = job.params
+    return engine.retrying(
+        lambda: engine.download_image(p["url"], p["download_dir"], manager.http_session, p.get("image_format")),
+        RetryBudget())
+
+
+def _run_sync(job, manager):
+    """Queue the downloads a playlist sync needs (see downloader.sync); returns a summary with their job ids"""
+    p = job.params
+    as_audio = bool(p.get("as_audio"))
+    plan = sync.plan(p["url"], as_audio, active=manager.active)
+    job_ids = []
+    for video_id, url in plan.items:
+        try:
+            child = manager.submit("media", {
+                "url": url, "download_dir": p["download_dir"], "as_audio": as_audio, "source": "playlist",
+                "history_type": p.get("history_type") or ("Audio Only" if as_audio else "Video"),
+                "client_id": job.client_id, "priority": BULK, "sync_key": plan.key, "video_id": video_id,
+            })
+        except Overloaded:
+            break  # the rest stay pending for the next sync
+        sync.queued(plan.key, video_id, child.id)
+        job_ids.append(child.id)
+    return {
+        "title": plan.title,
+        "checked": plan.checked,
+        "stopped_early": plan.stopped_early,
+        "new": len(plan.items),
+        "job_ids": job_ids,
+    }
+
+
+JOB_HANDLERS = {
+    "video": _run_video,
+    "audio": _run_audio,
+    "media": _run_media,
+    "image": _run_image,
+    "sync": _run_sync,
+}
+
+
+def _upstream_down(job):
+    """Seconds until a bulk job's upstream host may take a probe, or None when its breakers let it through"""
+    if job.priority != BULK:
+        return None
+    url = job.params.get("url", "")
+    pools = (DOWNLOAD,) if job.kind == "image" else (EXTRACT, DOWNLOAD)
+    blocked = [board for board in map(breaker.board, pools) if board.blocked(url)]
+    if not blocked:
+        return None
+    return max(board.retry_after(url) for board in blocked)
+
+
+def _pipelined(job):
+    """Batch/playlist items and bulk images run through the staged pipeline instead of JOB_HANDLERS"""
+    return job.kind == "media" or (job.kind == "image" and job.priority == BULK)
+
+
+class _Staged:
+    """A pipelined job plus what one stage hands to the next"""
+
+    def __init__(self, job, profiler=None):
+        self.job = job
+        self.profiler = profiler
+        self.budget = RetryBudget()  # shared by all stages of this job
+        self.info = None
+        self.result = None
+
+
+def _set_phase(item, manager, phase):
+    item.job.progress = dict(item.job.progress, phase=phase)
+    manager.store.save_progress(item.job)
+
+
+def _extract_stage(item, manager):
+    url = item.job.params["url"]
+    if engine.is_direct_media_url(url):
+        return  # nothing to extract; the download stage fetches the file itself
+    _set_phase(item, manager, "extracting")
+    activate(item.profiler)
+    try:
+        # Retries wait outside the host slot, and every attempt's outcome feeds the host's limit
+        item.info = engine.retrying(lambda: _extract_once(manager, url), item.budget)
+    finally:
+        activate(None)
+    _set_phase(item, manager, "waiting to download")
+
+
+def _extract_once(manager, url):
+    with manager.limits[EXTRACT].slot(url):
+        return engine.extract_media(url)
+
+
+def _download_stage(item, manager):
+    activate(item.profiler)
+    try:
+        item.result = engine.retrying(lambda: _download_once(item, manager), item.budget)
+    finally:
+        activate(None)
+    if item.job.params.get("as_audio"):
+        _set_phase(item, manager, "waiting to convert")
+
+
+def _download_once(item, manager):
+    job, p = item.job, item.job.params
+    # A retry extracts afresh: expired format URLs may be what failed
+    info, item.info = item.info, None
+    # The host's adaptive limit decides how many of the stage's workers may hit it at once
+    with manager.limits[DOWNLOAD].slot(p["url"]) as ticket, manager.governor.lease(job.priority):
+        if job.kind == "image":
+            result = engine.download_image(p["url"], p["download_dir"], manager.http_session, p.get("image_format"))
+            ticket.units = result.get("size") or 1
+        else:
+            result = engine.download_media(p["url"], p["download_dir"], p.get("as_audio", False),
+                                           _progress_hook(job, manager.store, streamable=not p.get("as_audio")),
+                                           kind=p.get("source", "batch"),
+                                           info=info, convert=False)
+            file_path = result.get("file_path")
+            ticket.units = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 1
+    return result
+
+
+def _convert_stage(item, manager):
+    _set_phase(item, manager, "converting")
+    activate(item.profiler)
+    try:
+        item.result = engine.convert_media(item.result, item.job.params["download_dir"], "mp3")
+    finally:
+        activate(None)
+
+
+def media_pipeline(manager, workers, queue_size=4):
+    """Pipeline for bulk jobs; workers is {stage: thread count}"""
+    return Pipeline([
+        Stage(EXTRACT, lambda item: _extract_stage(item, manager), workers[EXTRACT],
+              applies=lambda item: item.job.kind == "media"),
+        Stage(DOWNLOAD, lambda item: _download_stage(item, manager), workers[DOWNLOAD]),
+        Stage(CONVERT, lambda item: _convert_stage(item, manager), workers[CONVERT],
+              applies=lambda item: item.job.kind == "media" and bool(item.job.params.get("as_audio"))),
+    ], lambda item, error: manager._complete(item.job, item.result, error), queue_size)
+
+
+class JobManager:
+    """Worker threads that claim jobs from a store and run them through JOB_HANDLERS"""
+
+    def __init__(self, download_dir, workers=2, history=None, http_session=None, max_finished=500,
+                 store=None, lease_seconds=60, poll_interval=0.5, scheduler=None, interactive_reserve=1,
+                 governor=None, admission=None, stage_workers=None, stage_queue=None):
+        self.download_dir = download_dir
+        storage.open_root(download_dir)  # the downloads root is the only directory that may be sharded
+        self.history = history
+        self.http_session = http_session
+        self.store = store if store is not None else MemoryJobStore(max_finished)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler or FairShareScheduler()
+        self.governor = governor or bandwidth.default_governor()
+        # Memory/disk/queue budgets; over budget, jobs wait in the queue instead of starting
+        self.admission = admission or AdmissionController.from_env(download_dir)
+        # Workers bulk jobs may occupy; the rest stay free for interactive requests
+        self.bulk_slots = max(1, workers - interactive_reserve)
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{id(self):x}"
+        self._profilers = {}
+        self._running = {}     # job_id -> priority, for jobs holding a worker thread
+        self._staged = set()   # jobs handed to the pipeline; their leases are renewed too
+        self._lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"download-job-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="download-job-lease", daemon=True))
+        # Per-host limits start at the configured worker counts (downloads: the bulk slots) and adapt
+        # from there; the extract and download pools are sized for the limits' ceiling
+        workers_by_stage = dict(stage_workers or stage_workers_from_env(self.bulk_slots))
+        self.limits = {stage: HostLimits.from_env(stage, workers_by_stage[stage]) for stage in (EXTRACT, DOWNLOAD)}
+        for stage, limits in self.limits.items():
+            workers_by_stage[stage] = limits.maximum
+        self.pipeline = media_pipeline(self, workers_by_stage,
+                                       stage_queue or int(os.environ.get("DOWNLOADER_STAGE_QUEUE") or 4))
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, params, profiler=None):
+        """Queue a job; params['url'] is required, download_dir defaults to the manager's"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if not params.get("url"):
+            raise ValueError("url is required")
+        self.admission.check_submit(self.store.count(QUEUED))
+        params = dict(params)
+        params.setdefault("download_dir", self.download_dir)
+        job = Job(kind, params)
+        if profiler is not None:
+            with self._lock:
+                self._profilers[job.id] = profiler
+        self.store.add(job)
+        QUEUE_DEPTH.set(self.store.count(QUEUED))
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        if job is not None and job.status == QUEUED:
+            job.position = self.store.position(job)
+        return job
+
+    def active(self, job_id):
+        """True while the job is queued or running"""
+        job = self.store.get(job_id) if job_id else None
+        return job is not None and job.status not in FINISHED_STATES
+
+    def saturated(self):
+        """Why this process should not be sent new work right now, or None"""
+        return self.admission.saturated(self.store.count(QUEUED))
+
+    def list(self, limit=50):
+        return self.store.list(limit)
+
+    def wait(self, job_id, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and not job.finished and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.1)
+            job = self.get(job_id)
+        return job
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            # One claim at a time so the bulk slot count cannot be overshot
+            with self._claim_lock:
+                with self._lock:
+                    allow_bulk = sum(1 for priority in self._running.values() if priority == BULK) < self.bulk_slots
+                try:
+                    job = self.store.claim(self.owner, self.lease_seconds, timeout=self.poll_interval,
+                                           scheduler=self.scheduler, allow_bulk=allow_bulk)
+                except Exception:
+                    # e.g. the shared database is busy; try again shortly
+                    job = None
+                # Jobs put back below are passed over until their delay ends, so the next claim
+                # goes to other heads (including this client's jobs for other hosts)
+                retry_after = _upstream_down(job) if job is not None else None
+                if retry_after is not None:
+                    # Its host's breaker is open: wait for the half-open probe (or the probe in flight)
+                    self.store.release(job, max(retry_after, self.poll_interval))
+                    continue
+                if job is not None and self.admission.try_start(job.id, job.kind, job.params) is not None:
+                    # Over budget: leave it queued and look again once running work may have freed something
+                    self.store.release(job, ADMISSION_BACKOFF)
+                    continue
+                if job is not None:
+                    with self._lock:
+                        self._running[job.id] = job.priority
+            if job is None:
+                if self._wakeup.wait(self.poll_interval):
+                    self._wakeup.clear()
+                continue
+            QUEUE_DEPTH.set(self.store.count(QUEUED))
+            if _pipelined(job):
+                self._stage(job)
+            else:
+                self._run(job)
+
+    def _heartbeat(self):
+        # Keep leases on running jobs fresh so other replicas do not take them over
+        while not self._stopping.wait(self.lease_seconds / 3):
+            with self._lock:
+                running = list(self._running) + list(self._staged)
+            try:
+                self.store.renew(self.owner, running, self.lease_seconds)
+            except Exception:
+                pass
+
+    def _run(self, job):
+        # Interactive callers pass their run profiler so job timings show in their panel
+        with self._lock:
+            profiler = self._profilers.pop(job.id, None)
+        result = error = None
+        activate(profiler)
+        try:
+            with self.governor.lease(job.priority):
+                result = JOB_HANDLERS[job.kind](job, self)
+        except Exception as e:
+            error = e
+        finally:
+            activate(None)
+        self._complete(job, result, error)
+
+    def _stage(self, job):
+        """Hand a job to the pipeline; blocks while its first stage is backed up"""
+        with self._lock:
+            profiler = self._profilers.pop(job.id, None)
+        self.pipeline.submit(_Staged(job, profiler))
+        with self._lock:
+            # This worker is free again; unless the job already finished, the pipeline holds it now
+            self._running.pop(job.id, None)
+            if not job.finished:
+                self._staged.add(job.id)
+
+    def _complete(self, job, result=None, error=None):
+        if isinstance(error, breaker.CircuitOpen) and job.priority == BULK:
+            # The upstream went down while the job waited in the pipeline: queue it again, attempt not counted
+            self.admission.finish(job.id)
+            with self._lock:
+                self._running.pop(job.id, None)
+                self._staged.discard(job.id)
+            job.progress = {}
+            self.store.release(job, max(error.retry_after, self.poll_interval))
+            self._wakeup.set()
+            return
+        if error is not None:
+            job.error = str(error)
+            job.error_class = classify_error(error)
+            job.status = FAILED
+        else:
+            job.result = result
+            job.status = DONE
+        job.finished_at = time.time()
+        self.admission.finish(job.id)
+        with self._lock:
+            self._running.pop(job.id, None)
+            self._staged.discard(job.id)
+        if self.store.finish(job):
+            if job.status == DONE:
+                self._record_history(job)
+            if job.params.get("sync_key"):
+                self._record_sync(job)
+
+    def _record_history(self, job):
+        if self.history is None or not job.result or job.kind == "sync":
+            return
+        try:
+            self.history.add(
+                job.params.get("history_type") or HISTORY_TYPES.get(job.kind, job.kind),
+                job.result.get("title") or job.result.get("file_name") or "",
+                job.result.get("file_name") or "",
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                job.params.get("client_id"),
+            )
+        except Exception:
+            # History is best-effort; never fail a finished download over it
+            pass
+
+    def _record_sync(self, job):
+        try:
+            sync.record(job.params["sync_key"], job.params.get("video_id"), job.status == DONE)
+        except Exception:
+            # A missed record only means the video is downloaded again by the next sync
+            pass
+
+    def shutdown(self, wait=False):
+        self._stopping.set()
+        self.pipeline.shutdown()
+        self._wakeup.set()
+        self.store.wake()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,109 @@
+"""Signed, expiring download links served by nginx instead of Python
+
+The app hands out ``/files/<path>?expires=<unix time>&sig=<hmac>`` for a
+finished file (path relative to the downloads root). The API checks the
+signature and expiry only, then answers with an empty body and
+``X-Accel-Redirect: <prefix><path>``. nginx serves the file from its own
+read-only mount of the downloads volume through an ``internal`` location,
+using sendfile, so no media bytes pass through Python.
+
+Set DOWNLOADER_ACCEL_REDIRECT to that internal prefix (e.g.
+"/_protected_downloads/") to turn this on. Without nginx in front it stays
+off, and files are streamed as before. Links are signed with
+DOWNLOADER_LINK_SECRET, or with a key generated once in the data directory,
+so every replica sharing that volume accepts the others' links.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+from downloader.config import default_data_dir
+
+LINK_TTL = int(os.environ.get("DOWNLOADER_LINK_TTL") or 3600)
+
+_secret = None
+_secret_lock = threading.Lock()
+
+
+def accel_prefix():
+    """Internal nginx location for X-Accel-Redirect, or None when offload is off"""
+    prefix = os.environ.get("DOWNLOADER_ACCEL_REDIRECT", "").strip()
+    if not prefix:
+        return None
+    return "/" + prefix.strip("/") + "/"
+
+
+def _link_secret():
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            configured = os.environ.get("DOWNLOADER_LINK_SECRET")
+            if configured:
+                _secret = configured.encode("utf-8")
+            else:
+                path = os.path.join(default_data_dir(), "link_secret")
+                try:
+                    # O_EXCL: when replicas race, one writes and the rest read its key
+                    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                    with os.fdopen(fd, "w") as f:
+                        f.write(secrets.token_hex(32))
+                except FileExistsError:
+                    pass
+                with open(path) as f:
+                    _secret = f.read().strip().encode("utf-8")
+        return _secret
+
+
+def _signature(rel_path, expires, file_name=""):
+    message = f"{rel_path}\n{expires}\n{file_name or ''}".encode("utf-8")
+    return hmac.new(_link_secret(), message, hashlib.sha256).hexdigest()
+
+
+def relative_path(file_path, root):
+    """file_path relative to root with "/" separators, or None if it lies outside root"""
+    root = os.path.realpath(root)
+    path = os.path.realpath(file_path)
+    if os.path.commonpath([root, path]) != root or path == root:
+        return None
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def signed_url(file_path, root, file_name=None, ttl=LINK_TTL, base="/files/"):
+    """Signed link for a file under root, or None if it is outside root"""
+    rel_path = relative_path(file_path, root)
+    if rel_path is None:
+        return None
+    expires = int(time.time()) + ttl
+    query = {"expires": expires, "sig": _signature(rel_path, expires, file_name)}
+    if file_name:
+        query["name"] = file_name
+    return f"{base}{quote(rel_path)}?{urlencode(query)}"
+
+
+def verify(rel_path, expires, signature, file_name=None):
+    """True if the link (including its download name) is authentic and has not expired"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(rel_path, expires, file_name), signature or "")
+
+
+def content_disposition(file_name, disposition="attachment"):
+    """Content-Disposition for any file name; RFC 5987 encoding keeps non-ASCII titles out of the raw header"""
+    return f"{disposition}; filename*=UTF-8''{quote(file_name)}"
+
+
+def accel_headers(rel_path, file_name):
+    """Headers that hand the transfer to nginx (prefix must be set)"""
+    return {
+        "X-Accel-Redirect": accel_prefix() + quote(rel_path),
+        "Content-Type": "application/octet-stream",
+        "Content-Disposition": content_disposition(file_name),
+    }
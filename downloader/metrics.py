@@ -0,0 +1,309 @@
+"""Prometheus-style metrics for downloads, served on a side port
+
+Minimal in-process registry (counters, gauges, histograms with labels) that
+renders the Prometheus text exposition format, so no extra dependency is
+needed. ``start_metrics_server`` serves it from a daemon thread; nginx
+routes ``/metrics`` to that port.
+"""
+import functools
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                value = None
+            if value is not None:
+                self.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.1, 0.5, 1, 5, 10, 30, 60)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        if buckets is None:
+            return self._register(Histogram(name, documentation, labelnames))
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_MIB = 1024 * 1024
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    "downloader_extraction_seconds", "Metadata extraction latency", ["result"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120))
+TTFB_SECONDS = REGISTRY.histogram(
+    "downloader_time_to_first_byte_seconds", "Time from starting a download to its first media bytes", ["kind"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60))
+THROUGHPUT = REGISTRY.histogram(
+    "downloader_download_throughput_bytes_per_second", "Average throughput of each finished file", ["kind"],
+    buckets=(64 * 1024, 256 * 1024, _MIB, 2 * _MIB, 5 * _MIB, 10 * _MIB, 25 * _MIB, 50 * _MIB, 100 * _MIB))
+POSTPROCESS_SECONDS = REGISTRY.histogram(
+    "downloader_postprocess_seconds", "yt-dlp postprocessor run time (merge, FFmpeg conversion)", ["postprocessor"],
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300))
+DOWNLOADS_TOTAL = REGISTRY.counter(
+    "downloader_downloads_total", "Download attempts by outcome", ["kind", "result"])
+FAILURES_TOTAL = REGISTRY.counter(
+    "downloader_failures_total", "Failures by error class", ["kind", "error_class"])
+DOWNLOADED_BYTES = REGISTRY.counter(
+    "downloader_downloaded_bytes_total", "Media bytes written by finished downloads", ["kind"])
+ACTIVE_JOBS = REGISTRY.gauge(
+    "downloader_active_jobs", "Downloads currently in progress", ["kind"])
+QUEUE_DEPTH = REGISTRY.gauge(
+    "downloader_queue_depth", "Jobs waiting to start")
+QUEUE_DEPTH.set(0)
+
+
+def classify_error(error):
+    """Map an exception or error message to a small, stable error class (see downloader.errors)"""
+    from downloader.errors import classify
+    return classify(error)
+
+
+def observe_extraction(func):
+    """Decorator for get_video_info-style functions returning (info, error_message)"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            EXTRACTION_SECONDS.observe(time.perf_counter() - start, result="failure")
+            FAILURES_TOTAL.inc(kind="extraction", error_class=classify_error(e))
+            raise
+        info, error_message = result
+        EXTRACTION_SECONDS.observe(time.perf_counter() - start, result="success" if info else "failure")
+        if not info:
+            FAILURES_TOTAL.inc(kind="extraction", error_class=classify_error(error_message))
+        return result
+    return wrapper
+
+
+class DownloadTracker:
+    """Context manager around one yt-dlp download; feeds the metrics via yt-dlp hooks
+
+    Usage::
+
+        with track_download("audio") as tracker, yt_dlp.YoutubeDL(tracker.hooked(opts)) as ydl:
+            ydl.download([url])
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._start = None
+        self._first_byte_seen = False
+        self._pp_started = {}
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        ACTIVE_JOBS.inc(kind=self.kind)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ACTIVE_JOBS.dec(kind=self.kind)
+        if exc is None:
+            DOWNLOADS_TOTAL.inc(kind=self.kind, result="success")
+        else:
+            DOWNLOADS_TOTAL.inc(kind=self.kind, result="failure")
+            FAILURES_TOTAL.inc(kind=self.kind, error_class=classify_error(exc))
+        return False
+
+    def hooked(self, ydl_opts):
+        """Copy of ydl_opts with this tracker's progress/postprocessor hooks appended"""
+        opts = dict(ydl_opts)
+        opts["progress_hooks"] = list(opts.get("progress_hooks", [])) + [self._on_progress]
+        opts["postprocessor_hooks"] = list(opts.get("postprocessor_hooks", [])) + [self._on_postprocess]
+        return opts
+
+    def _on_progress(self, d):
+        status = d.get("status")
+        if status == "downloading" and not self._first_byte_seen and d.get("downloaded_bytes"):
+            self._first_byte_seen = True
+            TTFB_SECONDS.observe(time.perf_counter() - self._start, kind=self.kind)
+        elif status == "finished":
+            total = d.get("total_bytes") or d.get("downloaded_bytes") or 0
+            elapsed = d.get("elapsed")
+            if total:
+                DOWNLOADED_BYTES.inc(total, kind=self.kind)
+            if total and elapsed:
+                THROUGHPUT.observe(total / elapsed, kind=self.kind)
+
+    def _on_postprocess(self, d):
+        name = d.get("postprocessor") or "unknown"
+        if d.get("status") == "started":
+            self._pp_started[name] = time.perf_counter()
+        elif d.get("status") == "finished" and name in self._pp_started:
+            POSTPROCESS_SECONDS.observe(time.perf_counter() - self._pp_started.pop(name), postprocessor=name)
+
+
+def track_download(kind):
+    return DownloadTracker(kind)
+
+
+def register_disk_gauges(path):
+    """Free/used bytes of the volume holding path, sampled at scrape time"""
+    REGISTRY.gauge("downloader_disk_free_bytes", "Free bytes on the downloads volume",
+                   callback=lambda: shutil.disk_usage(path).free)
+    REGISTRY.gauge("downloader_disk_used_bytes", "Used bytes on the downloads volume",
+                   callback=lambda: shutil.disk_usage(path).used)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=9108, addr="0.0.0.0"):
+    """Serve /metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,21 @@
+"""Filename and size-display helpers shared by every download path"""
+import re
+
+_UNSAFE_CHARS_RE = re.compile(r'[<>:"/\\|?*]')
+
+
+def clean_filename(name):
+    """Replace characters that are invalid in Windows/Unix filenames"""
+    return _UNSAFE_CHARS_RE.sub('_', name)
+
+
+def format_file_size(size_bytes):
+    """Convert bytes to human readable format"""
+    if size_bytes == 0:
+        return "0B"
+    size_names = ["B", "KB", "MB", "GB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+    return f"{size_bytes:.1f} {size_names[i]}"
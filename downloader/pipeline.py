@@ -0,0 +1,146 @@
+"""Staged pipeline for batch and playlist items: extract -> download -> convert
+
+Run one item at a time and each stage leaves its resource idle while the
+others work. Extraction waits on the upstream API, downloading uses the
+network, and conversion uses the CPU. Here every stage has its own worker
+threads and a bounded inbox. Metadata for the next few items is extracted
+while one item downloads and the previous one is converted by FFmpeg. A full
+inbox blocks the stage in front of it, so no stage runs more than
+``queue_size`` items ahead of the next.
+
+Per-stage metrics show which pool to grow. A stage whose busy seconds rise at
+``workers`` per second is saturated, and one whose inbox is always empty is
+oversized::
+
+    rate(downloader_stage_busy_seconds_total[5m]) / downloader_stage_workers
+"""
+import os
+import queue
+import threading
+import time
+
+from downloader.metrics import REGISTRY
+
+EXTRACT, DOWNLOAD, CONVERT = "extract", "download", "convert"
+
+STAGE_WORKERS = REGISTRY.gauge(
+    "downloader_stage_workers", "Worker threads per pipeline stage", ["stage"])
+STAGE_BUSY = REGISTRY.gauge(
+    "downloader_stage_busy_workers", "Pipeline stage workers currently processing an item", ["stage"])
+STAGE_BUSY_SECONDS = REGISTRY.counter(
+    "downloader_stage_busy_seconds_total", "Worker-seconds spent processing items, per pipeline stage", ["stage"])
+STAGE_QUEUED = REGISTRY.gauge(
+    "downloader_stage_queue_depth", "Items waiting in front of a pipeline stage", ["stage"])
+STAGE_ITEMS = REGISTRY.counter(
+    "downloader_stage_items_total", "Items leaving a pipeline stage by outcome", ["stage", "result"])
+
+
+def stage_workers_from_env(download_workers=2):
+    """{stage: workers} from DOWNLOADER_EXTRACT_WORKERS / DOWNLOADER_CONVERT_WORKERS"""
+    return {
+        EXTRACT: max(1, int(os.environ.get("DOWNLOADER_EXTRACT_WORKERS") or 2)),
+        DOWNLOAD: max(1, download_workers),
+        CONVERT: max(1, int(os.environ.get("DOWNLOADER_CONVERT_WORKERS") or max(1, (os.cpu_count() or 2) // 2))),
+    }
+
+
+class Stage:
+    """One step of the pipeline; handler(item) does the work and raises on failure
+
+    Items for which applies(item) is false skip the stage.
+    """
+
+    def __init__(self, name, handler, workers=1, applies=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.applies = applies
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.inbox = None
+
+
+class Pipeline:
+    """Moves items through stages in order; on_finished(item, error) is called once per item"""
+
+    def __init__(self, stages, on_finished, queue_size=4):
+        self.stages = stages
+        self.on_finished = on_finished
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        for index, stage in enumerate(stages):
+            stage.inbox = queue.Queue(queue_size)
+            STAGE_WORKERS.set(stage.workers, stage=stage.name)
+            STAGE_BUSY.set(0, stage=stage.name)
+            STAGE_QUEUED.set(0, stage=stage.name)
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index,), name=f"stage-{stage.name}-{i}",
+                                          daemon=True)
+                self._threads.append(thread)
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item):
+        """Hand an item to the first stage that applies; blocks while that stage's inbox is full"""
+        self._forward(item, 0)
+
+    def _forward(self, item, index):
+        while index < len(self.stages):
+            stage = self.stages[index]
+            if stage.applies is None or stage.applies(item):
+                stage.inbox.put(item)
+                STAGE_QUEUED.set(stage.inbox.qsize(), stage=stage.name)
+                return
+            index += 1
+        self.on_finished(item, None)
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        while not self._stopping.is_set():
+            try:
+                item = stage.inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            STAGE_QUEUED.set(stage.inbox.qsize(), stage=stage.name)
+            with self._lock:
+                stage.busy += 1
+            STAGE_BUSY.inc(stage=stage.name)
+            started = time.monotonic()
+            error = None
+            try:
+                stage.handler(item)
+            except Exception as e:
+                error = e
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    stage.busy -= 1
+                    stage.busy_seconds += elapsed
+                STAGE_BUSY.dec(stage=stage.name)
+                STAGE_BUSY_SECONDS.inc(elapsed, stage=stage.name)
+            STAGE_ITEMS.inc(stage=stage.name, result="failure" if error is not None else "success")
+            if error is not None:
+                self.on_finished(item, error)
+            else:
+                # Blocks while the next stage is backed up, which holds this worker back too
+                self._forward(item, index + 1)
+
+    def snapshot(self):
+        """{stage: {workers, busy, queued, utilization}}; utilization is busy time per worker since start"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        with self._lock:
+            return {
+                stage.name: {
+                    "workers": stage.workers,
+                    "busy": stage.busy,
+                    "queued": stage.inbox.qsize(),
+                    "utilization": round(stage.busy_seconds / (stage.workers * elapsed), 3),
+                }
+                for stage in self.stages
+            }
+
+    def shutdown(self):
+        """Stop taking items; ones still queued are picked up again when their leases expire"""
+        self._stopping.set()
@@ -0,0 +1,139 @@
+"""Speculative metadata prefetch, and the metadata cache shared by every session
+
+The cache holds two tiers per video. ``PREVIEW`` info (``engine.preview_info``)
+has title, channel, duration, views and thumbnails, enough for the info
+panels. ``FULL`` info has resolved formats. A full entry also answers
+preview lookups, and a preview never replaces a full entry. Prefetches only
+ever fetch the preview tier, since most pasted URLs are never downloaded.
+
+The UI calls ``prefetch(owner, urls)`` on every rerun with the current
+contents of an input (owner is "<session>:<widget key>"). Valid YouTube URLs
+start extracting right away on a small worker pool, and their thumbnails are
+warmed in the shared ThumbnailService cache. By the time the user has picked
+quality settings and clicked Download, ``get`` usually returns immediately.
+If the extraction is still running, ``get`` joins it instead of starting a
+second one.
+
+When an input changes, prefetches that only it asked for are cancelled if
+they have not started. One that is already extracting runs to the end and
+its result is cached, since yt-dlp cannot be interrupted mid-request. Results
+are shared by all sessions and expire after ``ttl`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from downloader.metrics import REGISTRY
+from downloader.thumbnails import extract_video_id
+
+PREFETCH_TOTAL = REGISTRY.counter(
+    "downloader_prefetch_total", "Speculative metadata prefetches by outcome", ["result"])
+PREFETCH_LOOKUPS = REGISTRY.counter(
+    "downloader_prefetch_lookups_total", "Metadata lookups served by the prefetch cache", ["result"])
+
+
+PREVIEW, FULL = "preview", "full"
+_TIER_RANK = {PREVIEW: 0, FULL: 1}
+
+
+def canonical_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class MetadataPrefetcher:
+    """Shared, bounded cache of info dicts keyed by video ID, filled ahead of clicks"""
+
+    def __init__(self, extract, thumbnails=None, workers=2, ttl=600, max_entries=256, max_per_input=10):
+        self.extract = extract            # url -> (info, error_message) at the PREVIEW tier, like engine.preview_info
+        self.thumbnails = thumbnails
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_per_input = max_per_input
+        self._cache = OrderedDict()       # video_id -> (expires_at, info, tier)
+        self._inflight = {}               # video_id -> Future
+        self._wanted = {}                 # owner -> [video_id]
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="prefetch")
+
+    def _cached(self, video_id, tier=PREVIEW):
+        entry = self._cache.get(video_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[video_id]
+            return None
+        if _TIER_RANK[entry[2]] < _TIER_RANK[tier]:
+            return None
+        self._cache.move_to_end(video_id)
+        return entry[1]
+
+    def _put(self, video_id, info, tier):
+        # Called with the lock held
+        entry = self._cache.get(video_id)
+        if entry is not None and entry[0] >= time.monotonic() and _TIER_RANK[entry[2]] > _TIER_RANK[tier]:
+            return
+        self._cache[video_id] = (time.monotonic() + self.ttl, info, tier)
+        self._cache.move_to_end(video_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def store(self, url, info, tier=FULL):
+        """Cache info extracted elsewhere for url (YouTube URLs only)"""
+        video_id = extract_video_id(url)
+        if video_id and info:
+            with self._lock:
+                self._put(video_id, info, tier)
+
+    def prefetch(self, owner, urls):
+        """Start extracting the valid YouTube URLs in urls; cancel what owner no longer wants"""
+        ids = list(dict.fromkeys(v for v in map(extract_video_id, urls) if v))[:self.max_per_input]
+        with self._lock:
+            dropped = set(self._wanted.get(owner, ())) - set(ids)
+            self._wanted[owner] = ids
+            still_wanted = {v for wanted in self._wanted.values() for v in wanted}
+            for video_id in dropped - still_wanted:
+                future = self._inflight.get(video_id)
+                if future is not None and future.cancel():
+                    self._inflight.pop(video_id, None)
+                    PREFETCH_TOTAL.inc(result="cancelled")
+            for video_id in ids:
+                if video_id in self._inflight or self._cached(video_id) is not None:
+                    continue
+                self._inflight[video_id] = self._pool.submit(self._run, video_id)
+
+    def forget(self, owner):
+        """Drop owner's interest (e.g. its input was cleared)"""
+        self.prefetch(owner, [])
+
+    def _run(self, video_id):
+        try:
+            info, _ = self.extract(canonical_url(video_id))
+        except Exception:
+            info = None
+        if info is not None:
+            with self._lock:
+                self._put(video_id, info, PREVIEW)
+            if self.thumbnails is not None:
+                self.thumbnails.fetch_for_info(info)
+        PREFETCH_TOTAL.inc(result="success" if info is not None else "failure")
+        with self._lock:
+            self._inflight.pop(video_id, None)
+        return info
+
+    def get(self, url, tier=PREVIEW, timeout=None):
+        """Cached info for url at tier or better, waiting for an in-flight preview; None if there is none"""
+        video_id = extract_video_id(url)
+        if not video_id:
+            return None
+        with self._lock:
+            info = self._cached(video_id, tier)
+            # Prefetches only produce previews
+            future = self._inflight.get(video_id) if info is None and tier == PREVIEW else None
+        if info is None and future is not None:
+            try:
+                info = future.result(timeout)
+            except (CancelledError, Exception):
+                info = None
+        PREFETCH_LOOKUPS.inc(result="hit" if info is not None else "miss")
+        return info
@@ -0,0 +1,104 @@
+"""Opt-in per-run timing of the expensive steps in a script run
+
+A RunProfiler is activated for the current thread (Streamlit runs each
+session's script on its own thread). Code anywhere below it wraps work in
+``timed("name")``; when no profiler is active that is a no-op.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_active = threading.local()
+
+
+class RunProfiler:
+    """Collects (section, seconds) records for one script run"""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.records = []
+        self._depth = 0
+
+    def record(self, name, seconds, error=None, **labels):
+        self.records.append({
+            "section": name,
+            "seconds": seconds,
+            "depth": self._depth,
+            "error": error,
+            **labels,
+        })
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def summary(self):
+        """Per-section count / total / max, slowest total first"""
+        sections = {}
+        for rec in self.records:
+            row = sections.setdefault(rec["section"], {"section": rec["section"], "calls": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0})
+            row["calls"] += 1
+            row["total_s"] += rec["seconds"]
+            row["max_s"] = max(row["max_s"], rec["seconds"])
+            if rec["error"]:
+                row["errors"] += 1
+        return sorted(sections.values(), key=lambda r: r["total_s"], reverse=True)
+
+    def export(self, path, **extra):
+        """Append this run as one JSON line"""
+        line = {
+            "run_id": self.run_id,
+            "started": self.started,
+            "total_s": self.elapsed(),
+            "records": self.records,
+            **extra,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, default=str) + "\n")
+
+
+def activate(profiler):
+    """Make profiler the target of timed() on this thread (None to disable)"""
+    _active.profiler = profiler
+
+
+def current():
+    return getattr(_active, "profiler", None)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Time a block into the active profiler; exceptions are recorded and re-raised"""
+    profiler = current()
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    profiler._depth += 1
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        profiler._depth -= 1
+        profiler.record(name, time.perf_counter() - start, error, **labels)
+
+
+def profiled(name):
+    """Decorator form of timed() for whole functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,68 @@
+"""Which queued job runs next: interactive before bulk, fair share between users
+
+Every job has a priority class. Single items someone is waiting on in the UI
+are ``interactive``. Batch and playlist items are ``bulk``. A free worker
+always takes interactive work first, so a single video jumps ahead of a long
+playlist between two of its items. Within a class, the user (``client_id``,
+the Streamlit session id) with the fewest running jobs per unit of weight
+goes next. Ties go to whoever started a job least recently, and each user's
+own jobs run in FIFO order.
+"""
+import os
+
+INTERACTIVE, BULK = "interactive", "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+ANONYMOUS = "anonymous"
+
+
+def job_priority(kind, params):
+    """Explicit params['priority'] if valid, else bulk for batch/playlist items"""
+    priority = params.get("priority")
+    if priority in PRIORITY_CLASSES:
+        return priority
+    return BULK if kind == "media" else INTERACTIVE
+
+
+def parse_weights(spec):
+    """"cli=0.5,api=2" -> {"cli": 0.5, "api": 2.0}"""
+    weights = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            client, _, value = item.partition("=")
+            try:
+                weights[client.strip()] = max(0.01, float(value))
+            except ValueError:
+                continue
+    return weights
+
+
+class FairShareScheduler:
+    """Picks among the head (oldest queued job) of each (class, client) queue"""
+
+    def __init__(self, weights=None, default_weight=1.0):
+        if weights is None:
+            weights = parse_weights(os.environ.get("DOWNLOADER_SHARE_WEIGHTS"))
+        self.weights = weights
+        self.default_weight = default_weight
+
+    def weight(self, client_id):
+        return self.weights.get(client_id, self.default_weight)
+
+    def pick(self, heads, running, last_started, allow_bulk=True):
+        """Job id to run next, or None
+
+        heads: (job_id, priority, client_id, created_at) per (class, client)
+        running: {client_id: jobs running now}
+        last_started: {client_id: time its latest job started}
+        """
+        for priority in PRIORITY_CLASSES:
+            if priority == BULK and not allow_bulk:
+                break
+            group = [head for head in heads if head[1] == priority]
+            if group:
+                return min(group, key=lambda head: (
+                    running.get(head[2], 0) / self.weight(head[2]),
+                    last_started.get(head[2], 0.0),
+                    head[3],
+                ))[0]
+        return None
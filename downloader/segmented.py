@@ -0,0 +1,261 @@
+"""Segmented parallel HTTP downloads for large direct URLs
+
+A single TCP connection to a distant CDN rarely fills the link. For direct
+files (images, and media URLs that yt-dlp's generic extractor would only
+stream), a HEAD probe reads ``Content-Length`` and ``Accept-Ranges``. If the
+server supports ranges and the file is big enough, N byte ranges are fetched
+concurrently into a preallocated target and the assembled size is verified.
+Anything else, such as no length, no ranges, or a server that answers a range
+with 200, falls back to one plain stream. The first range to fail stops the
+others between chunks instead of letting them run to the end.
+
+Progress is reported as yt-dlp-style dicts to ``progress_hooks``, so job
+progress, download metrics and the bandwidth governor see these downloads
+like any other. Segments report from their own threads, so hooks may run
+concurrently and must be thread-safe. Nothing is reported until every range
+has been answered with 206, so a fallback to one stream never counts bytes
+twice.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SEGMENTS = max(1, int(os.environ.get("DOWNLOADER_SEGMENTS") or 4))
+MIN_SEGMENT_BYTES = 1024 * 1024      # smaller files are not worth extra connections
+CHUNK_SIZE = 64 * 1024
+SEGMENT_RETRIES = 2
+
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class RangesUnsupported(Exception):
+    """The server ignored or rejected a Range request"""
+
+
+class _Cancelled(Exception):
+    """Another range failed; this one stopped early"""
+
+
+def probe(session, url, timeout=15):
+    """(length or None, accepts_ranges) from a HEAD request; (None, False) if HEAD fails"""
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+    except Exception:
+        return None, False
+    if response.status_code != 200:
+        return None, False
+    try:
+        length = int(response.headers.get("Content-Length", ""))
+    except ValueError:
+        length = None
+    accepts = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return length, accepts
+
+
+def plan_segments(length, segments=SEGMENTS, min_segment=MIN_SEGMENT_BYTES):
+    """[(start, end)] inclusive byte ranges covering length; one range means do not split"""
+    count = max(1, min(segments, length // max(1, min_segment)))
+    size = -(-length // count)
+    return [(start, min(start + size, length) - 1) for start in range(0, length, size)]
+
+
+class _Progress:
+    """Aggregates bytes from all segments into yt-dlp-style progress dicts"""
+
+    def __init__(self, hooks, filename, total, unconfirmed=0):
+        self.hooks = list(hooks or [])
+        self.filename = filename
+        self.total = total
+        self.downloaded = 0
+        self.unconfirmed = unconfirmed  # ranges not yet answered with 206; reports wait for them
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _snapshot(self, status):
+        elapsed = time.monotonic() - self.started
+        speed = self.downloaded / elapsed if elapsed > 0 else None
+        return {
+            "status": status,
+            "filename": self.filename,
+            "tmpfilename": self.filename,
+            "downloaded_bytes": self.downloaded,
+            "total_bytes": self.total,
+            "elapsed": elapsed,
+            "speed": speed,
+            "eta": (self.total - self.downloaded) / speed if speed and self.total else None,
+        }
+
+    def _emit(self, d):
+        # Outside the lock: the bandwidth governor's hook sleeps
+        for hook in self.hooks:
+            hook(d)
+
+    def confirm(self):
+        with self._lock:
+            self.unconfirmed -= 1
+            d = self._snapshot("downloading") if not self.unconfirmed and self.downloaded else None
+        if d is not None:
+            self._emit(d)
+
+    def add(self, nbytes):
+        with self._lock:
+            self.downloaded += nbytes
+            d = self._snapshot("downloading") if not self.unconfirmed else None
+        if d is not None:
+            self._emit(d)
+
+    def finish(self):
+        with self._lock:
+            self.total = self.total or self.downloaded
+            d = self._snapshot("finished")
+        self._emit(d)
+
+
+class _FileSink:
+    """Preallocated file written at offsets; each writer thread uses its own handle"""
+
+    def __init__(self, path, length=None):
+        self.path = path
+        with open(path, "wb") as f:
+            if length:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(f.fileno(), 0, length)
+                else:
+                    f.truncate(length)
+
+    def writer(self):
+        handle = open(self.path, "r+b")
+
+        def write(offset, data):
+            handle.seek(offset)
+            handle.write(data)
+        write.close = handle.close
+        return write
+
+
+class _BytesSink:
+    def __init__(self, length=None):
+        self.buffer = bytearray(length or 0)
+
+    def writer(self):
+        def write(offset, data):
+            end = offset + len(data)
+            if end > len(self.buffer):
+                self.buffer.extend(b"\0" * (end - len(self.buffer)))
+            self.buffer[offset:end] = data
+        write.close = lambda: None
+        return write
+
+
+def _fetch_range(session, url, start, end, sink, progress, timeout, cancel):
+    """Fetch [start, end] into sink, resuming after dropped connections; stops once cancel is set"""
+    write = sink.writer()
+    offset = start
+    confirmed = False
+    try:
+        for attempt in range(SEGMENT_RETRIES + 1):
+            try:
+                if cancel.is_set():
+                    raise _Cancelled()
+                headers = {"Range": f"bytes={offset}-{end}", "Accept-Encoding": "identity"}
+                with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+                    if response.status_code != 206 or not match or int(match.group(1)) != offset:
+                        message = f"HTTP {response.status_code} for range {offset}-{end}"
+                        # Progress is already reported once every range was confirmed: no fallback then
+                        raise IOError(message) if confirmed else RangesUnsupported(message)
+                    if not confirmed:
+                        confirmed = True
+                        progress.confirm()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if cancel.is_set():
+                            raise _Cancelled()
+                        chunk = chunk[:end + 1 - offset]
+                        write(offset, chunk)
+                        offset += len(chunk)
+                        progress.add(len(chunk))
+                        if offset > end:
+                            break
+                if offset > end:
+                    return
+            except (RangesUnsupported, _Cancelled):
+                raise
+            except Exception:
+                if attempt == SEGMENT_RETRIES:
+                    raise
+        raise IOError(f"Range {start}-{end} ended early at byte {offset}")
+    finally:
+        write.close()
+
+
+def _fetch_single(session, url, sink, progress, timeout):
+    """One plain GET stream; raises ValueError on a non-200 response"""
+    write = sink.writer()
+    offset = 0
+    try:
+        with session.get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise ValueError(f"HTTP {response.status_code} fetching {url}")
+            for chunk in response.iter_content(CHUNK_SIZE):
+                write(offset, chunk)
+                offset += len(chunk)
+                progress.add(len(chunk))
+    finally:
+        write.close()
+    return offset
+
+
+def _download(session, url, make_sink, filename, segments, timeout, progress_hooks, probed):
+    length, accepts_ranges = probed if probed is not None else probe(session, url, timeout)
+    ranges = plan_segments(length, segments) if length and accepts_ranges else []
+    if len(ranges) > 1:
+        sink = make_sink(length)
+        progress = _Progress(progress_hooks, filename, length, unconfirmed=len(ranges))
+        cancel = threading.Event()
+        try:
+            with ThreadPoolExecutor(len(ranges), thread_name_prefix="segment") as pool:
+                futures = [pool.submit(_fetch_range, session, url, start, end, sink, progress, timeout, cancel)
+                           for start, end in ranges]
+                try:
+                    # Completion order, so the first failure is raised while the others still run
+                    for future in as_completed(futures):
+                        future.result()
+                except BaseException:
+                    cancel.set()
+                    raise
+            # Every range reported reaching its end; the byte count must agree
+            if progress.downloaded != length:
+                raise IOError(f"Assembled {progress.downloaded} bytes, expected {length}")
+            progress.finish()
+            return sink
+        except RangesUnsupported:
+            pass  # start over as a single stream
+    sink = make_sink(None)
+    progress = _Progress(progress_hooks, filename, length if not ranges else None)
+    _fetch_single(session, url, sink, progress, timeout)
+    progress.finish()
+    return sink
+
+
+def download_bytes(session, url, segments=SEGMENTS, timeout=30, progress_hooks=(), probed=None):
+    """Whole body of url as bytes"""
+    sink = _download(session, url, _BytesSink, url, segments, timeout, progress_hooks, probed)
+    return bytes(sink.buffer)
+
+
+def download_file(session, url, path, segments=SEGMENTS, timeout=30, progress_hooks=(), probed=None):
+    """Download url to path (via path + ".part"); returns the size in bytes"""
+    part = path + ".part"
+    try:
+        _download(session, url, lambda length: _FileSink(part, length), path, segments, timeout,
+                  progress_hooks, probed)
+        os.replace(part, path)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+    return os.path.getsize(path)
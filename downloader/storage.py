@@ -0,0 +1,225 @@
+"""Sharded on-disk layout for a downloads directory
+
+With DOWNLOADER_STORAGE_LAYOUT=sharded, files go to two levels of hashed
+subdirectories instead of one flat directory::
+
+    downloads/3f/a9/Some Title [dQw4w9WgXcQ].mp4     keyed by video ID
+    downloads/c1/07/photo-c107e2d4.jpg               keyed by content hash
+
+A SQLite index (``.layout.sqlite3`` in the same directory) maps the
+human-readable names users see, such as "Some Title.mp4", to those paths.
+The File Manager lists, searches and deletes through the index instead of
+scanning directories. Only the configured downloads root is sharded: the
+app, API and command-line runner open it with ``open_root()`` at startup,
+which moves files already sitting flat in it into shards once. Video IDs are
+recovered from "[id]" suffixes and other files are keyed by name. Any other
+directory, such as a custom download path typed in the UI, stays flat and is
+never moved. The default ``flat`` layout leaves the root alone too, which
+matters for desktop use where it is the user's own Downloads folder.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from downloader.file_index import FileEntry
+
+INDEX_NAME = ".layout.sqlite3"
+SHARD_FIELD = "storage_shard"  # storage_shard0, storage_shard1, ...: one per level
+_ID_SUFFIX_RE = re.compile(r"\[([\w-]{6,})\]$")
+_SKIP_SUFFIXES = (".part", ".ytdl", ".tmp")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_mtime ON files (mtime DESC);
+"""
+
+
+def shard_for(key, depth=2):
+    """"dQw4w9WgXcQ" -> "3f/a9": stable, evenly spread subdirectory for a key"""
+    digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+    return "/".join(digest[i * 2:i * 2 + 2] for i in range(depth))
+
+
+def content_key(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class ShardedStorage:
+    """Hashed-subdirectory layout plus a name -> path index for one root directory"""
+
+    def __init__(self, root, depth=2):
+        self.root = root
+        self.depth = depth
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, INDEX_NAME), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # --- Writing ---
+
+    def outtmpl(self, suffix=""):
+        """yt-dlp output template; the shard fields are filled in by shard_postprocessor()
+
+        One field per level because yt-dlp escapes "/" inside field values.
+        """
+        levels = [f"%({SHARD_FIELD}{i})s" for i in range(self.depth)]
+        return os.path.join(self.root, *levels, f"%(title)s [%(id)s]{suffix}.%(ext)s")
+
+    def shard_postprocessor(self):
+        """yt-dlp pre_process hook that adds the shard fields (from the video ID) to the info dict"""
+        from yt_dlp.postprocessor.common import PostProcessor
+
+        depth = self.depth
+
+        class ShardPP(PostProcessor):
+            def run(self, info):
+                shard = shard_for(info.get("id") or info.get("webpage_url") or "", depth)
+                for i, level in enumerate(shard.split("/")):
+                    info[f"{SHARD_FIELD}{i}"] = level
+                return [], info
+
+        return ShardPP()
+
+    def path_for(self, key, file_name):
+        """Absolute path for a new file; the shard directory is created"""
+        directory = os.path.join(self.root, shard_for(key, self.depth))
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, file_name)
+
+    def register(self, path, key, display_name=None):
+        """Index a file under a unique human-readable name; returns that name"""
+        rel = os.path.relpath(path, self.root)
+        base = display_name or os.path.basename(path)
+        stem, ext = os.path.splitext(base)
+        st = os.stat(path)
+        with self._lock:
+            existing = self._conn.execute("SELECT name FROM files WHERE path = ?", (rel,)).fetchone()
+            if existing:
+                # Same file written again (e.g. re-download): refresh size/mtime
+                self._conn.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (st.st_size, st.st_mtime, rel))
+                self._conn.commit()
+                return existing[0]
+            name, n = base, 1
+            while self._conn.execute("SELECT 1 FROM files WHERE name = ?", (name,)).fetchone():
+                n += 1
+                name = f"{stem} ({n}){ext}"
+            self._conn.execute(
+                "INSERT INTO files (name, path, key, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                (name, rel, str(key), st.st_size, st.st_mtime),
+            )
+            self._conn.commit()
+        return name
+
+    # --- Reading (same interface as DirectoryIndex) ---
+
+    def resolve(self, name):
+        """Absolute path for an indexed name, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM files WHERE name = ?", (name,)).fetchone()
+        return os.path.join(self.root, row[0]) if row else None
+
+    def query(self, search=None, page=0, per_page=25):
+        """(entries, total_matches) for one page, newest first"""
+        where, params = "", []
+        if search:
+            where = " WHERE name LIKE ? ESCAPE '\\'"
+            params.append("%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM files{where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT name, size, mtime FROM files{where} ORDER BY mtime DESC LIMIT ? OFFSET ?",
+                params + [per_page, page * per_page],
+            ).fetchall()
+        return [FileEntry(*row) for row in rows], total
+
+    def totals(self):
+        """(file_count, total_bytes)"""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return count, total
+
+    def remove(self, name):
+        """Delete an indexed file and its index row"""
+        path = self.resolve(name)
+        if path is None:
+            raise FileNotFoundError(name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE name = ?", (name,))
+            self._conn.commit()
+        # Drop shard directories left empty
+        directory = os.path.dirname(path)
+        while directory != self.root and directory.startswith(self.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    # --- Migration ---
+
+    def migrate_flat(self):
+        """Move files sitting directly in root into shards; returns how many moved"""
+        moved = 0
+        with os.scandir(self.root) as it:
+            entries = [e for e in it if e.is_file() and not e.name.startswith(".")
+                       and not e.name.endswith(_SKIP_SUFFIXES)]
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            match = _ID_SUFFIX_RE.search(stem)
+            key = match.group(1) if match else entry.name
+            display = f"{stem[:match.start()].rstrip()}{ext}" if match else entry.name
+            destination = self.path_for(key, entry.name)
+            if os.path.exists(destination):
+                destination = self.path_for(key, f"{stem}-{int(time.time())}{ext}")
+            # os.replace is atomic on one filesystem, so a crash leaves the file in one place
+            try:
+                os.replace(entry.path, destination)
+            except FileNotFoundError:
+                continue  # another replica migrated it first
+            self.register(destination, key, display)
+            moved += 1
+        return moved
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def open_root(download_dir):
+    """Shard the configured downloads root when DOWNLOADER_STORAGE_LAYOUT=sharded; call once at startup
+
+    The first call per process migrates flat files into shards. Returns the
+    ShardedStorage, or None for the flat layout.
+    """
+    if os.environ.get("DOWNLOADER_STORAGE_LAYOUT", "flat").strip().lower() != "sharded":
+        return None
+    root = os.path.abspath(download_dir)
+    with _layouts_lock:
+        storage = _layouts.get(root)
+        if storage is None:
+            storage = ShardedStorage(root)
+            storage.migrate_flat()
+            _layouts[root] = storage
+        return storage
+
+
+def layout_for(download_dir):
+    """ShardedStorage when download_dir is a root opened with open_root(), else None: other directories stay flat"""
+    with _layouts_lock:
+        return _layouts.get(os.path.abspath(download_dir))
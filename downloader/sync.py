@@ -0,0 +1,252 @@
+"""Incremental playlist and channel sync: download only what is new since the last run
+
+Every synced playlist has a row in ``sync.sqlite3`` (data directory) with a
+cursor, the newest video ID seen by the last sync, and an archive of its
+video IDs: "pending" when new or after a failure, "queued" (with the job id)
+while a download job has it, and "done" once downloaded.
+
+A sync enumerates the playlist with flat, lazy extraction. Channel tabs and
+uploads playlists (``list=UU...``) list newest first, so enumeration stops at
+the cursor or the first archived video and only the pages holding new
+uploads are fetched. Ordinary playlists can be reordered or added to
+anywhere, so they are listed in full (still flat, about one request per 100
+entries) and filtered against the archive. Either way only new videos, plus
+pending ones from earlier runs, are downloaded. A video whose job is still
+queued or running is left alone, so overlapping syncs do not download it
+twice. The same playlist synced as video and as audio are separate syncs.
+
+``plan()`` does the enumeration and records new videos as pending; the
+"sync" job kind queues their downloads and marks them queued through
+``queued()``, and each download marks its video done (or pending again)
+through ``record()`` when it finishes.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import parse_qs, urlparse
+
+from downloader import breaker
+from downloader.config import default_data_dir
+
+DONE, PENDING, QUEUED = "done", "pending", "queued"
+
+# key: the playlist as synced (mode + playlist); items: [(video_id, url)] to download, newest first
+SyncPlan = namedtuple("SyncPlan", ["key", "title", "items", "checked", "stopped_early"])
+
+_CHANNEL_ROOT_RE = re.compile(r"^/(?:@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)/?$")
+_NEWEST_FIRST_TABS = ("videos", "streams", "shorts")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    cursor TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS archive (
+    key TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (key, video_id)
+);
+CREATE INDEX IF NOT EXISTS idx_archive_status ON archive (key, status);
+"""
+
+
+def listing_url(url):
+    """A channel's home page lists tabs, not videos; sync its Videos tab instead"""
+    parsed = urlparse(url)
+    if (parsed.hostname or "").endswith("youtube.com") and _CHANNEL_ROOT_RE.match(parsed.path):
+        return parsed._replace(path=parsed.path.rstrip("/") + "/videos").geturl()
+    return url
+
+
+def newest_first(url):
+    """True when the listing is ordered newest first, so a sync can stop at the first known video"""
+    parsed = urlparse(listing_url(url))
+    list_id = (parse_qs(parsed.query).get("list") or [""])[0]
+    if list_id:
+        return list_id.startswith("UU")  # a channel's uploads playlist
+    return parsed.path.rstrip("/").rsplit("/", 1)[-1] in _NEWEST_FIRST_TABS
+
+
+def sync_key(url, as_audio=False):
+    """"video:list:PL..." / "audio:youtube.com/@name/videos": one sync per playlist and mode"""
+    parsed = urlparse(listing_url(url))
+    list_id = (parse_qs(parsed.query).get("list") or [""])[0]
+    host = (parsed.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    playlist = f"list:{list_id}" if list_id else host + parsed.path.rstrip("/")
+    return f"{'audio' if as_audio else 'video'}:{playlist}"
+
+
+def _entry_url(entry):
+    if entry.get("ie_key") in (None, "Youtube") and not (entry.get("url") or "").startswith("http"):
+        return f"https://www.youtube.com/watch?v={entry['id']}"
+    return entry.get("url") or entry.get("webpage_url") or f"https://www.youtube.com/watch?v={entry['id']}"
+
+
+class SyncStore:
+    """Cursors and download archives of synced playlists"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(default_data_dir(), "sync.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        # Columns added after the table first shipped
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(archive)")}
+        if "job_id" not in columns:
+            self._conn.execute("ALTER TABLE archive ADD COLUMN job_id TEXT")
+
+    def cursor(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT cursor FROM playlists WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def archived(self, key):
+        """{video_id: status} for every video this sync has seen"""
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id, status FROM archive WHERE key = ?", (key,)).fetchall()
+        return dict(rows)
+
+    def pending(self, key, active=None):
+        """[(video_id, url)] never queued or failed in earlier runs, newest first
+
+        Queued videos are left out while active(job_id) is true; without active
+        they are always left out. A job that is gone without a record(), such
+        as one lost with an in-memory queue, makes its video pending again.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id, url, status, job_id FROM archive WHERE key = ? AND status IN (?, ?) "
+                "ORDER BY updated_at DESC",
+                (key, PENDING, QUEUED),
+            ).fetchall()
+        return [(video_id, url) for video_id, url, status, job_id in rows
+                if status == PENDING or active is not None and not active(job_id)]
+
+    def save_run(self, key, url, title, cursor, new_items):
+        """Record a sync: new videos become pending; the cursor moves to the newest video seen"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO archive (key, video_id, url, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, video_id, item_url, PENDING, now) for video_id, item_url in new_items],
+            )
+            self._conn.execute(
+                "INSERT INTO playlists (key, url, title, cursor, synced_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET url = excluded.url, title = excluded.title, "
+                "cursor = COALESCE(excluded.cursor, playlists.cursor), synced_at = excluded.synced_at",
+                (key, url, title, cursor, now),
+            )
+            self._conn.commit()
+
+    def queued(self, key, video_id, job_id):
+        """A download job was submitted for the video; later syncs skip it while the job is active"""
+        with self._lock:
+            self._conn.execute(
+                # status != done: a download that finished before this call keeps its record
+                "UPDATE archive SET status = ?, job_id = ?, updated_at = ? "
+                "WHERE key = ? AND video_id = ? AND status != ?",
+                (QUEUED, job_id, time.time(), key, video_id, DONE),
+            )
+            self._conn.commit()
+
+    def record(self, key, video_id, ok):
+        """A sync download finished; failed ones are pending again for the next run"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE archive SET status = ?, job_id = NULL, updated_at = ? WHERE key = ? AND video_id = ?",
+                (DONE if ok else PENDING, time.time(), key, video_id),
+            )
+            self._conn.commit()
+
+    def playlists(self):
+        """Synced playlists with their archive counts, most recently synced first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.key, p.url, p.title, p.synced_at, "
+                "SUM(a.status = 'done'), SUM(a.status = 'pending'), SUM(a.status = 'queued') "
+                "FROM playlists p LEFT JOIN archive a ON a.key = p.key GROUP BY p.key ORDER BY p.synced_at DESC"
+            ).fetchall()
+        return [
+            {"key": key, "url": url, "title": title, "synced_at": synced_at, "done": done or 0,
+             "pending": pending or 0, "queued": queued or 0}
+            for key, url, title, synced_at, done, pending, queued in rows
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def default_store():
+    """The process-wide SyncStore in the data directory"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SyncStore()
+        return _store
+
+
+def plan(url, as_audio=False, store=None, active=None):
+    """Enumerate url and work out which videos a sync must download (see the module docstring)
+
+    active(job_id) tells whether a queued video's download job is still queued
+    or running; see ``SyncStore.pending``.
+    """
+    import yt_dlp
+
+    store = store or default_store()
+    key = sync_key(url, as_audio)
+    ordered = newest_first(url)
+    cursor = store.cursor(key)
+    archived = store.archived(key)
+    new_items, checked, newest, stopped = [], 0, None, False
+    with breaker.board(breaker.EXTRACT).guard(url), \
+            yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist'}) as ydl:
+        # process=False keeps entries lazy: continuation pages are only requested as the loop reaches them
+        info = ydl.extract_info(listing_url(url), download=False, process=False)
+        for _ in range(3):
+            if info.get('_type') not in ('url', 'url_transparent'):
+                break
+            info = ydl.extract_info(info['url'], download=False, process=False)
+        for entry in info.get('entries') or []:
+            if not entry or not entry.get('id') or entry.get('_type') == 'playlist':
+                continue
+            checked += 1
+            video_id = entry['id']
+            newest = newest or video_id
+            if ordered and (video_id == cursor or video_id in archived):
+                stopped = True
+                break
+            if video_id not in archived:
+                new_items.append((video_id, _entry_url(entry)))
+    title = info.get('title') or url
+    store.save_run(key, url, title, newest, new_items)
+    new_ids = {video_id for video_id, _ in new_items}
+    retry = [tuple(item) for item in store.pending(key, active) if item[0] not in new_ids]
+    return SyncPlan(key, title, new_items + retry, checked, stopped)
+
+
+def queued(key, video_id, job_id, store=None):
+    (store or default_store()).queued(key, video_id, job_id)
+
+
+def record(key, video_id, ok, store=None):
+    (store or default_store()).record(key, video_id, ok)
@@ -0,0 +1,207 @@
+"""YouTube thumbnail lookup with quality fallback and a shared byte cache"""
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# Highest to lowest; maxresdefault/sddefault do not exist for every video
+THUMBNAIL_QUALITIES = ["maxresdefault", "sddefault", "hqdefault", "mqdefault", "default"]
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com")
+OEMBED_URL = "https://www.youtube.com/oembed"
+
+
+def extract_video_id(url):
+    """Parse the 11-character video ID from a YouTube URL without calling yt-dlp"""
+    if not url:
+        return None
+    url = url.strip()
+    if _VIDEO_ID_RE.match(url):
+        return url
+    if "://" not in url:
+        url = "https://" + url
+
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    parts = [p for p in parsed.path.split("/") if p]
+
+    candidate = None
+    if host == "youtu.be":
+        candidate = parts[0] if parts else None
+    elif host.endswith(_YOUTUBE_HOSTS):
+        if parts[:1] == ["watch"]:
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v", "e"):
+            candidate = parts[1]
+
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def thumbnail_url(video_id, quality):
+    """Static image URL for a given video ID and thumbnail quality"""
+    return f"https://img.youtube.com/vi/{video_id}/{quality}.jpg"
+
+
+def quality_fallback_order(preferred):
+    """Preferred quality first, then lower qualities, then any higher ones"""
+    if preferred not in THUMBNAIL_QUALITIES:
+        return list(THUMBNAIL_QUALITIES)
+    start = THUMBNAIL_QUALITIES.index(preferred)
+    return THUMBNAIL_QUALITIES[start:] + THUMBNAIL_QUALITIES[:start]
+
+
+class ThumbnailCache:
+    """Thread-safe LRU of image bytes bounded by entry count and total size"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, data):
+        if not data or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._items and (len(self._items) > self.max_entries or self._size > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._size}
+
+
+class ThumbnailService:
+    """Resolve and fetch thumbnails once, then serve them from memory"""
+
+    def __init__(self, session, cache=None, timeout=10):
+        self.session = session
+        self.cache = cache or ThumbnailCache()
+        self.timeout = timeout
+        # video_id -> quality that answered the HEAD probe for that preference
+        self._resolved = {}
+        self._titles = {}  # video_id -> oEmbed title
+        self._lock = threading.Lock()
+
+    def _get_bytes(self, url):
+        """GET a URL through the cache; returns None on any failure"""
+        data = self.cache.get(url)
+        if data is not None:
+            return data
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except Exception:
+            return None
+        if response.status_code != 200 or not response.content:
+            return None
+        self.cache.put(url, response.content)
+        return response.content
+
+    def _exists(self, url):
+        """Cheap HEAD probe so missing qualities never cost a full GET"""
+        if self.cache.get(url) is not None:
+            return True
+        try:
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        except Exception:
+            return False
+        return response.status_code == 200
+
+    def resolve(self, video_id, preferred="maxresdefault"):
+        """Return (url, quality) of the best available thumbnail, or (None, None)"""
+        key = (video_id, preferred)
+        with self._lock:
+            quality = self._resolved.get(key)
+        if quality:
+            return thumbnail_url(video_id, quality), quality
+
+        for quality in quality_fallback_order(preferred):
+            url = thumbnail_url(video_id, quality)
+            if self._exists(url):
+                with self._lock:
+                    self._resolved[key] = quality
+                return url, quality
+        return None, None
+
+    def fetch(self, video_id, preferred="maxresdefault"):
+        """Return (image_bytes, quality) for a video ID, falling back to lower qualities"""
+        url, quality = self.resolve(video_id, preferred)
+        if not url:
+            return None, None
+        data = self._get_bytes(url)
+        if data is None:
+            # Probe said yes but the GET failed; forget it so the next call re-probes
+            with self._lock:
+                self._resolved.pop((video_id, preferred), None)
+            return None, None
+        return data, quality
+
+    def title(self, video_id):
+        """Video title from YouTube's oEmbed endpoint (one small JSON request, no extraction); None on failure"""
+        with self._lock:
+            if video_id in self._titles:
+                return self._titles[video_id]
+        try:
+            response = self.session.get(OEMBED_URL, timeout=self.timeout, params={
+                "url": f"https://www.youtube.com/watch?v={video_id}", "format": "json"})
+            title = response.json().get("title") if response.status_code == 200 else None
+        except Exception:
+            return None
+        if title:
+            with self._lock:
+                self._titles[video_id] = title
+                if len(self._titles) > 1024:
+                    self._titles.pop(next(iter(self._titles)))  # oldest first
+        return title
+
+    def fetch_url(self, url):
+        """Fetch an arbitrary thumbnail URL through the shared cache"""
+        if not url:
+            return None
+        return self._get_bytes(url)
+
+    def fetch_for_info(self, info):
+        """Thumbnail bytes for an extracted info dict, reusing its thumbnails list"""
+        if not info:
+            return None
+        candidates = []
+        thumbnails = info.get("thumbnails") or []
+        # yt-dlp orders by preference ascending; best candidates go first here
+        ranked = sorted(
+            (t for t in thumbnails if t.get("url")),
+            key=lambda t: (t.get("preference") or 0, t.get("width") or 0),
+            reverse=True,
+        )
+        candidates.extend(t["url"] for t in ranked[:4])
+        if info.get("thumbnail"):
+            candidates.insert(0, info["thumbnail"])
+
+        for url in dict.fromkeys(candidates):
+            data = self._get_bytes(url)
+            if data is not None:
+                return data
+
+        video_id = info.get("id")
+        if video_id and _VIDEO_ID_RE.match(video_id):
+            data, _ = self.fetch(video_id, "hqdefault")
+            return data
+        return None
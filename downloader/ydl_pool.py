@@ -0,0 +1,54 @@
+"""Reusable YoutubeDL instances for option sets that never change"""
+import queue
+import threading
+from contextlib import contextmanager
+
+# Fixed option sets worth keeping warm; per-request options still build their own YoutubeDL
+POOL_OPTIONS = {
+    'flat': {
+        'quiet': True,
+        'extract_flat': True,
+    },
+    'info': {
+        'quiet': True,
+        'no_warnings': True,
+    },
+}
+
+
+class YoutubeDLPool:
+    """Small LIFO pool; a YoutubeDL is not thread-safe, so each caller borrows one"""
+
+    def __init__(self, opts, size=2):
+        self.opts = dict(opts)
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create(self):
+        import yt_dlp
+        return yt_dlp.YoutubeDL(self.opts)
+
+    @contextmanager
+    def acquire(self):
+        try:
+            ydl = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    ydl = self._create()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                ydl = self._idle.get()
+        try:
+            yield ydl
+        finally:
+            self._idle.put(ydl)
@@ -1,25 +1,34 @@
 import streamlit as st
-import yt_dlp
 import os
-import requests
-from PIL import Image
-import io
 import json
 from datetime import datetime
 import time
-import re
-from urllib.parse import urlparse
 import random
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import platform
 from pathlib import Path
-import http.cookiejar
 import tempfile
 import uuid
+from downloader.thumbnails import ThumbnailService, extract_video_id
+from downloader.history import HistoryStore
+from downloader.file_index import DirectoryIndex
+from downloader.ydl_pool import YoutubeDLPool, POOL_OPTIONS
+from downloader.naming import clean_filename, format_file_size
+from downloader.sessions import create_session
+from downloader import breaker, engine, links, storage
+from downloader.jobs import JobManager
+from downloader.job_store import open_job_store
+from downloader.bandwidth import default_governor
+from downloader.client import LocalClient, HttpClient, wait_for
+from downloader.api import serve_in_thread
+from downloader import assets
+from downloader.config import default_data_dir, env_flag
+from downloader.profiling import RunProfiler, activate, profiled, timed
+from downloader.prefetch import FULL, PREVIEW, MetadataPrefetcher
+from downloader.admission import estimate_bytes
+from downloader.metrics import observe_extraction, register_disk_gauges, start_metrics_server
+from downloader.errors import FORBIDDEN, RATE_LIMITED, JobFailed, classify, retryable
+# yt_dlp, PIL and requests are imported lazily by downloader.engine/sessions to keep cold start fast
 # --- Initialize session state ---
-if 'download_history' not in st.session_state:
-    st.session_state.download_history = []
 if 'dark_theme' not in st.session_state:
     st.session_state.dark_theme = False
 if 'last_request_time' not in st.session_state:
@@ -29,6 +38,12 @@ if 'session_id' not in st.session_state:
 if 'request_count' not in st.session_state:
     st.session_state.request_count = 0
 
+# --- Optional run profiler (sidebar "Debug: Run Timing" or DOWNLOADER_PROFILE=1) ---
+run_profiler = None
+if st.session_state.get('profile_enabled') or env_flag('DOWNLOADER_PROFILE'):
+    run_profiler = RunProfiler(st.session_state.session_id)
+activate(run_profiler)
+
 # --- Helper Functions ---
 def simulate_browser_visit():
     """Simulate a browser visit to YouTube homepage before extraction"""
@@ -44,7 +59,7 @@ def simulate_browser_visit():
         }
         
         # Make a quick request to YouTube homepage
-        response = requests.get('https://www.youtube.com', headers=headers, timeout=10)
+        response = get_http_session().get('https://www.youtube.com', headers=headers, timeout=10)
         time.sleep(random.uniform(0.5, 1.5))  # Simulate reading time
         return True
     except:
@@ -65,20 +80,6 @@ def enforce_rate_limit(min_interval=2.0):
     
     st.session_state.last_request_time = time.time()
 
-def create_session_cookies():
-    """Create realistic browser cookies for session persistence"""
-    cookie_jar = http.cookiejar.CookieJar()
-    
-    # Simulate realistic YouTube session cookies
-    cookies = {
-        'CONSENT': f'YES+cb.{random.randint(20240101, 20241231)}-{random.randint(10, 99)}-p0.en+FX+{random.randint(100, 999)}',
-        'VISITOR_INFO1_LIVE': ''.join(random.choices('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=22)),
-        'YSC': ''.join(random.choices('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-', k=16)),
-        'PREF': f'f1={random.randint(50000000, 99999999)}&f6=8&hl=en&gl=US',
-    }
-    
-    return cookies
-
 def get_bypass_config(strategy_type='standard'):
     """Get specialized yt-dlp configuration for different bypass strategies"""
     base_config = {
@@ -143,209 +144,239 @@ def get_default_download_path():
         os.makedirs(fallback_path, exist_ok=True)
         return fallback_path
 
-def create_robust_session():
-    """Create a session with retry strategy and user agent rotation"""
-    session = requests.Session()
+@st.cache_resource
+def get_http_session():
+    """Process-wide pooled HTTP session (keep-alive connections survive reruns)"""
+    return create_session()
+
+@st.cache_resource
+def get_ydl_pool(name):
+    """Warm YoutubeDL instances for the fixed option sets in POOL_OPTIONS"""
+    return YoutubeDLPool(POOL_OPTIONS[name])
+
+@st.cache_resource
+def get_metrics_server():
+    """Start the /metrics side server once per process (DOWNLOADER_METRICS_PORT, 0 disables)"""
+    port = int(os.environ.get('DOWNLOADER_METRICS_PORT', '9108'))
+    if not port:
+        return None
+    register_disk_gauges(get_default_download_path())
+    try:
+        return start_metrics_server(port)
+    except OSError:
+        # Port taken (e.g. a second app instance on this host); metrics stay in-process only
+        return None
+
+@st.cache_resource
+def get_storage_layout():
+    """Shard the default downloads root once per process when DOWNLOADER_STORAGE_LAYOUT=sharded"""
+    return storage.open_root(get_default_download_path())
+
+@st.cache_resource
+def get_thumbnail_service():
+    """Process-wide thumbnail service so every session shares one byte cache"""
+    return ThumbnailService(get_http_session())
+
+@profiled("thumbnail.render")
+def show_thumbnail(info, caption):
+    """Render an info dict's thumbnail from the shared cache"""
+    image_data = get_thumbnail_service().fetch_for_info(info)
+    if image_data:
+        st.image(image_data, caption=caption, use_container_width=True)
+    elif info.get('thumbnail'):
+        st.image(info['thumbnail'], caption=caption, use_container_width=True)
+
+@st.cache_resource
+def get_prefetcher():
+    """Process-wide metadata prefetcher; results are shared by every session"""
+    return MetadataPrefetcher(preview_video_info, get_thumbnail_service())
+
+def prefetch_input(key, urls):
+    """Start resolving the URLs currently typed into input `key` while the user picks settings"""
+    get_prefetcher().prefetch(f"{st.session_state.session_id}:{key}", urls)
+
+@profiled("get_video_info")
+def get_video_info(url, max_retries=3, tier=PREVIEW):
+    """Video information from the shared cache, else extracted at the requested tier
+
+    The info panels only need the preview tier; download jobs resolve formats
+    themselves. A preview that fails for a reason other than the video itself
+    (e.g. the light client is blocked) falls back to full extraction.
+    """
+    prefetcher = get_prefetcher()
+    info = prefetcher.get(url, tier)
+    if info is not None:
+        return info, None
+    if tier == PREVIEW:
+        info, error_msg = preview_video_info(url)
+        if info is not None:
+            prefetcher.store(url, info, PREVIEW)
+            return info, None
+        if not retryable(classify(error_msg)):
+            return None, error_msg
+    info, error_msg = extract_video_info(url, max_retries)
+    if info is not None:
+        prefetcher.store(url, info, FULL)
+    return info, error_msg
+
+preview_video_info = observe_extraction(engine.preview_info)
+
+@observe_extraction
+def extract_video_info(url, max_retries=3):
+    """Get video information using yt-dlp with error handling and retries"""
+    def before_first_attempt():
+        # First-time request: simulate browser behavior
+        if st.session_state.request_count == 0:
+            st.info("🌐 Establishing connection...")
+            simulate_browser_visit()
+        
+        # Enforce rate limiting for all requests
+        enforce_rate_limit(min_interval=2.5)
     
-    # Add retry strategy
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
+    return engine.extract_info(url, max_retries, notify=show_notice, before_first_attempt=before_first_attempt)
+
+def show_notice(level, message):
+    """Route engine status messages to the matching Streamlit element"""
+    {'info': st.info, 'success': st.success, 'warning': st.warning}.get(level, st.info)(message)
+
+@st.cache_resource
+def get_history_store():
+    """Process-wide SQLite history so downloads survive sessions and restarts"""
+    return HistoryStore()
+
+@st.cache_resource
+def get_job_manager():
+    """Process-wide download job queue; also served over HTTP when DOWNLOADER_API_PORT is set"""
+    manager = JobManager(
+        get_default_download_path(),
+        workers=int(os.environ.get('DOWNLOADER_WORKERS', '2')),
+        history=get_history_store(),
+        http_session=get_http_session(),
+        # DOWNLOADER_JOB_STORE=sqlite shares one queue between replicas
+        store=open_job_store(),
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
+    api_port = int(os.environ.get('DOWNLOADER_API_PORT') or 0)
+    if api_port:
+        try:
+            serve_in_thread(manager, api_port)
+        except OSError:
+            # Port taken; the UI still works against the in-process queue
+            pass
+    return manager
+
+@st.cache_resource
+def get_job_client():
+    """The UI is a thin client of the job API: remote if DOWNLOADER_API_URL is set, else in-process"""
+    api_url = os.environ.get('DOWNLOADER_API_URL')
+    if api_url:
+        return HttpClient(api_url, session=get_http_session())
+    return LocalClient(get_job_manager())
+
+def run_jobs(kind, params_list, progress_bar=None, status_text=None):
+    """Submit jobs and block (with live progress) until all have finished"""
+    client = get_job_client()
+    # Several items at once is bulk work; single items stay interactive and jump the queue
+    priority = 'bulk' if len(params_list) > 1 else 'interactive'
+    submitted, rejected = [], None
+    for params in params_list:
+        try:
+            submitted.append(client.submit(kind, profiler=run_profiler, client_id=st.session_state.session_id,
+                                           priority=priority, **params))
+        except Exception as e:
+            # Queue full (admission control): keep what was accepted, report the rest
+            if len(params_list) == 1:
+                raise
+            rejected = str(e)
+            break
+    if rejected:
+        st.warning(f"⏳ {rejected}. Queued {len(submitted)} of {len(params_list)}; submit the rest later.")
     
-    # Rotate user agents to avoid detection
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    jobs = watch_jobs([job['id'] for job in submitted], progress_bar, status_text)
+    skipped = [
+        {'id': None, 'kind': kind, 'status': 'failed', 'params': params, 'result': None,
+         'error': rejected, 'error_class': 'overloaded', 'progress': {}}
+        for params in params_list[len(submitted):]
     ]
-    session.headers.update({'User-Agent': random.choice(user_agents)})
-    return session
+    return jobs + skipped
 
-def get_video_info(url, max_retries=3):
-    """Get video information using yt-dlp with error handling and retries"""
-    for attempt in range(max_retries):
-        try:
-            # Add rate limiting and random delay to avoid detection
-            if attempt > 0:
-                time.sleep(random.uniform(1, 3))
+def watch_jobs(job_ids, progress_bar=None, status_text=None):
+    """Block (with live progress) until the given jobs have finished"""
+    def on_update(jobs):
+        finished = sum(1 for job in jobs if job['status'] in ('done', 'failed'))
+        if progress_bar is not None:
+            if len(jobs) == 1:
+                progress = jobs[0].get('progress') or {}
+                total = progress.get('total_bytes') or 0
+                fraction = 1.0 if finished else (progress.get('downloaded_bytes', 0) / total if total else 0.0)
+                progress_bar.progress(min(1.0, fraction))
             else:
-                # First-time request: simulate browser behavior
-                if st.session_state.request_count == 0:
-                    st.info("🌐 Establishing connection...")
-                    simulate_browser_visit()
-                
-                # Enforce rate limiting for all requests
-                enforce_rate_limit(min_interval=2.5)
-            
-            # Advanced user agent rotation with realistic versions
-            user_agents = [
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:118.0) Gecko/20100101 Firefox/118.0',
-                'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
-                'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
-            ]
-            
-            # Create session cookies for this request
-            session_cookies = create_session_cookies()
-            
-            # Configure yt-dlp with maximum anti-detection measures
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'ignoreerrors': False,
-                
-                # Core anti-detection
-                'user_agent': random.choice(user_agents),
-                'referer': 'https://www.youtube.com/',
-                
-                # Advanced HTTP headers simulation
-                'http_headers': {
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.9,es;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Cache-Control': 'max-age=0',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'same-origin',
-                    'Sec-Fetch-User': '?1',
-                    'Sec-Ch-Ua': '"Chromium";v="118", "Google Chrome";v="118", "Not=A?Brand";v="99"',
-                    'Sec-Ch-Ua-Mobile': '?0',
-                    'Sec-Ch-Ua-Platform': '"Windows"',
-                },
-                
-                # Cookie handling
-                'cookiefile': None,  # Don't save cookies to file
-                
-                # Network behavior simulation
-                'sleep_interval': random.uniform(1.0, 3.0),
-                'max_sleep_interval': 5,
-                'socket_timeout': 30,
-                
-                # Advanced extraction methods with signature bypass
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['android', 'web', 'ios', 'mweb'],
-                        'player_skip': ['configs', 'webpage'],
-                        'skip': ['hls', 'dash'],
-                        'innertube_host': 'studio.youtube.com',
-                        'innertube_key': None,
-                    }
-                },
-                
-                # Proxy simulation (without actual proxy)
-                'proxy': None,
-                'geo_bypass': True,
-                'geo_verification_proxy': None,
-                
-                # Retry configuration
-                'retries': 3,
-                'fragment_retries': 3,
-            }
-            
-            try:
-                # Try primary extraction method
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    return info, None
-                    
-            except Exception as primary_error:
-                # If primary method fails, try alternative extraction strategies
-                fallback_strategies = [
-                    # Strategy 1: Android client with TV API
-                    {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['android_creator', 'android_vr']}}},
-                    
-                    # Strategy 2: iOS client with music context
-                    {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['ios_music', 'ios_creator']}}, 
-                     'http_headers': {**ydl_opts['http_headers'], 'X-YouTube-Client-Name': '26', 'X-YouTube-Client-Version': '17.31.35'}},
-                    
-                    # Strategy 3: TV client (often bypasses restrictions)
-                    {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['tv_embedded']}},
-                     'http_headers': {'User-Agent': 'com.google.ios.youtube/17.31.4 (iPhone14,3; U; CPU iOS 15_6 like Mac OS X)', 'X-YouTube-Client-Name': '85'}},
-                     
-                    # Strategy 4: Web embedded client
-                    {**ydl_opts, 'extractor_args': {'youtube': {'player_client': ['web_embedded']}},
-                     'http_headers': {**ydl_opts['http_headers'], 'Origin': 'https://www.youtube.com', 'X-YouTube-Client-Name': '56'}},
-                     
-                    # Strategy 5: Minimal approach with no signature verification
-                    {'quiet': True, 'no_warnings': True, 'extractor_args': {'youtube': {'player_client': ['android'], 'player_skip': ['js']}}, 
-                     'user_agent': 'com.google.android.youtube/17.36.4 (Linux; U; Android 12; SM-G973F Build/SP1A.210812.016) gzip'}
-                ]
-                
-                for i, fallback_opts in enumerate(fallback_strategies):
-                    try:
-                        st.info(f"🔄 Trying alternative extraction method {i+1}/3...")
-                        time.sleep(random.uniform(2, 4))  # Wait between attempts
-                        
-                        with yt_dlp.YoutubeDL(fallback_opts) as ydl:
-                            info = ydl.extract_info(url, download=False)
-                            st.success(f"✅ Success with alternative method {i+1}!")
-                            return info, None
-                            
-                    except Exception as fallback_error:
-                        if i == len(fallback_strategies) - 1:  # Last attempt
-                            raise primary_error  # Raise original error
-                        continue
-                        
-                # This should not be reached, but just in case
-                raise primary_error
-                
-        except Exception as e:
-            error_msg = str(e).lower()
-            if "403" in error_msg or "forbidden" in error_msg:
-                if attempt < max_retries - 1:
-                    # Progressive backoff with randomization to avoid detection patterns
-                    delay = (3 + attempt * 2) + random.uniform(0.5, 2.0)
-                    st.warning(f"⚠️ Attempt {attempt + 1} failed (403 Forbidden). Retrying in {delay:.1f} seconds...")
-                    time.sleep(delay)
-                    continue
-                else:
-                    return None, "❌ **403 Forbidden Error**: YouTube's anti-bot system is blocking requests.\n\n" \
-                                "🛡️ **Advanced Protection Detected** - This happens when:\n" \
-                                "• Multiple attempts trigger rate limiting\n" \
-                                "• YouTube detects automated patterns\n" \
-                                "• Regional restrictions are in place\n\n" \
-                                "🚀 **Try these solutions:**\n" \
-                                "1. **Wait 10-15 minutes** for cooldown\n" \
-                                "2. **Try audio-only** downloads first\n" \
-                                "3. **Use different videos** to reset detection\n" \
-                                "4. **Clear browser data** and refresh\n" \
-                                "5. **Try during off-peak hours** (late night/early morning)\n\n" \
-                                "💡 **Pro tip**: Multiple failed attempts increase detection. Space out your downloads!"
-            elif "private" in error_msg or "unavailable" in error_msg:
-                return None, "❌ **Video Unavailable**: This video is private, deleted, or restricted in your region."
-            elif "age" in error_msg:
-                return None, "❌ **Age Restricted**: This video requires age verification and cannot be downloaded."
+                progress_bar.progress(finished / len(jobs))
+        if status_text is not None:
+            running = sum(1 for job in jobs if job['status'] == 'running')
+            positions = [job['position'] for job in jobs if job['status'] == 'queued' and job.get('position')]
+            if not running and positions and len(jobs) == 1:
+                status_text.text(f"Queued, position {positions[0]} (server busy, starts automatically)")
+            elif not running and positions:
+                status_text.text(f"Finished {finished}/{len(jobs)} • queued, next at position {min(positions)}")
             else:
-                if attempt < max_retries - 1:
-                    st.warning(f"⚠️ Attempt {attempt + 1} failed: {str(e)[:100]}... Retrying...")
-                    time.sleep(1 + attempt)
-                    continue
-                else:
-                    return None, f"❌ **Error**: {str(e)}"
+                status_text.text(f"Finished {finished}/{len(jobs)} • running {running}")
     
-    return None, "❌ **Max retries exceeded**: Unable to access the video after multiple attempts."
+    return wait_for(get_job_client(), job_ids, on_update)
+
+@st.cache_resource
+def get_directory_index(path):
+    """One index per download path, shared across sessions: the sharded layout's own or a directory scan"""
+    return storage.layout_for(path) or DirectoryIndex(path)
 
 def add_to_history(item_type, title, file_name, download_time):
     """Add download to history"""
-    history_item = {
-        'type': item_type,
-        'title': title,
-        'file_name': file_name,
-        'download_time': download_time
-    }
-    st.session_state.download_history.insert(0, history_item)
-    if len(st.session_state.download_history) > 50:  # Keep only last 50 downloads
-        st.session_state.download_history = st.session_state.download_history[:50]
+    get_history_store().add(item_type, title, file_name, download_time, st.session_state.session_id)
+
+def offer_file(file_path, file_name, label, mime, **button_kwargs):
+    """Save button for a finished file: a signed nginx link when offload is on, else bytes through Streamlit"""
+    url = None
+    if links.accel_prefix():
+        url = links.signed_url(file_path, get_default_download_path(), file_name)
+    if url:
+        st.link_button(label, url, **button_kwargs)
+        return
+    with open(file_path, "rb") as f:
+        st.download_button(label=label, data=f, file_name=file_name, mime=mime, **button_kwargs)
+
+def clip_inputs(key):
+    """Optional start/end fields; returns job params for a clip ({} for the whole file) or None if invalid"""
+    with st.expander("✂️ Clip (optional): download only part of it"):
+        col_start, col_end = st.columns(2)
+        with col_start:
+            start_text = st.text_input("Start", key=f"{key}_clip_start", placeholder="e.g. 1:30")
+        with col_end:
+            end_text = st.text_input("End", key=f"{key}_clip_end", placeholder="e.g. 2:00 (blank = to the end)")
+        precise = st.checkbox("Frame-accurate cut (re-encodes, slower)", key=f"{key}_clip_precise",
+                              help="Otherwise the cut snaps to the nearest keyframe, which needs no re-encoding")
+    try:
+        start, end = engine.parse_timestamp(start_text), engine.parse_timestamp(end_text)
+    except ValueError as e:
+        st.error(f"✂️ {e}")
+        return None
+    if start is None and end is None:
+        return {}
+    if end is not None and end <= (start or 0):
+        st.error("✂️ The clip end must be after its start.")
+        return None
+    return {'clip_start': start or 0, 'clip_end': end, 'clip_precise': precise}
+
+def clip_estimate(estimated_bytes, info, clip):
+    """Scale a full-download size estimate to the clip's share of the duration"""
+    duration = (info or {}).get('duration')
+    if not clip or not estimated_bytes or not duration:
+        return estimated_bytes
+    end = clip['clip_end'] if clip['clip_end'] is not None else duration
+    return int(estimated_bytes * max(0.0, min(end, duration) - clip['clip_start']) / duration)
+
+def show_clip_savings(result):
+    if result.get('bytes_saved'):
+        st.success(f"✂️ Clip saved {format_file_size(result['bytes_saved'])} compared with the full download "
+                   f"(≈ {format_file_size(result['full_size_estimate'])})")
 
 def show_mobile_download_success(file_name, file_type):
     """Show mobile-friendly download success message"""
@@ -374,17 +405,6 @@ def show_mobile_download_success(file_name, file_type):
     </div>
     """, unsafe_allow_html=True)
 
-def format_file_size(size_bytes):
-    """Convert bytes to human readable format"""
-    if size_bytes == 0:
-        return "0B"
-    size_names = ["B", "KB", "MB", "GB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
-    return f"{size_bytes:.1f} {size_names[i]}"
-
 def format_duration(seconds):
     """Convert seconds to human readable duration"""
     hours = seconds // 3600
@@ -396,115 +416,14 @@ def format_duration(seconds):
         return f"{minutes:02d}:{seconds:02d}"
 
 # --- Mobile-responsive CSS ---
-st.markdown("""
-<style>
-    /* Mobile-first responsive design */
-    .stApp {
-        max-width: 100%;
-        padding: 0.5rem;
-    }
-    
-    /* Mobile-friendly button styling */
-    .stButton > button {
-        width: 100%;
-        border-radius: 20px;
-        border: none;
-        padding: 0.75rem 1rem;
-        font-size: 16px;
-        font-weight: 600;
-        transition: all 0.3s ease;
-    }
-    
-    /* Responsive columns for mobile */
-    @media (max-width: 768px) {
-        .row-widget.stHorizontal {
-            flex-direction: column;
-        }
-        
-        .stButton > button {
-            margin-bottom: 0.5rem;
-        }
-        
-        .stSelectbox, .stTextInput {
-            margin-bottom: 1rem;
-        }
-        
-        /* Make metrics stack vertically on mobile */
-        .metric-container {
-            display: flex;
-            flex-direction: column;
-        }
-    }
-    
-    /* Improve text input for mobile */
-    .stTextInput > div > div > input {
-        font-size: 16px;
-        padding: 12px;
-        border-radius: 10px;
-    }
-    
-    /* Better textarea for mobile */
-    .stTextArea textarea {
-        font-size: 16px;
-        padding: 12px;
-        border-radius: 10px;
-        min-height: 120px;
-    }
-    
-    /* Responsive images */
-    .stImage {
-        max-width: 100%;
-        height: auto;
-    }
-    
-    /* Mobile-friendly expanders */
-    .streamlit-expanderHeader {
-        font-size: 16px;
-        padding: 12px;
-    }
-    
-    /* Better spacing for mobile */
-    .element-container {
-        margin-bottom: 1rem;
-    }
-    
-    /* Responsive sidebar */
-    .css-1d391kg {
-        padding: 1rem 0.5rem;
-    }
-    
-    /* Download button styling */
-    .download-button {
-        background: linear-gradient(45deg, #FF6B6B, #4ECDC4);
-        color: white;
-        border: none;
-        padding: 15px 25px;
-        border-radius: 25px;
-        font-size: 16px;
-        font-weight: bold;
-        cursor: pointer;
-        width: 100%;
-        margin: 10px 0;
-        transition: all 0.3s ease;
-    }
-    
-    .download-button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(assets.MOBILE_CSS, unsafe_allow_html=True)
 
 # --- Cloud Storage Warning ---
 if 'STREAMLIT_SHARING' in os.environ or 'STREAMLIT_CLOUD' in os.environ:
     st.warning("☁️ **Cloud Deployment Notice**: This app is running on Streamlit Cloud with ephemeral storage. Downloaded files are temporary and will be deleted when the app restarts. Please download files immediately after processing!")
 
 # --- App Title ---
-st.markdown("""
-<div style='text-align: center; padding: 1rem 0;'>
-    <h1 style='color: #FF4B4B; font-size: clamp(1.5rem, 5vw, 2.5rem); margin-bottom: 0.5rem;'>🎬 Advanced Downloader</h1>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(assets.APP_TITLE_HTML, unsafe_allow_html=True)
 
 # --- Theme Toggle ---
 col_theme1, col_theme2, col_theme3 = st.columns([1, 1, 4])
@@ -517,16 +436,12 @@ with col_theme1:
 st.sidebar.header("⚙️ Settings")
 
 # Mobile-friendly sidebar notice
-st.sidebar.markdown("""
-<div style='background: #f0f2f6; padding: 10px; border-radius: 8px; margin-bottom: 1rem;'>
-    <p style='margin: 0; font-size: 12px; color: #666;'>
-        📱 <strong>Mobile Tip:</strong> Swipe from left edge to access settings
-    </p>
-</div>
-""", unsafe_allow_html=True)
+st.sidebar.markdown(assets.SIDEBAR_TIP_HTML, unsafe_allow_html=True)
 
 # Get system default Downloads folder
 default_downloads = get_default_download_path()
+get_metrics_server()
+get_storage_layout()
 
 # Display current default path
 st.sidebar.info(f"📂 **Default Download Location:**\n`{default_downloads}`")
@@ -555,34 +470,18 @@ else:
 
 st.sidebar.markdown(f"**📥 Files will be saved to:**\n`{download_path}`")
 
+# --- Upstream Status (circuit breakers) ---
+for pool, hosts in breaker.snapshot().items():
+    for host, state in hosts.items():
+        if state['state'] == breaker.OPEN:
+            st.sidebar.error(f"⏸️ **{host}** is failing: {pool} requests paused for {state['retry_after']:.0f}s")
+        else:
+            st.sidebar.warning(f"🔄 **{host}**: testing whether {pool} requests work again")
+
 # --- Troubleshooting Section ---
 st.sidebar.markdown("---")
 with st.sidebar.expander("🛠️ Troubleshooting Guide", expanded=False):
-    st.markdown("""
-    **🔇 No Audio in Downloaded Video?**
-    
-    ✅ **Solution:**
-    - Choose options marked "w/ Audio"
-    - Avoid "Best Quality" unless you need max resolution
-    
-    **📋 HTTP Error 403: Forbidden**
-    
-    🔄 **Quick Fixes:**
-    - Wait 5-10 minutes before trying again
-    - Try a different video first
-    - Copy URL directly from YouTube
-    
-    📋 **Why this happens:**
-    - YouTube blocks automated downloads
-    - Too many requests from your IP
-    - Video has regional restrictions
-    
-    💡 **Mobile Tips:**
-    - Use Wi-Fi for better downloads
-    - Download one video at a time
-    - Paste URLs carefully (long-press)
-    - Files save to Downloads automatically
-    """)
+    st.markdown(assets.TROUBLESHOOTING_MD)
 
 st.sidebar.markdown("---")
 st.sidebar.info("🔥 **Pro Tip**: If downloads fail, try waiting a few minutes between attempts. YouTube actively prevents bulk downloading.")
@@ -591,17 +490,7 @@ st.sidebar.info("🔥 **Pro Tip**: If downloads fail, try waiting a few minutes
 st.info(f"📂 **Files will be saved to your Downloads folder:** `{os.path.basename(download_path)}`")
 
 # --- Mobile-specific help ---
-st.markdown("""
-<div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 1rem; border-radius: 10px; margin: 1rem 0;'>
-    <h4 style='color: white; margin: 0 0 0.5rem 0;'>📱 Mobile Users Guide</h4>
-    <div style='color: #f0f0f0; font-size: 14px;'>
-        <p style='margin: 0.3rem 0;'>✅ <strong>Paste URLs:</strong> Long-press in URL field to paste YouTube links</p>
-        <p style='margin: 0.3rem 0;'>✅ <strong>Download files:</strong> Tap download button to save to your device</p>
-        <p style='margin: 0.3rem 0;'>✅ <strong>Audio guaranteed:</strong> Choose "w/ Audio" options for video with sound</p>
-        <p style='margin: 0.3rem 0;'>✅ <strong>File location:</strong> Files save to your Downloads folder automatically</p>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(assets.MOBILE_GUIDE_HTML, unsafe_allow_html=True)
 
 # --- Toggle options ---
 st.header("📥 Choose Download Type")
@@ -628,6 +517,7 @@ if toggle_video:
     st.info("🔊 **Audio Guarantee**: Choose options marked 'w/ Audio' to ensure your video has sound! This prevents the common issue of downloading video-only files.")
 
     video_link = st.text_input("Enter YouTube video URL:", key="video_url", placeholder="https://www.youtube.com/watch?v=...")
+    prefetch_input("video_url", [video_link])
     
     # Enhanced quality and format selection with audio guarantee (mobile-responsive)
     st.markdown("### 🎯 Video Settings")
@@ -650,9 +540,11 @@ if toggle_video:
     # Audio handling option
     st.info("� **Audio Guarantee**: All 'w/ Audio' options ensure your video has sound. 'Best Quality' may require audio merging for highest resolution.")
 
+    video_clip = clip_inputs("video")
+
     download_video_btn = st.button("📥 Download Video", key="video_btn", use_container_width=True, type="primary")
 
-    if download_video_btn and video_link:
+    if download_video_btn and video_link and video_clip is not None:
         # Enhanced error handling with retries
         with st.spinner("🔍 Fetching video information... (This may take a moment)"):
             video_info, error_msg = get_video_info(video_link)
@@ -693,47 +585,14 @@ if toggle_video:
                 st.markdown("---")
                 col_thumb_center, col_empty1, col_empty2 = st.columns([2, 1, 1])
                 with col_thumb_center:
-                    thumbnail_url = video_info.get('thumbnail', '')
-                    if thumbnail_url:
-                        st.image(thumbnail_url, caption="🖼️ Video Thumbnail", use_container_width=True)
+                    show_thumbnail(video_info, "🖼️ Video Thumbnail")
 
                 # Show available formats
                 st.markdown("---")
                 st.subheader("🎥 Available Video Formats")
                 
-                # Get available formats from video info
-                formats = video_info.get('formats', [])
-                
-                # Filter and organize formats (more flexible format matching)
-                video_formats = []
-                for f in formats:
-                    if f.get('vcodec') != 'none':  # Has video
-                        height = f.get('height', 0)
-                        fps = f.get('fps', 0)
-                        filesize = f.get('filesize', 0)
-                        has_audio = f.get('acodec') != 'none'
-                        ext = f.get('ext', '')
-                        
-                        # Accept the format if it matches user preference OR is a common video format
-                        format_acceptable = (
-                            ext == video_format or  # Exact match
-                            ext in ['mp4', 'webm', 'mkv'] or  # Common video formats
-                            (video_format == 'mp4' and ext in ['m4v', 'mov']) or  # MP4-compatible
-                            (video_format == 'webm' and ext in ['webm', 'mkv'])  # WebM-compatible
-                        )
-                        
-                        if format_acceptable and height and height >= 144:  # Minimum quality filter
-                            quality_info = f"{height}p"
-                            if fps:
-                                quality_info += f" ({fps}fps)"
-                            if filesize:
-                                quality_info += f" - {format_file_size(filesize)}"
-                            quality_info += f" - {ext.upper()}"
-                            quality_info += " - " + ("With Audio" if has_audio else "Video Only")
-                            video_formats.append((height, quality_info, f, has_audio, ext))
-                
-                # Sort by quality (height) and prefer formats with audio
-                video_formats.sort(key=lambda x: (x[0], x[3]), reverse=True)
+                # Filter and organize formats (more flexible format matching), best first
+                video_formats = engine.select_video_formats(video_info, video_format)
                 
                 if video_formats:
                     available_qualities = [f"{q[0]}p ({q[4]})" for q in video_formats[:5]]  # Show top 5 with format
@@ -744,6 +603,9 @@ if toggle_video:
                         st.write(f"Total formats found: {len(video_formats)}")
                         for i, (height, info, fmt, audio, ext) in enumerate(video_formats[:3]):
                             st.write(f"{i+1}. {height}p - {ext} - {'Audio' if audio else 'No Audio'} - ID: {fmt.get('format_id', 'N/A')}")
+                elif not video_info.get('formats'):
+                    # Previews skip format resolution; the download job resolves formats itself
+                    st.info("ℹ️ Formats are resolved when the download starts.")
                 else:
                     st.warning("⚠️ No video formats found. Trying alternative approach...")
                     # Try to get any available formats
@@ -764,11 +626,11 @@ if toggle_video:
                 # This is more reliable in cloud environments
                 has_audio = "w/ Audio" in quality_option
                 
-                # Show format info if we have it
-                if video_formats:
+                # Show format info if we have it; a preview without formats goes the same way
+                if video_formats or not video_info.get('formats'):
                     # Show best available quality
-                    best_quality = video_formats[0][0] if video_formats else "Unknown"
-                    st.info(f"� Best available quality: {best_quality}p")
+                    if video_formats:
+                        st.info(f"� Best available quality: {video_formats[0][0]}p")
                 
                 # Always proceed with download for "w/ Audio" options
                 # yt-dlp will handle format selection intelligently
@@ -796,98 +658,41 @@ if toggle_video:
                             st.rerun()
                         st.stop()  # Prevent download of video-only content
 
-                    # Download with yt-dlp
+                    # Download through the job queue
                     try:
                         download_label = "🔊 Downloading video with audio..." if has_audio else "📹 Downloading video (no audio)..."
                         with st.spinner(download_label):
                             progress_bar = st.progress(0)
                             status_text = st.empty()
                             
-                            os.makedirs(download_path, exist_ok=True)
-                            
                             # Bulletproof download with multiple fallback strategies
                             audio_guaranteed = "w/ Audio" in quality_option
+                            video_type = "Video (with Audio)" if has_audio else "Video (No Audio)"
                             
-                            # Try multiple format strategies in order until one works
-                            format_strategies = []
+                            job = run_jobs("video", [{
+                                'url': video_link,
+                                'download_dir': download_path,
+                                'audio_guaranteed': audio_guaranteed,
+                                'history_type': video_type,
+                                # Lets admission control reserve disk before the job starts
+                                'estimated_bytes': clip_estimate(estimate_bytes(video_info), video_info, video_clip),
+                                **video_clip,
+                            }], progress_bar, status_text)[0]
+                            if job['status'] != 'done':
+                                raise JobFailed(job['error'] or "All download strategies failed", job.get('error_class'))
                             
-                            if audio_guaranteed:
-                                format_strategies = [
-                                    'best[acodec!=none]',  # Best with audio
-                                    'best',                # Any best format
-                                    None                   # yt-dlp default
-                                ]
+                            format_selector = job['result'].get('format')
+                            if format_selector:
+                                st.success(f"✅ Downloaded using format: {format_selector}")
                             else:
-                                format_strategies = [
-                                    'best',                # Best quality
-                                    None                   # yt-dlp default
-                                ]
-                            
-                            download_successful = False
-                            
-                            for i, format_selector in enumerate(format_strategies):
-                                try:
-                                    ydl_opts = {
-                                        'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                        'noplaylist': True,
-                                        # Anti-detection measures
-                                        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-                                        'referer': 'https://www.youtube.com/',
-                                        'headers': {
-                                            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                                            'Accept-Language': 'en-us,en;q=0.5',
-                                            'Accept-Encoding': 'gzip, deflate',
-                                            'DNT': '1',
-                                            'Connection': 'keep-alive',
-                                            'Upgrade-Insecure-Requests': '1',
-                                        }
-                                    }
-                                    
-                                    # Only add format if specified (None means use yt-dlp default)
-                                    if format_selector:
-                                        ydl_opts['format'] = format_selector
-                                    
-                                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                        ydl.download([video_link])
-                                    
-                                    download_successful = True
-                                    if format_selector:
-                                        st.success(f"✅ Downloaded using format: {format_selector}")
-                                    else:
-                                        st.success(f"✅ Downloaded using yt-dlp default format selection")
-                                    break
-                                    
-                                except Exception as e:
-                                    error_msg = str(e).lower()
-                                    if 'format' in error_msg and i < len(format_strategies) - 1:
-                                        # Try next format strategy
-                                        continue
-                                    else:
-                                        # Re-raise if it's the last strategy or not a format error
-                                        raise
-                            
-                            if not download_successful:
-                                raise Exception("All download strategies failed")
+                                st.success(f"✅ Downloaded using yt-dlp default format selection")
                                 
                             progress_bar.progress(100)
                             status_text.text("Download completed!")
                             
-                            # Find the downloaded file
-                            title = video_info.get('title', 'video')
-                            # Clean title for filename
-                            clean_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-                            file_name = f"{clean_title}.{video_format}"
-                            file_path = os.path.join(download_path, file_name)
-                            
-                            # Find actual downloaded file (yt-dlp might modify filename)
-                            actual_files = [f for f in os.listdir(download_path) if f.startswith(clean_title[:20])]
-                            if actual_files:
-                                file_name = actual_files[-1]  # Get most recent
-                                file_path = os.path.join(download_path, file_name)
-
-                        # Add to history with audio status
-                        video_type = "Video (with Audio)" if has_audio else "Video (No Audio)"
-                        add_to_history(video_type, video_info.get('title', 'Unknown'), file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                            file_path = job['result'].get('file_path') or ''
+                            file_name = job['result'].get('file_name') or f"{clean_filename(video_info.get('title', 'video'))}.{video_format}"
+                            show_clip_savings(job['result'])
 
                         # Mobile-friendly download success notification
                         show_mobile_download_success(file_name, video_type)
@@ -896,22 +701,14 @@ if toggle_video:
                         if os.path.exists(file_path):
                             download_button_label = "🔊 Save Video (with Audio)" if has_audio else "📹 Save Video (NO AUDIO)"
                             
-                            with open(file_path, "rb") as f:
-                                st.download_button(
-                                    label=download_button_label,
-                                    data=f,
-                                    file_name=file_name,
-                                    mime="video/mp4",
-                                    use_container_width=True,
-                                    type="primary"
-                                )
+                            offer_file(file_path, file_name, download_button_label, "video/mp4",
+                                       use_container_width=True, type="primary")
                         
                         if not has_audio:
                             st.warning("⚠️ Video downloaded but has NO AUDIO! 🔇")
                     
                     except Exception as download_error:
-                        error_msg = str(download_error).lower()
-                        if "403" in error_msg or "forbidden" in error_msg:
+                        if classify(download_error) in (FORBIDDEN, RATE_LIMITED):
                             st.error("❌ **Download Failed (403 Forbidden)**\n\n"
                                    "YouTube has blocked this download request. This happens when:\n"
                                    "- YouTube detects automated downloading\n"
@@ -932,42 +729,27 @@ if toggle_video:
                             progress_bar = st.progress(0)
                             status_text = st.empty()
                             
-                            os.makedirs(download_path, exist_ok=True)
-                            
                             # Final fallback - use absolute minimum requirements
-                            ydl_opts = {
-                                'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                'noplaylist': True,
-                                # No format specified - let yt-dlp use its default
-                            }
-                            
-                            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                ydl.download([video_link])
+                            job = run_jobs("video", [{
+                                'url': video_link,
+                                'download_dir': download_path,
+                                'format_strategies': [None],
+                                'minimal': True,
+                                'history_type': "Video (Auto Format)",
+                                **video_clip,
+                            }], progress_bar, status_text)[0]
+                            if job['status'] != 'done':
+                                raise JobFailed(job['error'], job.get('error_class'))
                                 
                             progress_bar.progress(100)
                             status_text.text("Download completed!")
                             
-                            # Find the downloaded file
-                            title = video_info.get('title', 'video')
-                            clean_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-                            
-                            # Find actual downloaded file
-                            actual_files = [f for f in os.listdir(download_path) if f.startswith(clean_title[:20])]
-                            if actual_files:
-                                file_name = actual_files[-1]
-                                file_path = os.path.join(download_path, file_name)
-                                
-                                # Add to history
-                                add_to_history("Video (Auto Format)", video_info.get('title', 'Unknown'), file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                            file_path = job['result'].get('file_path')
+                            if file_path and os.path.exists(file_path):
+                                file_name = job['result']['file_name']
                                 
                                 # Provide download button
-                                with open(file_path, "rb") as f:
-                                    st.download_button(
-                                        label="📥 Save Video (Auto Format)",
-                                        data=f,
-                                        file_name=file_name,
-                                        mime="video/mp4"
-                                    )
+                                offer_file(file_path, file_name, "📥 Save Video (Auto Format)", "video/mp4")
                                 st.success("✅ Video downloaded with automatic format selection!")
                             else:
                                 st.error("❌ Could not find downloaded file.")
@@ -990,6 +772,7 @@ if toggle_audio:
     )
 
     audio_link = st.text_input("Enter YouTube video URL:", key="audio_url", placeholder="Paste YouTube URL here...")
+    prefetch_input("audio_url", [audio_link])
     
     # Audio format selection with MP3 option (mobile-responsive)
     st.markdown("### 🎵 Audio Settings")
@@ -1004,9 +787,11 @@ if toggle_audio:
     if audio_format == "mp3":
         st.info("🔧 **Note**: MP3 conversion requires FFmpeg. If you don't have FFmpeg, choose M4A format instead.")
     
+    audio_clip = clip_inputs("audio")
+    
     download_audio_btn = st.button("🎵 Download Audio", key="audio_btn", use_container_width=True, type="primary")
 
-    if download_audio_btn and audio_link:
+    if download_audio_btn and audio_link and audio_clip is not None:
         # Enhanced error handling with retries
         with st.spinner("🔍 Fetching audio information... (This may take a moment)"):
             audio_info, error_msg = get_video_info(audio_link)
@@ -1036,32 +821,18 @@ if toggle_audio:
                 st.markdown("---")
                 col_thumb_center, col_empty1, col_empty2 = st.columns([2, 1, 1])
                 with col_thumb_center:
-                    thumbnail_url = audio_info.get('thumbnail', '')
-                    if thumbnail_url:
-                        st.image(thumbnail_url, caption="🎵 Audio Thumbnail", use_container_width=True)
+                    show_thumbnail(audio_info, "🎵 Audio Thumbnail")
 
                 # Enhanced audio format selection using yt-dlp
                 st.markdown("---")
                 st.subheader("🎵 Available Audio Formats")
                 
-                # Get available audio formats
-                formats = audio_info.get('formats', [])
-                audio_formats = []
-                
-                for f in formats:
-                    if f.get('acodec') != 'none' and f.get('vcodec') == 'none':  # Audio only
-                        ext = f.get('ext', '')
-                        abr = f.get('abr', 0)
-                        filesize = f.get('filesize', 0)
-                        
-                        if ext == audio_format or (not audio_formats and ext in ['m4a', 'webm', 'mp3']):
-                            audio_formats.append((abr or 0, f, ext, filesize))
-                
-                # Sort by bitrate (highest first)
-                audio_formats.sort(key=lambda x: x[0], reverse=True)
+                # Get available audio formats, highest bitrate first
+                audio_formats = engine.select_audio_formats(audio_info, audio_format)
                 
+                # Previews may not list formats; the download job resolves them either way
+                selected_audio = audio_formats[0][1] if audio_formats else {}
                 if audio_formats:
-                    selected_audio = audio_formats[0][1]  # Best quality
                     bitrate = audio_formats[0][0]
                     filesize = audio_formats[0][3]
                     
@@ -1071,87 +842,51 @@ if toggle_audio:
                     available_audio = [f"{int(abr)}kbps ({ext})" for abr, f, ext, fs in audio_formats[:3] if abr]
                     if available_audio:
                         st.info(f"📋 Available audio qualities: {', '.join(available_audio)}")
+                else:
+                    st.info("ℹ️ Audio formats are resolved when the download starts.")
 
-                    # Download with yt-dlp
-                    try:
-                        with st.spinner("Downloading audio..."):
-                            progress_bar = st.progress(0)
-                            status_text = st.empty()
-                            
-                            os.makedirs(download_path, exist_ok=True)
-                            
-                            # Configure yt-dlp for audio download with format conversion
-                            ydl_opts = {
-                                'format': 'bestaudio/best',
-                                'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                'noplaylist': True,
-                            }
-                            
-                            # Add post-processor for MP3 conversion if needed
-                            if audio_format == "mp3":
-                                ydl_opts['postprocessors'] = [{
-                                    'key': 'FFmpegExtractAudio',
-                                    'preferredcodec': 'mp3',
-                                    'preferredquality': '192',
-                                }]
-                            elif audio_format == "m4a":
-                                ydl_opts['postprocessors'] = [{
-                                    'key': 'FFmpegExtractAudio',
-                                    'preferredcodec': 'm4a',
-                                    'preferredquality': '192',
-                                }]
-                            
-                            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                ydl.download([audio_link])
-                            
-                            progress_bar.progress(100)
-                            status_text.text("Download completed!")
-                            
-                            # Find the downloaded file
-                            title = audio_info.get('title', 'audio')
-                            clean_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-                            
-                            # Find actual downloaded file
-                            actual_files = [f for f in os.listdir(download_path) if f.startswith(clean_title[:20])]
-                            if actual_files:
-                                file_name = actual_files[-1]  # Get most recent
-                                file_path = os.path.join(download_path, file_name)
-                            else:
-                                # Fallback filename
-                                file_name = f"{clean_title}.{selected_audio.get('ext', 'm4a')}"
-                                file_path = os.path.join(download_path, file_name)
-
-                        # Add to history
-                        add_to_history("Audio", audio_info.get('title', 'Unknown'), file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                # Download through the job queue
+                try:
+                    with st.spinner("Downloading audio..."):
+                        progress_bar = st.progress(0)
+                        status_text = st.empty()
+                        
+                        job = run_jobs("audio", [{
+                            'url': audio_link,
+                            'download_dir': download_path,
+                            'audio_format': audio_format,
+                            'estimated_bytes': clip_estimate(estimate_bytes(audio_info, selected_audio, kind='audio'),
+                                                             audio_info, audio_clip),
+                            **audio_clip,
+                        }], progress_bar, status_text)[0]
+                        if job['status'] != 'done':
+                            raise JobFailed(job['error'], job.get('error_class'))
+                        
+                        progress_bar.progress(100)
+                        status_text.text("Download completed!")
+                        
+                        file_path = job['result'].get('file_path') or ''
+                        file_name = job['result'].get('file_name') or f"{clean_filename(audio_info.get('title', 'audio'))}.{selected_audio.get('ext', 'm4a')}"
+                        show_clip_savings(job['result'])
 
-                        # Mobile-friendly download success notification
-                        show_mobile_download_success(file_name, "Audio")
+                    # Mobile-friendly download success notification
+                    show_mobile_download_success(file_name, "Audio")
 
-                        # Provide download button
-                        if os.path.exists(file_path):
-                            with open(file_path, "rb") as f:
-                                st.download_button(
-                                    label="🎵 Save Audio to Device",
-                                    data=f,
-                                    file_name=file_name,
-                                    mime="audio/mp4",
-                                    use_container_width=True,
-                                    type="primary"
-                                )
-                    
-                    except Exception as download_error:
-                        error_msg = str(download_error).lower()
-                        if "403" in error_msg or "forbidden" in error_msg:
-                            st.error("❌ **Download Failed (403 Forbidden)**\n\n"
-                                   "YouTube has blocked this download request. This happens when:\n"
-                                   "- YouTube detects automated downloading\n"
-                                   "- The audio has download restrictions\n"
-                                   "- Too many requests from your IP\n\n"
-                                   "**Try again later or use a different video.**")
-                        else:
-                            st.error(f"❌ Download failed: {download_error}")
-                else:
-                    st.error("No audio stream found.")
+                    # Provide download button
+                    if os.path.exists(file_path):
+                        offer_file(file_path, file_name, "🎵 Save Audio to Device", "audio/mp4",
+                                   use_container_width=True, type="primary")
+                
+                except Exception as download_error:
+                    if classify(download_error) in (FORBIDDEN, RATE_LIMITED):
+                        st.error("❌ **Download Failed (403 Forbidden)**\n\n"
+                               "YouTube has blocked this download request. This happens when:\n"
+                               "- YouTube detects automated downloading\n"
+                               "- The audio has download restrictions\n"
+                               "- Too many requests from your IP\n\n"
+                               "**Try again later or use a different video.**")
+                    else:
+                        st.error(f"❌ Download failed: {download_error}")
 
             except Exception as e:
                 st.error(f"❌ An error occurred while processing audio info: {e}")
@@ -1172,6 +907,7 @@ if toggle_batch:
             height=150,
             placeholder="https://www.youtube.com/watch?v=...\nhttps://www.youtube.com/watch?v=...\n..."
         )
+        prefetch_input("batch_urls", urls_text.splitlines())
         batch_format = st.selectbox("Download as:", ["Video", "Audio Only"], key="batch_format")
         
         if st.button("📚 Download All", key="batch_btn", use_container_width=True, type="primary"):
@@ -1182,53 +918,19 @@ if toggle_batch:
                     overall_progress = st.progress(0)
                     status_text = st.empty()
                     
-                    successful_downloads = 0
-                    failed_downloads = 0
+                    jobs = run_jobs("media", [
+                        {'url': url, 'download_dir': download_path, 'as_audio': batch_format != "Video",
+                         'source': 'batch', 'history_type': batch_format}
+                        for url in urls
+                    ], overall_progress, status_text)
                     
-                    for i, url in enumerate(urls):
-                        try:
-                            status_text.text(f"Processing {i+1}/{len(urls)}: {url}")
-                            
-                            # Configure yt-dlp options for batch download - bulletproof approach
-                            if batch_format == "Video":
-                                ydl_opts = {
-                                    'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                    'noplaylist': True,
-                                    # No format specified - let yt-dlp choose best available
-                                }
-                            else:  # Audio
-                                ydl_opts = {
-                                    'format': 'bestaudio/best',
-                                    'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                    'noplaylist': True,
-                                    'postprocessors': [{
-                                        'key': 'FFmpegExtractAudio',
-                                        'preferredcodec': 'mp3',
-                                        'preferredquality': '192',
-                                    }],
-                                }
-                            
-                            os.makedirs(download_path, exist_ok=True)
-                            
-                            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                info = ydl.extract_info(url, download=False)
-                                title = info.get('title', 'Unknown')
-                                ydl.download([url])
-                                
-                                # Find downloaded file
-                                clean_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-                                actual_files = [f for f in os.listdir(download_path) if f.startswith(clean_title[:20])]
-                                file_name = actual_files[-1] if actual_files else f"{clean_title}.mp4"
-                                
-                                add_to_history(batch_format, title, file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                                successful_downloads += 1
-                                
-                        except Exception as e:
-                            st.error(f"Failed to download {url}: {e}")
-                            failed_downloads += 1
-                        
-                        overall_progress.progress((i + 1) / len(urls))
+                    successful_downloads = sum(1 for job in jobs if job['status'] == 'done')
+                    failed_downloads = len(jobs) - successful_downloads
+                    for url, job in zip(urls, jobs):
+                        if job['status'] != 'done':
+                            st.error(f"Failed to download {url}: {job['error']}")
                     
+                    overall_progress.progress(1.0)
                     status_text.text(f"Batch download completed!")
                     st.success(f"✅ Successfully downloaded: {successful_downloads}")
                     if failed_downloads > 0:
@@ -1241,16 +943,15 @@ if toggle_batch:
             placeholder="https://www.youtube.com/playlist?list=..."
         )
         playlist_format = st.selectbox("Download as:", ["Video", "Audio Only"], key="playlist_format")
+        playlist_sync = st.checkbox(
+            "🔁 Only new videos (sync)", key="playlist_sync",
+            help="Download only the videos added since this playlist or channel was last synced in this format"
+        )
         
         if playlist_url and st.button("📋 Load Playlist Info", key="playlist_info_btn", use_container_width=True):
             try:
                 with st.spinner("Loading playlist information..."):
-                    ydl_opts = {
-                        'quiet': True,
-                        'extract_flat': True,
-                    }
-                    
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    with get_ydl_pool('flat').acquire() as ydl:
                         playlist_info = ydl.extract_info(playlist_url, download=False)
                         
                     playlist_title = playlist_info.get('title', 'Unknown Playlist')
@@ -1271,72 +972,65 @@ if toggle_batch:
             except Exception as e:
                 st.error(f"Error loading playlist: {e}")
         
-        if playlist_url and st.button("📚 Download Playlist", key="playlist_download_btn", use_container_width=True, type="primary"):
+        if playlist_url and playlist_sync and st.button("🔁 Sync Playlist", key="playlist_sync_btn", use_container_width=True, type="primary"):
             try:
-                with st.spinner("Processing playlist..."):
-                    ydl_opts = {
-                        'quiet': True,
-                        'extract_flat': True,
-                    }
+                with st.spinner("Checking for new videos..."):
+                    sync_job = run_jobs("sync", [
+                        {'url': playlist_url, 'download_dir': download_path, 'as_audio': playlist_format != "Video",
+                         'history_type': playlist_format}
+                    ])[0]
+                if sync_job['status'] != 'done':
+                    raise JobFailed(sync_job['error'], sync_job.get('error_class'))
+                summary = sync_job['result']
+                st.info(f"{summary['title']}: {summary['new']} new of {summary['checked']} checked"
+                        + (" (stopped at the last sync)" if summary['stopped_early'] else ""))
+                
+                if not summary['job_ids']:
+                    st.success("✅ Already up to date")
+                else:
+                    overall_progress = st.progress(0)
+                    status_text = st.empty()
+                    jobs = watch_jobs(summary['job_ids'], overall_progress, status_text)
                     
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        playlist_info = ydl.extract_info(playlist_url, download=False)
-                        
-                    entries = playlist_info.get('entries', [])
-                    urls = [f"https://www.youtube.com/watch?v={entry['id']}" for entry in entries if entry.get('id')]
+                    successful_downloads = sum(1 for job in jobs if job['status'] == 'done')
+                    failed_downloads = len(jobs) - successful_downloads
+                    for job in jobs:
+                        if job['status'] != 'done':
+                            st.error(f"Failed to download {job['params']['url']}: {job['error']}")
+                    
+                    overall_progress.progress(1.0)
+                    status_text.text("Playlist sync completed!")
+                    st.success(f"✅ Successfully downloaded: {successful_downloads}")
+                    if failed_downloads > 0:
+                        st.warning(f"⚠️ Failed downloads: {failed_downloads} (retried on the next sync)")
+                    
+            except Exception as e:
+                st.error(f"Error syncing playlist: {e}")
+        
+        if playlist_url and not playlist_sync and st.button("📚 Download Playlist", key="playlist_download_btn", use_container_width=True, type="primary"):
+            try:
+                with st.spinner("Processing playlist..."):
+                    with get_ydl_pool('flat').acquire() as ydl:
+                        playlist_info, urls = engine.enumerate_playlist(playlist_url, ydl)
                 
                 progress_container = st.container()
                 with progress_container:
                     overall_progress = st.progress(0)
                     status_text = st.empty()
                     
-                    successful_downloads = 0
-                    failed_downloads = 0
+                    jobs = run_jobs("media", [
+                        {'url': url, 'download_dir': download_path, 'as_audio': playlist_format != "Video",
+                         'source': 'playlist', 'history_type': playlist_format}
+                        for url in urls
+                    ], overall_progress, status_text)
                     
-                    for i, url in enumerate(urls):
-                        try:
-                            status_text.text(f"Downloading {i+1}/{len(urls)}")
-                            
-                            # Configure yt-dlp options - bulletproof approach
-                            if playlist_format == "Video":
-                                ydl_opts = {
-                                    'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                    'noplaylist': True,
-                                    # No format specified - maximum compatibility
-                                }
-                            else:  # Audio
-                                ydl_opts = {
-                                    'format': 'bestaudio/best',
-                                    'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                                    'noplaylist': True,
-                                    'postprocessors': [{
-                                        'key': 'FFmpegExtractAudio',
-                                        'preferredcodec': 'mp3',
-                                        'preferredquality': '192',
-                                    }],
-                                }
-                            
-                            os.makedirs(download_path, exist_ok=True)
-                            
-                            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                info = ydl.extract_info(url, download=False)
-                                title = info.get('title', 'Unknown')
-                                ydl.download([url])
-                                
-                                # Find downloaded file
-                                clean_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-                                actual_files = [f for f in os.listdir(download_path) if f.startswith(clean_title[:20])]
-                                file_name = actual_files[-1] if actual_files else f"{clean_title}.mp4"
-                                
-                                add_to_history(playlist_format, title, file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                                successful_downloads += 1
-                                
-                        except Exception as e:
-                            st.error(f"Failed to download {url}: {e}")
-                            failed_downloads += 1
-                        
-                        overall_progress.progress((i + 1) / len(urls))
+                    successful_downloads = sum(1 for job in jobs if job['status'] == 'done')
+                    failed_downloads = len(jobs) - successful_downloads
+                    for url, job in zip(urls, jobs):
+                        if job['status'] != 'done':
+                            st.error(f"Failed to download {url}: {job['error']}")
                     
+                    overall_progress.progress(1.0)
                     status_text.text(f"Playlist download completed!")
                     st.success(f"✅ Successfully downloaded: {successful_downloads}")
                     if failed_downloads > 0:
@@ -1404,15 +1098,16 @@ if toggle_image:
         if download_image_btn and image_link:
             try:
                 with st.spinner("Downloading image..."):
-                    response = requests.get(image_link)
-                    if response.status_code != 200:
+                    try:
+                        # Counts against the shared bandwidth budget like queued jobs do
+                        with default_governor().lease('interactive'):
+                            image_data = engine.fetch_image(image_link, get_http_session())
+                    except ValueError:
                         st.error("Failed to retrieve image. Check the URL.")
                     else:
-                        image_data = response.content
-                        
                         # Validate and process image
                         try:
-                            img = Image.open(io.BytesIO(image_data))
+                            img = engine.open_image(image_data)
                             original_size = img.size
                             st.success(f"✅ Image loaded: {original_size[0]}x{original_size[1]} pixels")
                             
@@ -1421,31 +1116,19 @@ if toggle_image:
                                 if resize_option == "Custom":
                                     new_size = (custom_width, custom_height)
                                 else:
-                                    size_map = {
-                                        "1920x1080": (1920, 1080),
-                                        "1280x720": (1280, 720),
-                                        "800x600": (800, 600)
-                                    }
-                                    new_size = size_map[resize_option]
+                                    new_size = engine.IMAGE_SIZES[resize_option]
                                 
-                                img = img.resize(new_size, Image.Resampling.LANCZOS)
+                                img = engine.resize_image(img, new_size)
                                 st.info(f"🔄 Resized to: {new_size[0]}x{new_size[1]} pixels")
                             
                             # Display image
                             st.image(img, caption="Downloaded Image", use_container_width=True)
                             
                             # Convert format if needed
-                            file_name = os.path.basename(urlparse(image_link).path) or "downloaded_image"
+                            file_name = engine.image_file_name(image_link)
                             
                             if image_format != "Original":
-                                # Convert to RGB if saving as JPEG
-                                if image_format == "JPEG" and img.mode in ("RGBA", "P"):
-                                    img = img.convert("RGB")
-                                
-                                # Save in specified format
-                                img_buffer = io.BytesIO()
-                                img.save(img_buffer, format=image_format)
-                                image_data = img_buffer.getvalue()
+                                image_data = engine.transcode_image(img, image_format)
                                 
                                 # Update file extension
                                 file_name = os.path.splitext(file_name)[0] + f".{image_format.lower()}"
@@ -1482,43 +1165,46 @@ if toggle_image:
         if youtube_link and st.button("🖼️ Download Thumbnail", key="yt_thumb_btn", use_container_width=True, type="primary"):
             try:
                 with st.spinner("Fetching thumbnail..."):
-                    # Get video info using yt-dlp
-                    ydl_opts = {
-                        'quiet': True,
-                        'no_warnings': True,
-                    }
+                    # Parse the ID straight from the URL; only odd links need a full extraction
+                    video_id = extract_video_id(youtube_link)
+                    if video_id:
+                        # Title from an already-warm metadata cache or oEmbed, never an extraction;
+                        # the ID names the file when neither has it
+                        info = get_prefetcher().get(youtube_link, timeout=0)
+                        title = (info or {}).get('title') or get_thumbnail_service().title(video_id) or video_id
+                    else:
+                        with get_ydl_pool('info').acquire() as ydl:
+                            info = ydl.extract_info(youtube_link, download=False)
+                            
+                        video_id = info.get('id', '')
+                        title = info.get('title', 'Unknown Video')
                     
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(youtube_link, download=False)
-                        
-                    video_id = info.get('id', '')
-                    title = info.get('title', 'Unknown Video')
+                    # Try the chosen quality first, then fall back to lower ones
+                    with timed("thumbnail.fetch"):
+                        image_data, served_quality = get_thumbnail_service().fetch(video_id, thumb_quality)
+                
+                if image_data:
+                    img = engine.open_image(image_data)
                     
-                    # Try different thumbnail qualities
-                    thumbnail_url = f"https://img.youtube.com/vi/{video_id}/{thumb_quality}.jpg"
+                    if served_quality != thumb_quality:
+                        st.info(f"ℹ️ {thumb_quality} not available, using {served_quality}")
+                    st.image(img, caption=f"Thumbnail: {title}", use_container_width=True)
                     
-                    response = requests.get(thumbnail_url)
-                    if response.status_code == 200:
-                        image_data = response.content
-                        img = Image.open(io.BytesIO(image_data))
-                        
-                        st.image(img, caption=f"Thumbnail: {title}", use_container_width=True)
-                        
-                        file_name = f"{title}_{thumb_quality}.jpg"
-                        # Clean filename
-                        file_name = re.sub(r'[<>:"/\\|?*]', '_', file_name)
-                        
-                        add_to_history("Thumbnail", title, file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                        
-                        st.download_button(
-                            label="📥 Save Thumbnail",
-                            data=image_data,
-                            file_name=file_name,
-                            mime="image/jpeg"
-                        )
-                        st.success("✅ Thumbnail ready!")
-                    else:
-                        st.error("Failed to fetch thumbnail.")
+                    file_name = f"{title}_{served_quality}.jpg"
+                    # Clean filename
+                    file_name = clean_filename(file_name)
+                    
+                    add_to_history("Thumbnail", title, file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                    
+                    st.download_button(
+                        label="📥 Save Thumbnail",
+                        data=image_data,
+                        file_name=file_name,
+                        mime="image/jpeg"
+                    )
+                    st.success("✅ Thumbnail ready!")
+                else:
+                    st.error("Failed to fetch thumbnail.")
                         
             except Exception as e:
                 st.error(f"❌ An error occurred: {e}")
@@ -1540,46 +1226,18 @@ if toggle_image:
                     overall_progress = st.progress(0)
                     status_text = st.empty()
                     
-                    successful_downloads = 0
-                    failed_downloads = 0
+                    jobs = run_jobs("image", [
+                        {'url': url, 'download_dir': download_path, 'image_format': batch_img_format}
+                        for url in urls
+                    ], overall_progress, status_text)
                     
-                    for i, url in enumerate(urls):
-                        try:
-                            status_text.text(f"Downloading image {i+1}/{len(urls)}")
-                            response = requests.get(url)
-                            
-                            if response.status_code == 200:
-                                image_data = response.content
-                                img = Image.open(io.BytesIO(image_data))
-                                
-                                file_name = os.path.basename(urlparse(url).path) or f"image_{i+1}.jpg"
-                                
-                                if batch_img_format != "Keep Original":
-                                    if batch_img_format == "JPEG" and img.mode in ("RGBA", "P"):
-                                        img = img.convert("RGB")
-                                    
-                                    img_buffer = io.BytesIO()
-                                    img.save(img_buffer, format=batch_img_format)
-                                    image_data = img_buffer.getvalue()
-                                    file_name = os.path.splitext(file_name)[0] + f".{batch_img_format.lower()}"
-                                
-                                # Save locally
-                                os.makedirs(download_path, exist_ok=True)
-                                local_path = os.path.join(download_path, file_name)
-                                with open(local_path, 'wb') as f:
-                                    f.write(image_data)
-                                
-                                add_to_history("Image", file_name, file_name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                                successful_downloads += 1
-                            else:
-                                failed_downloads += 1
-                                
-                        except Exception as e:
-                            st.error(f"Failed to download {url}: {e}")
-                            failed_downloads += 1
-                        
-                        overall_progress.progress((i + 1) / len(urls))
+                    successful_downloads = sum(1 for job in jobs if job['status'] == 'done')
+                    failed_downloads = len(jobs) - successful_downloads
+                    for url, job in zip(urls, jobs):
+                        if job['status'] != 'done':
+                            st.error(f"Failed to download {url}: {job['error']}")
                     
+                    overall_progress.progress(1.0)
                     status_text.text(f"Batch image download completed!")
                     st.success(f"✅ Successfully downloaded: {successful_downloads} images")
                     if failed_downloads > 0:
@@ -1587,18 +1245,38 @@ if toggle_image:
 
 # --- DOWNLOAD HISTORY ---
 if st.sidebar.button("📜 View Download History", use_container_width=True):
+    # Keep the page open across reruns so paging and filters work
+    st.session_state.show_history = not st.session_state.get('show_history', False)
+
+if st.session_state.get('show_history'):
     st.header("📜 Download History")
+    history_store = get_history_store()
+    
+    col_filter1, col_filter2 = st.columns(2)
+    with col_filter1:
+        history_type = st.selectbox("Type:", ["All"] + history_store.types(), key="history_type")
+    with col_filter2:
+        history_search = st.text_input("🔍 Search title or file:", key="history_search")
+    
+    type_filter = None if history_type == "All" else history_type
+    total_items = history_store.count(type_filter, history_search)
     
-    if st.session_state.download_history:
-        for i, item in enumerate(st.session_state.download_history):
+    if total_items:
+        per_page = 20
+        total_pages = (total_items + per_page - 1) // per_page
+        page_number = st.number_input(f"Page (of {total_pages}):", min_value=1, max_value=total_pages, value=1, key="history_page")
+        st.caption(f"{total_items} downloads")
+        
+        for item in history_store.page(page_number - 1, per_page, type_filter, history_search):
             with st.expander(f"{item['type']} - {item['title'][:50]}{'...' if len(item['title']) > 50 else ''}"):
                 st.write(f"**Type:** {item['type']}")
                 st.write(f"**Title:** {item['title']}")
                 st.write(f"**File:** {item['file_name']}")
                 st.write(f"**Downloaded:** {item['download_time']}")
         
-        if st.button("🗑️ Clear History", use_container_width=True):
-            st.session_state.download_history = []
+        if st.button("🗑️ Clear My History", use_container_width=True,
+                     help="Removes the downloads made in this session; other users' history is kept"):
+            history_store.clear(st.session_state.session_id)
             st.success("History cleared!")
             st.rerun()
     else:
@@ -1606,6 +1284,10 @@ if st.sidebar.button("📜 View Download History", use_container_width=True):
 
 # --- FILE MANAGER ---
 if st.sidebar.button("📁 View Downloaded Files", use_container_width=True):
+    # Keep the page open across reruns so paging and search work
+    st.session_state.show_files = not st.session_state.get('show_files', False)
+
+if st.session_state.get('show_files'):
     st.header("📁 Downloaded Files")
     
     # Show current download location
@@ -1638,48 +1320,62 @@ if st.sidebar.button("📁 View Downloaded Files", use_container_width=True):
     
     # File listing
     if os.path.exists(download_path):
-        files = [f for f in os.listdir(download_path) if os.path.isfile(os.path.join(download_path, f))]
-        if files:
-            st.subheader(f"📄 Files ({len(files)} total)")
+        file_index = get_directory_index(download_path)
+        # Totals, search, paging and rendering the page: the whole listing is timed
+        with timed("file_manager.listing"):
+            total_files, total_bytes = file_index.totals()
+            if total_files:
+                st.subheader(f"📄 Files ({total_files} total, {format_file_size(total_bytes)})")
+            
+                col_search, col_page = st.columns([2, 1])
+                with col_search:
+                    file_search = st.text_input("🔍 Search files:", key="file_search")
+                per_page = 25
+                _, matching = file_index.query(file_search, 0, 1)
+                total_pages = max(1, (matching + per_page - 1) // per_page)
+                with col_page:
+                    file_page = st.number_input(f"Page (of {total_pages}):", min_value=1, max_value=total_pages, value=1, key="file_page")
             
-            # Sort files by modification time (newest first)
-            files.sort(key=lambda x: os.path.getmtime(os.path.join(download_path, x)), reverse=True)
+                # Newest first, one page at a time, straight from the cached index
+                page_entries, _ = file_index.query(file_search, file_page - 1, per_page)
+                if not page_entries:
+                    st.info("🔍 No files match your search.")
             
-            # Mobile-responsive file listing
-            for file in files:
-                file_path = os.path.join(download_path, file)
-                file_size = os.path.getsize(file_path)
-                file_modified = datetime.fromtimestamp(os.path.getmtime(file_path))
+                # Mobile-responsive file listing
+                for entry in page_entries:
+                    file = entry.name
+                    file_size = entry.size
+                    file_modified = datetime.fromtimestamp(entry.mtime)
                 
-                # File type icon
-                file_ext = os.path.splitext(file)[1].lower()
-                if file_ext in ['.mp4', '.webm', '.avi', '.mov']:
-                    icon = "🎥"
-                elif file_ext in ['.mp3', '.wav', '.m4a']:
-                    icon = "🎵"
-                elif file_ext in ['.jpg', '.jpeg', '.png', '.webp', '.gif']:
-                    icon = "🖼️"
-                else:
-                    icon = "📄"
+                    # File type icon
+                    file_ext = os.path.splitext(file)[1].lower()
+                    if file_ext in ['.mp4', '.webm', '.avi', '.mov']:
+                        icon = "🎥"
+                    elif file_ext in ['.mp3', '.wav', '.m4a']:
+                        icon = "🎵"
+                    elif file_ext in ['.jpg', '.jpeg', '.png', '.webp', '.gif']:
+                        icon = "🖼️"
+                    else:
+                        icon = "📄"
                 
-                # Mobile-friendly file display with expander
-                with st.expander(f"{icon} {file[:30]}{'...' if len(file) > 30 else ''}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**📁 File:** {file}")
-                        st.write(f"**📊 Size:** {format_file_size(file_size)}")
-                    with col2:
-                        st.write(f"**📅 Modified:** {file_modified.strftime('%m/%d %H:%M')}")
-                        # Delete button for individual files
-                        if st.button(f"🗑️ Delete {file[:20]}{'...' if len(file) > 20 else ''}", key=f"delete_{file}", help=f"Delete {file}", use_container_width=True):
-                            try:
-                                os.remove(file_path)
-                                st.success(f"🗑️ Deleted {file}")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"❌ Could not delete {file}: {e}")
-        else:
-            st.info("📂 No files in download folder yet!")
+                    # Mobile-friendly file display with expander
+                    with st.expander(f"{icon} {file[:30]}{'...' if len(file) > 30 else ''}"):
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.write(f"**📁 File:** {file}")
+                            st.write(f"**📊 Size:** {format_file_size(file_size)}")
+                        with col2:
+                            st.write(f"**📅 Modified:** {file_modified.strftime('%m/%d %H:%M')}")
+                            # Delete button for individual files
+                            if st.button(f"🗑️ Delete {file[:20]}{'...' if len(file) > 20 else ''}", key=f"delete_{file}", help=f"Delete {file}", use_container_width=True):
+                                try:
+                                    file_index.remove(file)
+                                    st.success(f"🗑️ Deleted {file}")
+                                    st.rerun()
+                                except Exception as e:
+                                    st.error(f"❌ Could not delete {file}: {e}")
+            else:
+                st.info("📂 No files in download folder yet!")
     else:
         st.info("📂 Download folder doesn't exist yet!")
 
@@ -1687,19 +1383,16 @@ if st.sidebar.button("📁 View Downloaded Files", use_container_width=True):
 if st.sidebar.button("📊 Statistics", use_container_width=True):
     st.header("📊 Download Statistics")
     
-    if st.session_state.download_history:
-        total_downloads = len(st.session_state.download_history)
-        
-        # Count by type
-        type_counts = {}
-        for item in st.session_state.download_history:
-            type_counts[item['type']] = type_counts.get(item['type'], 0) + 1
+    # Aggregated in SQLite; cost does not grow with rendered rows
+    type_counts = get_history_store().type_counts()
+    if type_counts:
+        total_downloads = sum(type_counts.values())
         
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Total Downloads", total_downloads)
         with col2:
-            most_common_type = max(type_counts, key=type_counts.get) if type_counts else "None"
+            most_common_type = next(iter(type_counts))
             st.metric("Most Downloaded Type", most_common_type)
         
         st.subheader("Download Types")
@@ -1710,17 +1403,32 @@ if st.sidebar.button("📊 Statistics", use_container_width=True):
 
 # --- Mobile-Responsive Footer ---
 st.markdown("---")
-st.markdown(
-    """
-    <div style='text-align: center; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 15px; margin: 20px 0;'>
-        <h4 style='color: white; margin-bottom: 10px;'>🎬 Advanced Downloader v3.1</h4>
-        <p style='color: #f0f0f0; margin: 5px 0;'>Made with ❤️ by <a href="https://github.com/Mohitkumar2007" style='color: #FFD700;'>Mohit Kumar A</a></p>
-        <p style='font-size: clamp(10px, 2.5vw, 12px); color: #e0e0e0; margin: 10px 0;'>📱 Mobile Optimized • 🔊 Audio Guaranteed • 📁 Downloads Folder • ✨ Smart Quality Selection</p>
-        <div style='margin-top: 15px; padding: 10px; background: rgba(255,255,255,0.1); border-radius: 10px;'>
-            <p style='color: #FFD700; font-size: clamp(10px, 2.5vw, 12px); margin: 0;'>🚀 <strong>Pro Tip for Mobile Users:</strong></p>
-            <p style='color: #f0f0f0; font-size: clamp(8px, 2vw, 10px); margin: 5px 0 0 0;'>Tap and hold download links to save directly to your device!</p>
-        </div>
-    </div>
-    """,
-    unsafe_allow_html=True
-)
\ No newline at end of file
+st.markdown(assets.FOOTER_HTML, unsafe_allow_html=True)
+
+# --- Debug: per-run timing panel ---
+with st.sidebar.expander("⏱️ Debug: Run Timing", expanded=False):
+    st.checkbox("Enable timing", key="profile_enabled", help="Time extraction, downloads, image work and file listing on each run")
+    st.checkbox("Export runs as JSON lines", key="profile_export")
+    if run_profiler:
+        st.caption(f"Script run: {run_profiler.elapsed() * 1000:.0f} ms")
+        timing_rows = run_profiler.summary()
+        if timing_rows:
+            st.table([
+                {
+                    "Section": row["section"],
+                    "Calls": row["calls"],
+                    "Total (ms)": f"{row['total_s'] * 1000:.0f}",
+                    "Max (ms)": f"{row['max_s'] * 1000:.0f}",
+                    "Errors": row["errors"],
+                }
+                for row in timing_rows
+            ])
+        else:
+            st.caption("No instrumented sections ran.")
+        if st.session_state.get('profile_export'):
+            export_path = os.environ.get('DOWNLOADER_PROFILE_EXPORT') or os.path.join(default_data_dir(), 'profile.jsonl')
+            try:
+                run_profiler.export(export_path)
+                st.caption(f"Appended to `{export_path}`")
+            except OSError as e:
+                st.caption(f"Export failed: {e}")
@@ -0,0 +1,53 @@
+"""Circuit breaker states (downloader.breaker)"""
+import time
+
+from downloader.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def tripped(cooldown=0.05):
+    breaker = CircuitBreaker(min_requests=2, failure_ratio=0.5, cooldown=cooldown, max_cooldown=0.15)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(failed=True)
+    return breaker
+
+
+def test_opens_on_the_failure_ratio():
+    breaker = CircuitBreaker(min_requests=4, failure_ratio=0.5, cooldown=60)
+    for failed in (False, False, True):
+        breaker.record(failed)
+    assert breaker.state == CLOSED
+    breaker.record(True)
+    assert breaker.state == OPEN
+    assert breaker.blocked()
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 60
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert not breaker.blocked()  # checking does not use up the probe
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert breaker.blocked()
+    assert not breaker.allow()
+    breaker.record(failed=False)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_doubles_the_cooldown_up_to_the_cap():
+    breaker = tripped()
+    for expected in (0.1, 0.15):
+        time.sleep(breaker.cooldown + 0.01)
+        assert breaker.allow()
+        breaker.record(failed=True)
+        assert breaker.state == OPEN
+        assert breaker.cooldown == expected
+
+
+def test_calls_started_before_opening_are_ignored():
+    breaker = tripped(cooldown=60)
+    breaker.record(failed=False)
+    assert breaker.state == OPEN
@@ -0,0 +1,46 @@
+"""AIMD concurrency limits per upstream host (downloader.concurrency)"""
+import requests
+
+from downloader.concurrency import AIMDLimiter
+
+
+def run(limiter, n, error=None):
+    tickets = [limiter.acquire() for _ in range(n)]
+    for ticket in tickets:
+        limiter.release(ticket, error)
+
+
+def test_overload_halves_the_limit_once_per_cut():
+    limiter = AIMDLimiter(8, maximum=8)
+    tickets = [limiter.acquire() for _ in range(4)]
+    limiter.release(tickets[0], requests.exceptions.ConnectionError("timed out"))
+    assert limiter.limit == 4
+    assert limiter.last_change == ("down", "overload")
+    # Requests already in flight when the limit was cut do not cut it again
+    limiter.release(tickets[1], requests.exceptions.ConnectionError("timed out"))
+    assert limiter.limit == 4
+    for ticket in tickets[2:]:
+        limiter.release(ticket)
+    assert limiter.inflight == 0
+
+
+def test_permanent_errors_do_not_cut_the_limit():
+    limiter = AIMDLimiter(4, maximum=8)
+    run(limiter, 1, ValueError("Video unavailable"))
+    assert limiter.limit == 4
+
+
+def test_saturated_windows_with_more_throughput_raise_the_limit():
+    limiter = AIMDLimiter(2, maximum=3, min_window=0)
+    run(limiter, 2)
+    assert limiter.limit == 3
+    assert limiter.last_change == ("up", "throughput")
+    for _ in range(5):
+        run(limiter, 3)
+    assert limiter.limit == 3  # never above maximum
+
+
+def test_limit_stays_within_minimum():
+    limiter = AIMDLimiter(1, minimum=1, maximum=4)
+    run(limiter, 1, requests.exceptions.Timeout("timed out"))
+    assert limiter.limit == 1
@@ -0,0 +1,53 @@
+"""Error classes and the per-job retry budget (downloader.errors)"""
+from downloader.errors import (
+    AGE_RESTRICTED, FORBIDDEN, NETWORK, OTHER, RATE_LIMITED, SERVER, UNAVAILABLE, RetryBudget, classify,
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP Error {status}")
+        self.status = status
+
+
+def test_classify_by_status_type_and_message():
+    assert classify(HTTPError(429)) == RATE_LIMITED
+    assert classify(HTTPError(503)) == SERVER
+    assert classify(HTTPError(403)) == FORBIDDEN
+    assert classify(TimeoutError()) == NETWORK
+    assert classify("ERROR: Private video. Sign in if you've been granted access") == UNAVAILABLE
+    assert classify("Sign in to confirm your age") == AGE_RESTRICTED
+    assert classify("something odd") == OTHER
+
+
+def test_wrapped_errors_are_classified_by_their_cause():
+    try:
+        try:
+            raise HTTPError(500)
+        except HTTPError as cause:
+            raise RuntimeError("download failed") from cause
+    except RuntimeError as error:
+        assert classify(error) == SERVER
+
+
+def test_permanent_errors_are_not_retried():
+    budget = RetryBudget(retries=3)
+    assert budget.next_delay("Video unavailable") is None
+    assert budget.remaining == 3
+
+
+def test_budget_is_shared_across_classes():
+    budget = RetryBudget(retries=3)
+    assert budget.next_delay("format not available") == 0.0
+    assert budget.next_delay(HTTPError(503)) > 0
+    assert budget.next_delay(TimeoutError()) > 0
+    assert budget.remaining == 0
+    assert budget.next_delay(TimeoutError()) is None
+
+
+def test_each_class_has_its_own_cap():
+    budget = RetryBudget(retries=10)
+    assert budget.next_delay(HTTPError(429)) is not None
+    assert budget.next_delay(HTTPError(429)) is not None
+    assert budget.next_delay(HTTPError(429)) is None
+    assert budget.remaining == 8
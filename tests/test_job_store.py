@@ -0,0 +1,171 @@
+"""Claim order, leases and release delays of the job stores (downloader.job_store)"""
+import sqlite3
+import time
+
+import pytest
+
+from downloader.job_store import DONE, FAILED, QUEUED, RUNNING, Job, MemoryJobStore, SqliteJobStore
+from downloader.scheduler import BULK, INTERACTIVE
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def add(store, client="a", priority=BULK, created_at=None, **params):
+    job = Job("media", dict(params, url="https://example.com/v", client_id=client, priority=priority),
+              created_at=created_at)
+    store.add(job)
+    return job
+
+
+def claim(store, owner="w1", lease_seconds=60, allow_bulk=True):
+    return store.claim(owner, lease_seconds, timeout=0, allow_bulk=allow_bulk)
+
+
+def test_each_client_runs_fifo(store):
+    first = add(store, created_at=100.0)
+    second = add(store, created_at=101.0)
+    third = add(store, created_at=102.0)
+    assert [claim(store).id for _ in range(3)] == [first.id, second.id, third.id]
+    assert claim(store) is None
+
+
+def test_interactive_before_bulk(store):
+    bulk = add(store, client="a", priority=BULK, created_at=100.0)
+    interactive = add(store, client="b", priority=INTERACTIVE, created_at=200.0)
+    assert claim(store).id == interactive.id
+    assert claim(store).id == bulk.id
+
+
+def test_bulk_held_back_when_not_allowed(store):
+    add(store, priority=BULK)
+    assert claim(store, allow_bulk=False) is None
+    interactive = add(store, client="b", priority=INTERACTIVE)
+    assert claim(store, allow_bulk=False).id == interactive.id
+
+
+def test_fair_share_between_clients(store):
+    a1 = add(store, client="a", created_at=100.0)
+    add(store, client="a", created_at=101.0)
+    b1 = add(store, client="b", created_at=102.0)
+    # a has a job running, so b's head goes next even though a's second job is older
+    assert claim(store).id == a1.id
+    assert claim(store).id == b1.id
+
+
+def test_release_does_not_count_an_attempt(store):
+    job = add(store)
+    claimed = claim(store)
+    store.release(claimed)
+    again = claim(store)
+    assert again.id == job.id
+    assert again.attempts == 1
+
+
+def test_release_delay_skips_the_job_until_it_ends(store):
+    blocked = add(store, client="a", created_at=100.0)
+    later = add(store, client="a", created_at=101.0)
+    store.release(claim(store), delay=0.3)
+    # The client's next job becomes its head while the first one waits
+    assert claim(store).id == later.id
+    assert claim(store) is None
+    time.sleep(0.35)
+    assert claim(store).id == blocked.id
+
+
+def test_release_without_delay_is_claimable_at_once(store):
+    job = add(store)
+    store.release(claim(store), delay=0.3)
+    time.sleep(0.35)
+    store.release(claim(store))
+    assert claim(store).id == job.id
+
+
+def test_position_counts_interactive_then_older_jobs(store):
+    add(store, client="a", priority=BULK, created_at=100.0)
+    bulk = add(store, client="b", priority=BULK, created_at=101.0)
+    add(store, client="c", priority=INTERACTIVE, created_at=102.0)
+    assert store.position(bulk) == 3
+
+
+# --- Leases (shared SQLite store only) ---
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return SqliteJobStore(str(tmp_path / "jobs.sqlite3"), max_attempts=2)
+
+
+def test_expired_lease_is_taken_over(sqlite_store):
+    job = add(sqlite_store)
+    lost = claim(sqlite_store, owner="w1", lease_seconds=0.05)
+    time.sleep(0.1)
+    taken = claim(sqlite_store, owner="w2")
+    assert taken.id == job.id
+    assert taken.owner == "w2"
+    assert taken.attempts == 2
+
+    # The first worker no longer owns the job: its writes are ignored
+    sqlite_store.renew("w1", [job.id], 60)
+    lost.progress = {"downloaded_bytes": 1}
+    sqlite_store.save_progress(lost)
+    lost.status, lost.finished_at = DONE, time.time()
+    assert sqlite_store.finish(lost) is False
+    assert sqlite_store.get(job.id).status == RUNNING
+    assert sqlite_store.get(job.id).progress == {}
+
+    taken.status, taken.finished_at = DONE, time.time()
+    assert sqlite_store.finish(taken) is True
+    assert sqlite_store.get(job.id).status == DONE
+
+
+def test_renewed_lease_is_kept(sqlite_store):
+    add(sqlite_store)
+    claim(sqlite_store, owner="w1", lease_seconds=0.2)
+    for _ in range(3):
+        time.sleep(0.1)
+        sqlite_store.renew("w1", [j.id for j in sqlite_store.list()], 0.2)
+    assert claim(sqlite_store, owner="w2") is None
+
+
+def test_job_fails_after_max_attempts_of_lost_workers(sqlite_store):
+    job = add(sqlite_store)
+    claim(sqlite_store, owner="w1", lease_seconds=0.05)
+    time.sleep(0.1)
+    claim(sqlite_store, owner="w2", lease_seconds=0.05)
+    time.sleep(0.1)
+    assert claim(sqlite_store, owner="w3") is None
+    failed = sqlite_store.get(job.id)
+    assert failed.status == FAILED
+    assert failed.error == "worker lost while running the job"
+
+
+def test_migrates_a_table_from_before_priorities(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE jobs (
+            id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL,
+            created_at REAL NOT NULL, started_at REAL, finished_at REAL, result TEXT, error TEXT,
+            error_class TEXT, progress TEXT, owner TEXT, lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    conn.execute("INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                 ("old", "video", '{"url": "https://example.com/v"}', QUEUED, 100.0))
+    conn.commit()
+    conn.close()
+
+    store = SqliteJobStore(path)
+    columns = {row[1] for row in store._conn.execute("PRAGMA table_info(jobs)")}
+    assert {"priority", "client_id", "not_before"} <= columns
+    # Rows queued before the upgrade are still claimed, as interactive work of the anonymous client
+    claimed = claim(store)
+    assert claimed.id == "old"
+    store.release(claimed, delay=60)
+    assert claim(store) is None
+    # Opening an upgraded table again is a no-op
+    SqliteJobStore(path)
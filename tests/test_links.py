@@ -0,0 +1,48 @@
+"""Signed download links and nginx offload headers (downloader.links)"""
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pytest
+
+from downloader import links
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv("DOWNLOADER_LINK_SECRET", "test-secret")
+    monkeypatch.setattr(links, "_secret", None)
+
+
+def parse(url):
+    parts = urlsplit(url)
+    query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    return unquote(parts.path[len("/files/"):]), query
+
+
+def test_signed_url_verifies(tmp_path):
+    path = tmp_path / "3f" / "My Video [abc].mp4"
+    rel_path, query = parse(links.signed_url(str(path), str(tmp_path), file_name="My Video.mp4"))
+    assert rel_path == "3f/My Video [abc].mp4"
+    assert links.verify(rel_path, query["expires"], query["sig"], query["name"])
+
+
+def test_tampered_or_expired_links_fail(tmp_path):
+    rel_path, query = parse(links.signed_url(str(tmp_path / "a.mp4"), str(tmp_path), file_name="a.mp4"))
+    assert not links.verify("b.mp4", query["expires"], query["sig"], query["name"])
+    assert not links.verify(rel_path, query["expires"], query["sig"], "other.mp4")
+    assert not links.verify(rel_path, int(query["expires"]) + 1, query["sig"], query["name"])
+    assert not links.verify(rel_path, "soon", query["sig"], query["name"])
+    expired = links.signed_url(str(tmp_path / "a.mp4"), str(tmp_path), ttl=-1)
+    rel_path, query = parse(expired)
+    assert not links.verify(rel_path, query["expires"], query["sig"])
+
+
+def test_paths_outside_the_root_are_not_signed(tmp_path):
+    assert links.signed_url(str(tmp_path / ".." / "etc" / "passwd"), str(tmp_path)) is None
+    assert links.signed_url(str(tmp_path), str(tmp_path)) is None
+
+
+def test_accel_headers(monkeypatch):
+    monkeypatch.setenv("DOWNLOADER_ACCEL_REDIRECT", "_protected_downloads")
+    headers = links.accel_headers("3f/a b.mp4", "Vidéo.mp4")
+    assert headers["X-Accel-Redirect"] == "/_protected_downloads/3f/a%20b.mp4"
+    assert headers["Content-Disposition"] == "attachment; filename*=UTF-8''Vid%C3%A9o.mp4"
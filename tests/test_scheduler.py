@@ -0,0 +1,36 @@
+"""Priority classes and fair share (downloader.scheduler)"""
+from downloader.scheduler import BULK, INTERACTIVE, FairShareScheduler, job_priority, parse_weights
+
+
+def test_job_priority():
+    assert job_priority("media", {}) == BULK
+    assert job_priority("video", {}) == INTERACTIVE
+    assert job_priority("video", {"priority": BULK}) == BULK
+    assert job_priority("media", {"priority": "urgent"}) == BULK
+
+
+def test_parse_weights_ignores_bad_items():
+    assert parse_weights("cli=0.5, api=2,broken,x=y") == {"cli": 0.5, "api": 2.0}
+    assert parse_weights(None) == {}
+
+
+def test_interactive_first_and_bulk_gate():
+    scheduler = FairShareScheduler(weights={})
+    heads = [("b1", BULK, "a", 1.0), ("i1", INTERACTIVE, "b", 2.0)]
+    assert scheduler.pick(heads, {}, {}) == "i1"
+    assert scheduler.pick(heads[:1], {}, {}, allow_bulk=False) is None
+
+
+def test_fewest_running_then_least_recently_started():
+    scheduler = FairShareScheduler(weights={})
+    heads = [("a1", BULK, "a", 1.0), ("b1", BULK, "b", 2.0)]
+    assert scheduler.pick(heads, {"a": 1}, {}) == "b1"
+    assert scheduler.pick(heads, {}, {"a": 10.0, "b": 20.0}) == "a1"
+    assert scheduler.pick(heads, {}, {}) == "a1"  # then the oldest head
+
+
+def test_weights_scale_the_share():
+    scheduler = FairShareScheduler(weights={"api": 2.0})
+    heads = [("a1", BULK, "api", 1.0), ("c1", BULK, "cli", 2.0)]
+    # api runs 1 job at weight 2 (0.5 per unit), cli 1 job at weight 1
+    assert scheduler.pick(heads, {"api": 1, "cli": 1}, {}) == "a1"
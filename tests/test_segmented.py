@@ -0,0 +1,95 @@
+"""Range planning, cancellation and fallback reporting of segmented downloads (downloader.segmented)"""
+import time
+
+import pytest
+
+from downloader import segmented
+
+BODY = bytes(range(256)) * 64  # 16 KiB
+SMALL = 1024
+
+
+class Response:
+    def __init__(self, status_code, body, headers=None, delay=0.0):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self._delay = delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        for i in range(0, len(self._body), size):
+            time.sleep(self._delay)
+            yield self._body[i:i + size]
+
+
+class Session:
+    """Serves BODY; ranges starting at a byte in fail_at raise, those in plain_at answer 200"""
+
+    def __init__(self, fail_at=(), plain_at=(), delay=0.0):
+        self.fail_at, self.plain_at, self.delay = set(fail_at), set(plain_at), delay
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        if not headers or "Range" not in headers:
+            return Response(200, BODY)
+        start, end = (int(n) for n in headers["Range"][len("bytes="):].split("-"))
+        if start in self.fail_at:
+            raise ConnectionError(f"reset at {start}")
+        if start in self.plain_at:
+            return Response(200, BODY)
+        content_range = f"bytes {start}-{end}/{len(BODY)}"
+        return Response(206, BODY[start:end + 1], {"Content-Range": content_range}, delay=self.delay)
+
+
+PLAN = segmented.plan_segments(len(BODY), segments=4, min_segment=SMALL)
+
+
+@pytest.fixture
+def planned(monkeypatch):
+    monkeypatch.setattr(segmented, "CHUNK_SIZE", 256)
+    monkeypatch.setattr(segmented, "plan_segments", lambda length, segments: PLAN)
+
+
+def download(session, hooks=()):
+    return segmented.download_bytes(session, "https://cdn.example.com/f", segments=4, progress_hooks=hooks,
+                                    probed=(len(BODY), True))
+
+
+def test_plan_segments_covers_the_length():
+    assert segmented.plan_segments(10, segments=4, min_segment=1) == [(0, 2), (3, 5), (6, 8), (9, 9)]
+    assert segmented.plan_segments(10, segments=4, min_segment=100) == [(0, 9)]
+    assert len(PLAN) == 4
+    assert PLAN[0][0] == 0 and PLAN[-1][1] == len(BODY) - 1
+    assert all(a[1] + 1 == b[0] for a, b in zip(PLAN, PLAN[1:]))
+
+
+def test_ranges_are_assembled(planned):
+    seen = []
+    assert download(Session(), [seen.append]) == BODY
+    assert seen[-1]["status"] == "finished"
+    assert seen[-1]["downloaded_bytes"] == len(BODY)
+
+
+def test_first_failure_cancels_the_other_ranges(planned):
+    session = Session(fail_at={PLAN[1][0]}, delay=0.1)
+    seen = []
+    started = time.monotonic()
+    with pytest.raises(ConnectionError):
+        download(session, [seen.append])
+    # Each healthy range holds 16 chunks at 100 ms each; they stop after about one
+    assert time.monotonic() - started < 0.8
+    assert seen == []  # the failed range never confirmed, so nothing was reported
+
+
+def test_fallback_reports_only_the_single_stream(planned):
+    seen = []
+    assert download(Session(plain_at={PLAN[-1][0]}), [seen.append]) == BODY
+    counts = [d["downloaded_bytes"] for d in seen]
+    assert counts == sorted(counts)
+    assert counts[-1] == len(BODY)
+    assert sum(b - a for a, b in zip([0] + counts, counts)) == len(BODY)
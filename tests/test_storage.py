@@ -0,0 +1,48 @@
+"""Sharded layout roots and the downloaded-file fallback lookup"""
+import os
+
+import pytest
+
+from downloader import engine, storage
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    monkeypatch.setenv("DOWNLOADER_STORAGE_LAYOUT", "sharded")
+    yield
+    storage._layouts.clear()
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    return path
+
+
+def test_only_opened_roots_are_sharded(sharded, tmp_path):
+    root, other = tmp_path / "root", tmp_path / "other"
+    touch(str(root / "Old [abcdefghijk].mp4"))
+    mine = touch(str(other / "mine.mp4"))
+    layout = storage.open_root(str(root))
+    assert storage.layout_for(str(root)) is layout
+    assert storage.layout_for(str(other)) is None
+    assert os.path.exists(mine)
+    assert layout.resolve("Old.mp4").startswith(str(root / storage.shard_for("abcdefghijk")))
+
+
+def test_flat_lookup_skips_dotfiles_and_empty_titles(tmp_path):
+    touch(str(tmp_path / ".layout.sqlite3"))
+    os.makedirs(tmp_path / "3f")
+    assert engine.find_downloaded_file(str(tmp_path), "") is None
+    assert engine.find_downloaded_file(str(tmp_path), None) is None
+    video = touch(str(tmp_path / "Some Title [abcdefghijk].mp4"))
+    assert engine.find_downloaded_file(str(tmp_path), "Some Title") == video
+
+
+def test_sharded_lookup_uses_the_video_shard(sharded, tmp_path):
+    layout = storage.open_root(str(tmp_path))
+    video = touch(layout.path_for("abcdefghijk", "Some Title [abcdefghijk].mp4"))
+    assert engine.find_downloaded_file(str(tmp_path), "Some Title", "abcdefghijk") == video
+    assert engine.find_downloaded_file(str(tmp_path), "Some Title") is None
+    assert engine.find_downloaded_file(str(tmp_path), "", "zzzzzzzzzzz") is None
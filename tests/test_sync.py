@@ -0,0 +1,53 @@
+"""Sync archive states (downloader.sync.SyncStore)"""
+import sqlite3
+
+import pytest
+
+from downloader.sync import DONE, PENDING, QUEUED, SyncStore
+
+KEY = "video:list:PL1"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SyncStore(str(tmp_path / "sync.sqlite3"))
+    store.save_run(KEY, "https://www.youtube.com/playlist?list=PL1", "PL", "a", [("a", "u/a"), ("b", "u/b")])
+    return store
+
+
+def test_queued_videos_are_not_queued_again_while_their_job_runs(store):
+    store.queued(KEY, "a", "job-a")
+    assert store.archived(KEY) == {"a": QUEUED, "b": PENDING}
+    assert store.pending(KEY, active=lambda job_id: True) == [("b", "u/b")]
+    assert store.pending(KEY) == [("b", "u/b")]
+
+
+def test_lost_jobs_make_their_video_pending_again(store):
+    store.queued(KEY, "a", "job-a")
+    assert sorted(store.pending(KEY, active=lambda job_id: False)) == [("a", "u/a"), ("b", "u/b")]
+
+
+def test_record_finishes_a_queued_video(store):
+    store.queued(KEY, "a", "job-a")
+    store.queued(KEY, "b", "job-b")
+    store.record(KEY, "a", ok=True)
+    store.record(KEY, "b", ok=False)
+    assert store.archived(KEY) == {"a": DONE, "b": PENDING}
+    # A download that finished before it was marked queued keeps its record
+    store.queued(KEY, "a", "job-a")
+    assert store.archived(KEY)["a"] == DONE
+    assert store.playlists()[0]["done"] == 1
+
+
+def test_migrates_an_archive_without_job_ids(tmp_path):
+    path = str(tmp_path / "sync.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE archive (key TEXT NOT NULL, video_id TEXT NOT NULL, url TEXT NOT NULL, "
+                 "status TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (key, video_id))")
+    conn.execute("INSERT INTO archive VALUES (?, ?, ?, ?, ?)", (KEY, "old", "u/old", PENDING, 1.0))
+    conn.commit()
+    conn.close()
+    store = SyncStore(path)
+    assert store.pending(KEY) == [("old", "u/old")]
+    store.queued(KEY, "old", "job-old")
+    assert store.pending(KEY) == []